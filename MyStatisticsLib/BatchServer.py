@@ -0,0 +1,287 @@
+import numpy as np
+import asyncio
+import collections
+import json
+import time
+
+# reasons of HTTP status codes used by the server
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class BatchServer:
+    """
+    Serve decisions of a trained model to many callers with micro-batching.
+    Every call of decide queues one sample. Queued samples are flushed as one batch into decide_all of the model when
+    max_batch samples are queued, or max_delay seconds after the first sample of the batch was queued, and each caller
+    gets the decision of its own sample. All methods must be called in the same event loop.
+    """
+    # maximum number of recent latencies kept for percentiles
+    latency_window = 10000
+    # maximum size of the body of a HTTP request
+    max_body = 1 << 20
+
+    def __init__(self, model, max_batch=64, max_delay=0.002):
+        """
+        :param model: trained model with decide_all, e.g. CartClassificationTree or RandomForest, or a flat tree in
+                FlatTree. Trees with compile are compiled once into flat arrays.
+        :param max_batch: maximum number of samples decided in one batch
+        :param max_delay: maximum seconds a sample waits for other samples of its batch
+        """
+        self.model = model.compile() if hasattr(model, "compile") else model
+        if not hasattr(self.model, "decide_all"):
+            raise TypeError("Can't serve model of type " + type(model).__name__)
+        # names of eigens every sample must have. None means the eigens of the first sample of each batch
+        self.eigen_names = getattr(self.model, "eigen_names", None)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # (eigen, future, time of queueing) of queued samples
+        self.queue = None
+        self.flusher = None
+        self.servers = list()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latency_sum = 0.
+        self.latency_max = 0.
+        self.latencies = collections.deque(maxlen=BatchServer.latency_window)
+
+    async def decide(self, eigen):
+        """
+        :param eigen: dictionary of eigens of one sample
+        :return: decision of the sample, a python scalar
+        """
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.flusher = asyncio.get_running_loop().create_task(self.flush_forever())
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((eigen, future, time.perf_counter()))
+        return await future
+
+    async def flush_forever(self):
+        """
+        collect queued samples into batches and decide them, until the server is closed
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        """
+        decide a batch of samples with one call of decide_all and set the results of their futures
+        :param batch: list of (eigen, future, time of queueing)
+        """
+        # callers which were cancelled don't need decisions
+        batch = [item for item in batch if not item[1].done()]
+        if len(batch) == 0:
+            return
+        names = self.eigen_names if self.eigen_names is not None else list(batch[0][0])
+        valid = list()
+        for eigen, future, start in batch:
+            missing = [name for name in names if name not in eigen]
+            if len(missing) > 0:
+                future.set_exception(KeyError("Eigen doesn't exist: " + str(missing[0])))
+                self.record(start, error=True)
+            else:
+                valid.append((eigen, future, start))
+        if len(valid) == 0:
+            return
+
+        columns = dict((name, np.array([eigen[name] for eigen, _, _ in valid])) for name in names)
+        if len(columns) == 0:
+            # a tree of one leaf uses no eigen, the column only gives the number of samples
+            columns[None] = np.zeros(len(valid))
+        try:
+            decisions = self.model.decide_all(columns)
+        except Exception as e:
+            if len(valid) > 1:
+                # decide samples one by one, so only the bad samples get the exception
+                for item in valid:
+                    self.flush([item])
+                return
+            for eigen, future, start in valid:
+                future.set_exception(e)
+                self.record(start, error=True)
+            return
+        self.batches += 1
+        for (eigen, future, start), decision in zip(valid, decisions):
+            future.set_result(decision.item() if isinstance(decision, np.generic) else decision)
+            self.record(start)
+
+    def record(self, start, error=False):
+        """
+        :param start: time when the sample was queued
+        :param error: True if the sample got an exception instead of a decision
+        """
+        latency = time.perf_counter() - start
+        self.requests += 1
+        self.errors += error
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latencies.append(latency)
+
+    def statistics(self):
+        """
+        :return: dictionary of counters since the server was created. Latency is the time from queueing a sample
+                  to deciding it, in milliseconds. Percentiles are computed from recent samples.
+        """
+        elapsed = time.perf_counter() - self.started
+        recent = np.array(self.latencies) * 1000
+        return {"requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_size": (self.requests - self.errors) / self.batches if self.batches > 0 else 0.,
+                "throughput": self.requests / elapsed if elapsed > 0 else 0.,
+                "mean_latency_ms": self.latency_sum * 1000 / self.requests if self.requests > 0 else 0.,
+                "p50_latency_ms": float(np.percentile(recent, 50)) if len(recent) > 0 else 0.,
+                "p99_latency_ms": float(np.percentile(recent, 99)) if len(recent) > 0 else 0.,
+                "max_latency_ms": self.latency_max * 1000}
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """
+        start a HTTP/1.1 front end. POST /decide with a JSON object of eigens of one sample returns
+        {"decision": decision}. GET /statistics returns the counters. Connections are kept alive.
+        :param host: host to listen on
+        :param port: port to listen on, 0 to choose a free port
+        :param path: path of a Unix socket to listen on instead of host and port
+        :return: address of the server, (host, port) or path
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        self.servers.append(server)
+        return server.sockets[0].getsockname()
+
+    async def handle(self, reader, writer):
+        """
+        answer HTTP requests of one connection until the client closes it
+        :param reader: stream reader of the connection
+        :param writer: stream writer of the connection
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if len(request_line) == 0:
+                    break
+                method, target = request_line.decode("latin-1").split()[:2]
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > BatchServer.max_body:
+                    await respond(writer, 413, {"error": "body is too large"}, close=True)
+                    break
+                body = await reader.readexactly(length)
+                status, content = await self.answer(method, target, body)
+                close = headers.get("connection", "").lower() == "close"
+                await respond(writer, status, content, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, method, target, body):
+        """
+        :param method: HTTP method
+        :param target: path of the request
+        :param body: body of the request
+        :return: HTTP status and JSON content of the response
+        """
+        if target == "/statistics":
+            return (200, self.statistics()) if method == "GET" else (405, {"error": "use GET"})
+        if target != "/decide":
+            return 404, {"error": "unknown path " + target}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            eigen = json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            return 400, {"error": "invalid JSON: " + str(e)}
+        if not isinstance(eigen, dict):
+            return 400, {"error": "body must be a JSON object of eigens"}
+        try:
+            return 200, {"decision": await self.decide(eigen)}
+        except Exception as e:
+            return 400, {"error": type(e).__name__ + ": " + str(e)}
+
+    async def close(self):
+        """
+        stop the front ends and the batching task. Samples still queued get CancelledError.
+        """
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = list()
+        if self.flusher is not None:
+            self.flusher.cancel()
+            try:
+                await self.flusher
+            except asyncio.CancelledError:
+                pass
+            while not self.queue.empty():
+                self.queue.get_nowait()[1].cancel()
+            self.queue, self.flusher = None, None
+
+
+async def respond(writer, status, content, close=False):
+    """
+    write a HTTP response with JSON content
+    :param writer: stream writer of the connection
+    :param status: HTTP status
+    :param content: object written as JSON
+    :param close: True to tell the client the connection will be closed
+    """
+    body = json.dumps(content).encode("utf-8")
+    head = "HTTP/1.1 " + str(status) + " " + REASONS[status] + "\r\n" + \
+           "Content-Type: application/json\r\n" + \
+           "Content-Length: " + str(len(body)) + "\r\n" + \
+           "Connection: " + ("close" if close else "keep-alive") + "\r\n\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def request(reader, writer, method, target, content=None):
+    """
+    send one HTTP request on a kept-alive connection to a BatchServer and read its response
+    :param reader: stream reader of the connection, e.g. returned by asyncio.open_connection
+    :param writer: stream writer of the connection
+    :param method: HTTP method
+    :param target: path of the request
+    :param content: object sent as JSON body, None for no body
+    :return: HTTP status and JSON content of the response
+    """
+    body = b"" if content is None else json.dumps(content).encode("utf-8")
+    head = method + " " + target + " HTTP/1.1\r\nHost: localhost\r\n" + \
+        "Content-Type: application/json\r\nContent-Length: " + str(len(body)) + "\r\n\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads((await reader.readexactly(length)).decode("utf-8"))
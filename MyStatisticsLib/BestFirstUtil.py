@@ -0,0 +1,56 @@
+import heapq
+import itertools
+import time
+
+
+def grow_best_first(root, root_state, evaluate, expand, make_leaf, max_leaves=None, max_depth=None,
+                    time_budget=None):
+    """
+    Grow a tree best first. Frontier nodes are kept in a priority queue ordered by the impurity reduction of their
+    best split, and the best one is expanded until the queue is empty or a budget runs out. Frontier nodes which are
+    never expanded become leaves, so the tree is always valid.
+    When no budget is given, every splittable node is expanded and the tree is the same as the depth-first tree.
+    :param root: root node
+    :param root_state: state of the root passed to evaluate, e.g. the rows belonging to it
+    :param evaluate: function(node, state, split). It sets prediction of the node, and chooses its best split if
+            split is True. split is False when the node can't be expanded within the budget, so the costly search
+            of best split is skipped. It returns None if the node is a leaf, otherwise
+            (impurity reduction, number of children, split state)
+    :param expand: function(node, split state). It creates children of the node and returns list of
+            (child, state of child)
+    :param make_leaf: function(node). It turns an evaluated but not expanded node into a leaf
+    :param max_leaves: maximum number of leaves, None means no limit
+    :param max_depth: maximum depth of tree, the depth of root is 1. None means no limit
+    :param time_budget: seconds to grow the tree. Expanding stops after the time runs out. None means no limit
+    :return: number of leaves
+    """
+    start_time = time.perf_counter()
+    # the counter keeps nodes with the same impurity reduction in the order they are evaluated
+    counter = itertools.count()
+    heap = list()
+    leaf_num = 1
+
+    def out_of_time():
+        return time_budget is not None and time.perf_counter() - start_time >= time_budget
+
+    def push(node, state, depth):
+        can_split = (max_depth is None or depth < max_depth) and (max_leaves is None or leaf_num < max_leaves) \
+            and not out_of_time()
+        split = evaluate(node, state, can_split)
+        if split is None:
+            return
+        gain, child_num, split_state = split
+        heapq.heappush(heap, (-gain, next(counter), node, depth, child_num, split_state))
+
+    push(root, root_state, 1)
+    while len(heap) > 0:
+        neg_gain, order, node, depth, child_num, split_state = heapq.heappop(heap)
+        # a node with too many children is skipped, nodes with fewer children may still fit
+        too_many_leaves = max_leaves is not None and leaf_num + child_num - 1 > max_leaves
+        if too_many_leaves or out_of_time():
+            make_leaf(node)
+            continue
+        leaf_num += child_num - 1
+        for child, child_state in expand(node, split_state):
+            push(child, child_state, depth + 1)
+    return leaf_num
@@ -1,38 +1,329 @@
+import MyStatisticsLib.BestFirstUtil as bfu
 import MyStatisticsLib.CartClassificationTreeUtil as cctu
+import MyStatisticsLib.FlatTree as ft
+import MyStatisticsLib.PartitionUtil as pu
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.PruneUtil as pru
+import MyStatisticsLib.WeightUtil as wu
 import MyStatisticsLib.TreePlot as plt
-import copy
+import numpy as np
+import numbers
+from concurrent.futures import ProcessPoolExecutor
 
 class CartClassificationTree:
     data_set_size_threshold = 5
     cond_gini_threshold = 0.1
+    # ParallelUtil.SplitExecutor used to score eigens concurrently, None to score them one after another
+    split_executor = None
+    # 每个结点随机抽取的特征数，只给这些特征打分(随机森林)。None表示使用全部特征
+    max_eigens = None
+    # 可以在每个实例上单独设置的参数，没有设置的参数使用上面的类属性
+    setting_names = ("data_set_size_threshold", "cond_gini_threshold", "split_executor", "max_eigens")
+    # 每个停止参数对应的结点属性：结点的属性小于参数时，结点作为叶结点
+    stop_statistics = {"data_set_size_threshold": "data_set_size", "cond_gini_threshold": "gini_index"}
+    # 结点没有实例字典，只保存这些属性。左右孩子直接保存在结点上，叶结点的left和right是None
+    __slots__ = ("root", "left", "right", "split_eigen", "split_value", "prediction", "gini_index", "data_set_size",
+                 "prune_alpha", "prune_step", "instance_settings")
 
-    def __init__(self, root=False):
+    def __init__(self, root=False, **settings):
+        """
+        :param root: 是否是根结点
+        :param settings: setting_names中的参数，只对这棵树有效，孩子结点继承父结点的参数。
+                参数不同的多棵树可以在多个线程中同时构造
+        """
+        for name in settings:
+            if name not in CartClassificationTree.setting_names:
+                raise TypeError("Unknown setting: " + name)
+        # 在实例上设置的参数。一棵树的所有结点共用这个字典，所以字典创建后不再修改
+        self.instance_settings = settings
         self.root = root
-        self.children = list()
+        self.left = None
+        self.right = None
         self.split_eigen = None
         self.split_value = None
         self.prediction = None
         self.gini_index = None
         self.data_set_size = None
+        # 剪枝时的alpha和剪枝顺序，由pruning_path计算
+        self.prune_alpha = float("inf")
+        self.prune_step = float("inf")
+
+    @property
+    def children(self):
+        """
+        :return: 孩子结点的元组(左孩子, 右孩子)，叶结点返回空元组
+        """
+        return () if self.left is None else (self.left, self.right)
+
+    def setting(self, name):
+        """
+        :param name: setting_names中的参数名
+        :return: 参数在这棵树上的值，没有在实例上设置的参数使用类属性
+        """
+        return self.instance_settings.get(name, getattr(CartClassificationTree, name))
+
+    def settings(self):
+        """
+        :return: 在这个实例上设置的参数
+        """
+        return dict(self.instance_settings)
+
+    def worker_settings(self):
+        """
+        :return: 传给工作进程的参数，包括没有在实例上设置的参数的当前值。
+                 工作进程之间已经是并行的，从主进程继承来的线程池在工作进程中没有线程，不能再用它给特征打分
+        """
+        settings = dict((name, self.setting(name)) for name in CartClassificationTree.setting_names)
+        settings["split_executor"] = None
+        return settings
+
+    def new_child(self):
+        """
+        :return: 继承当前结点参数的孩子结点
+        """
+        child = CartClassificationTree()
+        child.instance_settings = self.instance_settings
+        return child
+
+    def build(self, data_set, eigens, in_place=False, weights=None, compress=False):
+        """
+        构造CART分类树
+        :param data_set: 训练数据集的类别，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param in_place: 为True时，数据集和特征字典不会被复制到孩子结点。所有结点共用一个下标数组，
+                每个结点只拥有下标数组中的一段，分片时原地划分这一段下标。
+        :param weights: 每个数据的权重，None表示权重都是1。整数权重相当于把数据重复多次，
+                data_set_size是权重之和。有权重时总是原地划分下标。
+        :param compress: 为True时，先把重复的数据压缩成一个带权重的数据再构造。得到的树不变，重复数据多时更快。
+        :return:
+        """
+        if compress:
+            data_set, eigens, weights = wu.compress_duplicates(data_set, eigens, weights)
+        if in_place or weights is not None:
+            self.build_on_index(data_set, eigens, np.arange(len(data_set)), 0, len(data_set), weights)
+            return
 
-    def build(self, data_set, eigens):
         self.prediction = cctu.mode(data_set)
         self.data_set_size = len(data_set)
         self.gini_index = cctu.gini(data_set)
 
         # 如果数据集太小,终止分片.把当前节点作为叶结点返回.
-        if self.data_set_size < CartClassificationTree.data_set_size_threshold:
+        if self.data_set_size < self.setting("data_set_size_threshold"):
             return
         # 如果基尼指数小于阈值,说明分片已经足够好.把当前节点作为叶结点返回.
-        if self.gini_index < CartClassificationTree.cond_gini_threshold:
+        if self.gini_index < self.setting("cond_gini_threshold"):
             return
 
-        self.split_eigen, self.split_value, min_cond_gini = cctu.choose_best_split(data_set, eigens)
+        executor = self.setting("split_executor")
+        eigen_subset = sample_eigens(eigens, self.setting("max_eigens"))
+        self.split_eigen, self.split_value, min_cond_gini = cctu.choose_best_split(data_set, eigens, executor,
+                                                                                   eigen_subset=eigen_subset)
+        # 如果每个特征都只有一个特征值，无法分片，把当前节点作为叶结点返回.
+        if self.split_eigen is None:
+            return
         splits = cctu.split_all(data_set, eigens, self.split_eigen, self.split_value)
-        for data_set_split, eigens_split in splits:
-            child = CartClassificationTree()
+        self.left, self.right = self.new_child(), self.new_child()
+        for child, (data_set_split, eigens_split) in zip((self.left, self.right), splits):
             child.build(data_set_split, eigens_split)
-            self.children.append(child)
+
+    def build_on_index(self, data_set, eigens, index, start, end, weights=None, random=None):
+        """
+        用下标数组的一段index[start:end]对应的数据构造子树
+        :param data_set: 全部训练数据的类别
+        :param eigens: 全部训练数据的特征字典
+        :param index: 所有结点共用的下标数组
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :param random: 设置了max_eigens时，用来抽取特征的numpy.random.RandomState，None表示使用numpy.random
+        :return:
+        """
+        mid = self.split_on_index(data_set, eigens, index, start, end, weights, random)
+        if mid is None:
+            return
+        # 给每个下标段创建相应的子树
+        self.left, self.right = self.new_child(), self.new_child()
+        self.left.build_on_index(data_set, eigens, index, start, mid, weights, random)
+        self.right.build_on_index(data_set, eigens, index, mid, end, weights, random)
+
+    def split_on_index(self, data_set, eigens, index, start, end, weights=None, random=None):
+        """
+        计算当前结点的预测值，选择分片特征和特征值，并原地划分下标段index[start:end]。不构造孩子结点。
+        :param data_set: 全部训练数据的类别
+        :param eigens: 全部训练数据的特征字典
+        :param index: 所有结点共用的下标数组
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :param random: 设置了max_eigens时，用来抽取特征的numpy.random.RandomState，None表示使用numpy.random
+        :return: 划分点mid，左孩子的下标段是index[start:mid]，右孩子的下标段是index[mid:end]。
+                 如果当前结点是叶结点，返回None
+        """
+        node_index = index[start:end]
+        # 当前结点的数据只在计算时临时取出
+        node_data_set = data_set[node_index]
+        node_weights = None if weights is None else weights[node_index]
+        if self.evaluate(node_data_set, node_weights):
+            return None
+
+        node_eigens = pu.EigensView(eigens, node_index)
+        executor = self.setting("split_executor")
+        eigen_subset = sample_eigens(eigens, self.setting("max_eigens"), random)
+        self.split_eigen, self.split_value, min_cond_gini = cctu.choose_best_split(node_data_set, node_eigens, executor,
+                                                                                   node_weights, eigen_subset)
+        if self.split_eigen is None:
+            return None
+        # 原地划分下标段，左孩子是特征值等于split_value的数据
+        return pu.partition(index, start, end, node_eigens[self.split_eigen] == self.split_value)
+
+    def evaluate(self, node_data_set, node_weights=None):
+        """
+        计算当前结点的预测值、基尼指数和数据量，并判断当前结点是否应该作为叶结点
+        :param node_data_set: 当前结点的数据的类别
+        :param node_weights: 当前结点的数据的权重，None表示权重都是1
+        :return: 如果数据集太小或者基尼指数已经足够小，返回True
+        """
+        self.prediction = cctu.mode(node_data_set, node_weights)
+        self.data_set_size = wu.total_weight(node_weights, len(node_data_set))
+        self.gini_index = cctu.gini(node_data_set, node_weights)
+
+        # 如果数据集太小,终止分片.把当前节点作为叶结点返回.
+        if self.data_set_size < self.setting("data_set_size_threshold"):
+            return True
+        # 如果基尼指数小于阈值,说明分片已经足够好.把当前节点作为叶结点返回.
+        return self.gini_index < self.setting("cond_gini_threshold")
+
+    def build_best_first(self, data_set, eigens, max_leaves=None, max_depth=None, time_budget=None, weights=None):
+        """
+        按最优优先的顺序构造CART分类树。待分片的结点按分片使损失(= 数据量 * 基尼系数)减少的量排成优先队列，
+        每次分片减少最多的结点，直到叶结点数、树深或者时间用完。没有被分片的结点作为叶结点，所以总是得到一棵完整的树。
+        不给出任何限制时，得到的树和build构造的树相同。
+        :param data_set: 训练数据集的类别，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param max_leaves: 最多的叶结点数，None表示没有限制
+        :param max_depth: 最大树深，根结点的深度是1，None表示没有限制
+        :param time_budget: 构造树的秒数，None表示没有限制
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return: 叶结点数
+        """
+        index = np.arange(len(data_set))
+
+        def evaluate(node, segment, split):
+            start, end = segment
+            if not split:
+                # 预算用完的结点只计算预测值，不再选择分片特征
+                node_index = index[start:end]
+                node.evaluate(data_set[node_index], None if weights is None else weights[node_index])
+                return None
+            # 结点被选出时下标段已经划分好，没有被分片的结点不会影响其它结点的下标段
+            mid = node.split_on_index(data_set, eigens, index, start, end, weights)
+            if mid is None:
+                return None
+            # 分片使损失减少的量
+            gain = node.data_set_size * node.gini_index
+            for child_index in (index[start:mid], index[mid:end]):
+                child_weights = None if weights is None else weights[child_index]
+                child_size = wu.total_weight(child_weights, len(child_index))
+                gain -= child_size * cctu.gini(data_set[child_index], child_weights)
+            return gain, 2, (start, mid, end)
+
+        def expand(node, split):
+            start, mid, end = split
+            node.left, node.right = node.new_child(), node.new_child()
+            return [(node.left, (start, mid)), (node.right, (mid, end))]
+
+        return bfu.grow_best_first(self, (0, len(data_set)), evaluate, expand, make_leaf, max_leaves, max_depth,
+                                   time_budget)
+
+    def build_parallel(self, data_set, eigens, workers=None, size_threshold=100000, weights=None):
+        """
+        用多个进程并行构造树。数据集、特征字典和下标数组只在共享内存中保存一份。
+        数据量大于size_threshold的结点由主进程分片；数据量不大于size_threshold的孩子子树交给工作进程构造。
+        工作进程在共享内存中原地划分自己的下标段，返回紧凑格式的子树，主进程再把它嫁接到父结点上。
+        得到的树和串行构造的树完全相同。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param workers: 工作进程数
+        :param size_threshold: 交给工作进程构造的子树的最大数据量
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return:
+        """
+        if len(data_set) <= size_threshold:
+            self.build(data_set, eigens, in_place=True, weights=weights)
+            return
+
+        arrays = {"data_set": data_set, "index": np.arange(len(data_set))}
+        if weights is not None:
+            arrays["weights"] = weights
+        for eigen in eigens:
+            arrays[("eigen", eigen)] = eigens[eigen]
+        settings = self.worker_settings()
+        shared = plu.SharedArrays(arrays)
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                shared_data_set, shared_index = shared.arrays["data_set"], shared.arrays["index"]
+                shared_eigens = dict((eigen, shared.arrays[("eigen", eigen)]) for eigen in eigens)
+                shared_weights = shared.arrays.get("weights")
+                # grafts保存等待工作进程返回的(孩子结点, future)
+                grafts = list()
+                stack = [(self, 0, len(data_set))]
+                while len(stack) > 0:
+                    node, start, end = stack.pop()
+                    if node is not self and end - start <= size_threshold:
+                        future = pool.submit(build_subtree_in_worker, shared.descriptor(), start, end, settings)
+                        grafts.append((node, future))
+                        continue
+                    mid = node.split_on_index(shared_data_set, shared_eigens, shared_index, start, end, shared_weights)
+                    if mid is None:
+                        continue
+                    node.left, node.right = node.new_child(), node.new_child()
+                    stack.append((node.right, mid, end))
+                    stack.append((node.left, start, mid))
+                del shared_data_set, shared_index, shared_eigens, shared_weights
+                # 把工作进程构造的子树嫁接到父结点上
+                for node, future in grafts:
+                    node.from_compact(future.result())
+        finally:
+            shared.close()
+
+    def to_compact(self):
+        """
+        把子树转换为紧凑格式，用于在进程之间传递子树
+        :return: 先序排列的结点属性元组列表，元组的格式为(是否有孩子, 分片特征, 分片特征值, 预测值, gini_index, 数据量)
+        """
+        compact = list()
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            compact.append((node.left is not None, node.split_eigen, node.split_value, node.prediction,
+                            node.gini_index, node.data_set_size))
+            if node.left is not None:
+                stack.append(node.right)
+                stack.append(node.left)
+        return compact
+
+    def from_compact(self, compact):
+        """
+        用紧凑格式恢复子树，当前结点是子树的根结点
+        :param compact: to_compact返回的结点属性元组列表
+        :return:
+        """
+        stack = [self]
+        for has_children, split_eigen, split_value, prediction, gini_index, data_set_size in compact:
+            node = stack.pop()
+            node.split_eigen, node.split_value, node.prediction = split_eigen, split_value, prediction
+            node.gini_index, node.data_set_size = gini_index, data_set_size
+            if has_children:
+                node.left, node.right = node.new_child(), node.new_child()
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def compile(self):
+        """
+        把树编译为扁平数组，用于批量预测或保存为模型文件。树被修改后需要重新编译。
+        :return: FlatTree.FlatClassificationTree
+        """
+        return ft.FlatClassificationTree(self)
 
     def decide(self, eigen):
         """
@@ -40,40 +331,77 @@ class CartClassificationTree:
         :param eigen: 特征字典，包含一个样本的每个特征的值
         :return:决策结果
         """
-        if len(self.children) == 0:
+        if self.left is None:
             # 如果是叶结点，直接返回决策结果
             return self.prediction
         else:
             try:
                 # 如果不是叶结点，根据当前节点的分片特征和特征值选择一个孩子来决策
                 eigen_value = eigen[self.split_eigen]
-                child_index = 0 if self.split_value == eigen_value else 1
-                chosen_child = self.children[child_index]
+                chosen_child = self.left if self.split_value == eigen_value else self.right
                 # 返回孩子的决策结果
                 return chosen_child.decide(eigen)
             except KeyError as e:
                 print("Key doesn't exist: " + e.__str__())
 
-    def decide_all(self, length, eigens):
+    def decide_all(self, eigens, eigen_names=None):
         """
         可以对多个样本进行决策，返回每个样本决策结果
-        :param length: 样本数量
-        :param eigens: 特征字典，包含多个样本的每个特征的值
-        :return: 返回一组决策结果。格式为generator，可以迭代返回多个决策结果。
-        """
-        def split_eigens():
-            # 分割多个样本的特征字典
-            # 返回值是一个generator，可以迭代返回每个样本的特征字典
-            for i in range(length):
-                eigens_split = dict()
-                for eigen in eigens:
-                    eigens_split[eigen] = eigens[eigen][i]
-                yield eigens_split
-        # 分割多个样本的特征字典
-        eigens_splits = split_eigens()
-        # 对每个样本的特征字典进行决策
-        for eigens_split in eigens_splits:
-            yield self.decide(eigens_split)
+        所有样本一起沿树向下划分：每个结点只做一次向量化的比较，把到达它的样本下标分给两个孩子。
+        :param eigens: 特征字典，包含多个样本的每个特征的值；或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: numpy.array，每个样本的决策结果
+        """
+        if isinstance(eigens, numbers.Integral):
+            # 兼容旧的调用方式decide_all(length, eigens)
+            eigens, eigen_names = eigen_names, None
+        columns = self.columns_of(eigens, eigen_names)
+        length = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+
+        # leaves保存(叶结点的决策结果, 到达该叶结点的样本下标)
+        leaves = list()
+        stack = [(self, np.arange(length))]
+        while len(stack) > 0:
+            node, index = stack.pop()
+            if node.left is None:
+                leaves.append((node.prediction, index))
+                continue
+            left_index, right_index = node.route(columns, index)
+            stack.append((node.right, right_index))
+            stack.append((node.left, left_index))
+
+        predictions = np.array([prediction for prediction, index in leaves])
+        decisions = np.empty(length, dtype=predictions.dtype)
+        for prediction, index in leaves:
+            decisions[index] = prediction
+        return decisions
+
+    def route(self, columns, index):
+        """
+        把到达当前结点的样本分给孩子。特征值等于split_value的样本分给左孩子，其它样本分给右孩子
+        :param columns: 特征字典，字典的值是单轴的numpy.array
+        :param index: 到达当前结点的样本下标
+        :return: 按孩子的顺序，分给每个孩子的样本下标
+        """
+        left = columns[self.split_eigen][index] == self.split_value
+        return [index[left], index[~left]]
+
+    def columns_of(self, eigens, eigen_names=None):
+        """
+        把输入的特征转换为特征字典，并检查树用到的每个特征都存在
+        :param eigens: 特征字典，或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: 特征字典，字典的值是单轴的numpy.array
+        """
+        if not isinstance(eigens, dict):
+            eigens = np.asarray(eigens)
+            if eigen_names is None or eigens.ndim != 2 or eigens.shape[1] != len(eigen_names):
+                raise ValueError("eigen_names must name every column of the 2-D eigen array")
+            eigens = dict(zip(eigen_names, eigens.T))
+        for node in self.nodes():
+            if node.left is not None and node.split_eigen not in eigens:
+                raise KeyError("Eigen doesn't exist: " + str(node.split_eigen))
+        return dict((eigen, np.asarray(values)) for eigen, values in eigens.items())
 
     def depth(self, tree_depth=0):
         """
@@ -82,7 +410,7 @@ class CartClassificationTree:
         :return: 当前树的总深度
         """
         tree_depth += 1
-        if len(self.children) != 0:
+        if self.left is not None:
             temp_depth = list()
             for child in self.children:
                 temp_depth.append(child.depth(tree_depth))
@@ -95,7 +423,7 @@ class CartClassificationTree:
         计算树的损失
         :return: 树的每个叶结点的损失的列表
         """
-        if len(self.children) == 0:
+        if self.left is None:
             # 如果是叶结点,返回叶结点的损失(= 训练数据数 * 基尼系数)
             return [ self.data_set_size * self.gini_index ]
         else:
@@ -112,7 +440,7 @@ class CartClassificationTree:
         :param alpha: alpha
         :return: 在my_choice中，返回找到的最小alpha值和对应的子树
         """
-        if len(self.children) != 0:
+        if self.left is not None:
             # 对除了根结点外的非叶结点计算g(t)
             # 根结点是不剪枝的，所以不用计算它的g(t)
             if not self.root:
@@ -130,52 +458,118 @@ class CartClassificationTree:
             for child in self.children:
                 child.choose_best_tree(my_choice, alpha)
 
+    def nodes(self):
+        """
+        不用递归，按先序遍历树的所有结点
+        :return: 结点的generator
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            if node.left is not None:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def pruning_path(self):
+        """
+        用弱连接剪枝计算剪枝序列。树既不复制也不修改，只在被剪枝的子树的根结点上保存剪枝时的alpha(prune_alpha)
+        和剪枝顺序(prune_step，从1开始)。第k棵子树就是把prune_step<=k的结点作为叶结点得到的树。
+        :return: 剪枝序列，元素的格式为(alpha, 被剪枝的子树)
+        """
+        nodes = list(self.nodes())
+        for node in nodes:
+            node.prune_alpha, node.prune_step = float("inf"), float("inf")
+        parent = pru.parents_of(nodes, lambda node: node.children)
+        # 结点作为叶结点时的损失(= 训练数据数 * 基尼系数)
+        node_loss = np.array([node.data_set_size * node.gini_index for node in nodes], dtype=float)
+        is_leaf = np.array([node.left is None for node in nodes])
+
+        path = list()
+        for step, (alpha, k) in enumerate(pru.weakest_link_path(parent, node_loss, is_leaf)):
+            nodes[k].prune_alpha, nodes[k].prune_step = alpha, step + 1
+            path.append((alpha, nodes[k]))
+        return path
+
+    def prune_by_path(self, alpha):
+        """
+        用pruning_path计算的prune_alpha剪枝，剪掉prune_alpha<=alpha的子树
+        :param alpha: alpha
+        :return:
+        """
+        for node in list(self.nodes()):
+            if node.prune_alpha <= alpha:
+                node.left, node.right = None, None
+
     def post_prune(self, test_data_set, test_data_eigens):
         """
         根据测试数据对CART树做后剪枝
+        先用pruning_path计算全部剪枝序列，再把测试数据一次性沿整树向下划分，统计每个结点上决策正确的样本数。
+        剪枝序列中第k棵树对一个样本的决策，等于该样本路径上第一个prune_step<=k的结点的决策，否则等于叶结点的决策。
+        所以一次遍历就能得到序列中所有树的正确数。
         :param test_data_set: 测试数据集的类别
         :param test_data_eigens: 测试数据集的特征
-        :return: 最优CART树
-        """
-        # best_trees列表保存剪枝过程中找到的所有alpha和相应的最优CART树
-        # 列表中每个元素的格式为(alpha，对应的最优CART树）
-        best_trees = list()
-        # alpha=0时，整树self为最优CART树
-        best_trees.append((0, copy.deepcopy(self)))
-        # 一直循环直到剩下根结点和两个叶子组成的树（depth=2）
-        while self.depth() > 2:
-            choice = list()
-            # 寻找产生当前最小alpha的子树
-            self.choose_best_tree(choice)
-            alpha, subtree = choice[0]
-            # 对子树剪枝
-            subtree.children.clear()
-            # 把当前最小alpha以及剪枝后的最优CART树保存到best_trees列表
-            best_trees += [(alpha, copy.deepcopy(self))]
-
-        # 用测试数据集验证best_trees列表中的哪个CART树泛化能力最强
+        :return: 最优CART树。当前树被原地剪枝为最优CART树后返回。
+        """
+        path = self.pruning_path()
         length = len(test_data_set)
-        # max_correct记录最大正确率，best_tree记录对应的最优CART树
-        max_correct, best_tree = -1, None
-        for alpha, tree in best_trees:
-            # 得到当前树对测试数据集的决策结果
-            decisions = tree.decide_all(length, test_data_eigens)
-            # 对照test_data_set，统计正确率
-            correct = 0
-            for data, decision in zip(test_data_set, decisions):
-                if data == decision:
-                    correct += 1
-            # 如果正确率最大，则把当前树记录下来
-            if max_correct < correct:
-                max_correct = correct
-                best_tree = tree
-        return best_tree
+        # correct_change[k]是第k棵树比第k-1棵树多出的正确数，0号是整树
+        correct_change = np.zeros(len(path) + 2)
+        # 栈的元素格式为(结点, 到达该结点的测试样本下标, 祖先中最小的prune_step)
+        stack = [(self, np.arange(length), float("inf"))]
+        while len(stack) > 0:
+            node, index, ancestor_step = stack.pop()
+            correct = np.count_nonzero(test_data_set[index] == node.prediction)
+            if node.left is None:
+                # 在祖先被剪枝之前，叶结点的决策有效
+                correct_change[0] += correct
+                correct_change[min(ancestor_step, len(path) + 1)] -= correct
+                continue
+            if node.prune_step < ancestor_step:
+                # 从结点被剪枝起，到祖先被剪枝之前，这个结点的决策有效
+                correct_change[node.prune_step] += correct
+                correct_change[min(ancestor_step, len(path) + 1)] -= correct
+            left = test_data_eigens[node.split_eigen][index] == node.split_value
+            node_step = min(node.prune_step, ancestor_step)
+            stack.append((node.right, index[~left], node_step))
+            stack.append((node.left, index[left], node_step))
+        corrects = np.cumsum(correct_change)[:len(path) + 1]
+
+        # 正确率最大的树中选择最先出现的那一棵(alpha最小)
+        best_step = int(np.argmax(corrects))
+        for node in list(self.nodes()):
+            if node.prune_step <= best_step:
+                node.left, node.right = None, None
+        return self
+
+    def truncate(self, **settings):
+        """
+        把树原地截断为用更严格的停止参数构造的树。结点选择的分片和停止参数无关，
+        所以截断得到的树和用这些参数重新构造的树完全相同，不需要重新训练。
+        :param settings: stop_statistics中的参数，不能比构造这棵树时使用的参数更宽松
+        :return:
+        """
+        instance_settings = dict(self.instance_settings, **settings)
+        for node in self.nodes():
+            node.instance_settings = instance_settings
+            if node.left is not None and node.stops(settings):
+                # 先序遍历时孩子还没有入栈，被截断的子树不会再被遍历
+                node.left, node.right = None, None
+                make_leaf(node)
+
+    def stops(self, settings):
+        """
+        :param settings: stop_statistics中的参数
+        :return: 用这些参数构造树时，当前结点是否作为叶结点
+        """
+        return any(getattr(self, statistic) < settings[name]
+                   for name, statistic in CartClassificationTree.stop_statistics.items() if name in settings)
 
     def traverse(self):
         """
         :return:  CART Tree in dictionary format
         """
-        if len(self.children) != 0:
+        if self.left is not None:
             tree = dict()
             sub_tree = dict()
             split_value = str(self.split_value)
@@ -192,4 +586,49 @@ class CartClassificationTree:
         draw Decision Tree
         """
         tree_in_dict = self.traverse()
-        plt.createPlot(tree_in_dict)
\ No newline at end of file
+        plt.createPlot(tree_in_dict)
+
+
+def make_leaf(node):
+    """
+    把已经选择了分片特征、但没有被分片的结点变为叶结点
+    :param node: 结点
+    """
+    node.split_eigen, node.split_value = None, None
+
+
+def sample_eigens(eigens, max_eigens, random=None):
+    """
+    为一个结点不放回地随机抽取max_eigens个特征。抽到的特征保持特征字典中的顺序，所以分片结果和打分顺序无关。
+    :param eigens: 特征字典
+    :param max_eigens: 抽取的特征数，None表示使用全部特征
+    :param random: numpy.random.RandomState，None表示使用numpy.random
+    :return: 抽到的特征名列表。max_eigens是None，或者特征数不大于max_eigens时，返回None，表示使用全部特征
+    """
+    if max_eigens is None or max_eigens >= len(eigens):
+        return None
+    random = np.random if random is None else random
+    names = list(eigens)
+    chosen = np.sort(random.choice(len(names), max_eigens, replace=False))
+    return [names[i] for i in chosen]
+
+
+def build_subtree_in_worker(descriptor, start, end, settings):
+    """
+    在工作进程中构造子树。数据集、特征字典和下标数组从共享内存中读取。
+    :param descriptor: ParallelUtil.SharedArrays.descriptor返回的共享内存描述
+    :param start: 子树的下标段的起点
+    :param end: 子树的下标段的终点（不包含）
+    :param settings: 主进程中的树的worker_settings
+    :return: 紧凑格式的子树
+    """
+    shm, arrays = plu.attach(descriptor)
+    try:
+        eigens = dict((key[1], value) for key, value in arrays.items() if isinstance(key, tuple))
+        subtree = CartClassificationTree(**settings)
+        subtree.build_on_index(arrays["data_set"], eigens, arrays["index"], start, end, arrays.get("weights"))
+        return subtree.to_compact()
+    finally:
+        # 关闭共享内存前，先释放对它的引用
+        del arrays, eigens
+        shm.close()
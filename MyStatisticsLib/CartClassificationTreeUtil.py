@@ -1,17 +1,31 @@
-from functools import reduce
+import MyStatisticsLib.DecisionTreeUtil as dtu
+import MyStatisticsLib.ParallelUtil as plu
+import numpy as np
 
 
-def gini(data_set):
-    def parital_gini(value):
-        count_of_value = sum(data_set == value)
-        prob = count_of_value/float(total)
-        return -1 * prob * prob
-    total = len(data_set)
-    gini_index = 1
-    distinct_value = set(data_set.flat)
-    for value in distinct_value:
-        gini_index += parital_gini(value)
-    return gini_index
+def class_counts(data_set, weights=None):
+    """
+    :param data_set:
+    :param weights: weight of each data. None means every weight is 1
+    :return: distinct data (sorted), count (or sum of weights) of each distinct data
+    """
+    distinct_data, codes = np.unique(data_set, return_inverse=True)
+    return distinct_data, dtu.count(codes.reshape(-1), len(distinct_data), weights)
+
+
+def gini_of_counts(counts):
+    """
+    calculate gini index from counts of categories
+    :param counts: counts of each category. If it's a matrix, gini index is calculated for each row.
+    :return: gini index (of each row)
+    """
+    total = counts.sum(axis=-1)
+    prob = counts / np.where(total > 0, total, 1)[..., np.newaxis]
+    return 1 - (prob * prob).sum(axis=-1)
+
+
+def gini(data_set, weights=None):
+    return gini_of_counts(class_counts(data_set, weights)[1])
 
 
 def cond_gini(splits):
@@ -19,56 +33,70 @@ def cond_gini(splits):
     total = 0
     for s in splits:
         cond_gini_index += len(s) * gini(s)
-        total = len(s)
+        total += len(s)
     cond_gini_index *= 1/float(total)
     return cond_gini_index
 
 
-def best_split_of_eigen(data_set, eigens, eigen):
+def cond_gini_of_table(table):
+    """
+    calculate conditional gini index of every split "eigen value == v" vs "eigen value != v" from contingency table
+    :param table: count matrix, row is eigen value and column is category
+    :return: conditional gini index of splitting data set by each eigen value
+    """
+    value_totals = table.sum(axis=1)
+    total = value_totals.sum()
+    # counts of categories of the other split are derived from totals, no data is split
+    rest = table.sum(axis=0) - table
+    return (value_totals * gini_of_counts(table) + (total - value_totals) * gini_of_counts(rest)) / float(total)
+
+
+def best_split_of_eigen(data_set, eigens, eigen, weights=None):
     """
     For the specified eigen, find the best eigen value to split data set which generate minimum conditional gini index
+    One (eigen value x category) count matrix is built, and conditional gini index of all eigen values are calculated
+    from it at once.
     :param data_set:
     :param eigens: dictionary of all eigens. Its index is eigen name, and values are eigen values
     :param eigen: specified eigen name
+    :param weights: weight of each data. None means every weight is 1
     :return: specified eigen name, best eigen value, minimum conditional gini index
     """
-    def split_data_set(distinct_value):
-        s1 = data_set[eigen_values == distinct_value]
-        # When only 1 distinct value exists or the distinct value is maximum, we get an empty s2.
-        s2 = data_set[eigen_values != distinct_value]
-        return s1, s2
-
-    eigen_values = eigens[eigen]
-    distinct_value = list(set(eigen_values))
+    distinct_value, value_codes = np.unique(eigens[eigen], return_inverse=True)
     if len(distinct_value) == 1:
         # if only one distinct eigen value, then not possible to split the data set
-        return eigen, distinct_value, float("inf")
+        return eigen, list(distinct_value), float("inf")
 
-    # get splits per each distinct eigen value
-    all_splits = map(split_data_set, distinct_value)
+    categories, class_codes = np.unique(data_set, return_inverse=True)
+    class_num = len(categories)
+    table = dtu.count(value_codes.reshape(-1) * class_num + class_codes.reshape(-1),
+                      len(distinct_value) * class_num, weights)
     # calculate conditional gini index per distinct eigen value
-    all_cond_gini = list(map(cond_gini, all_splits))
+    all_cond_gini = cond_gini_of_table(table.reshape(len(distinct_value), class_num))
     # get minimum conditional gini index
-    min_cond_gini = min(all_cond_gini)
-    min_cond_gini_index = all_cond_gini.index(min_cond_gini)
+    min_cond_gini_index = np.argmin(all_cond_gini)
     # get the eigen value that generate the minimum conditional gini index
-    best_split_value = distinct_value[min_cond_gini_index]
-    return eigen, best_split_value, min_cond_gini
+    return eigen, distinct_value[min_cond_gini_index], all_cond_gini[min_cond_gini_index]
 
 
-def choose_best_split(data_set, eigens):
+def choose_best_split(data_set, eigens, executor=None, weights=None, eigen_subset=None):
     """
     Choose best split for data set
     :param data_set:
     :param eigens: dictionary of all eigens. Its index is eigen name, and values are eigen values
-    :return: best eigen name, best eigen value, minimum conditional gini index
+    :param executor: ParallelUtil.SplitExecutor to score eigens concurrently. None to score them one after another
+    :param weights: weight of each data. None means every weight is 1
+    :param eigen_subset: names of the eigens to be scored, e.g. eigens sampled for a node of random forest.
+            None means all eigens are scored
+    :return: best eigen name, best eigen value, minimum conditional gini index.
+             None, None, inf if no eigen has more than one value, so data set can't be split
     """
-    def best_split_of_all_eigens(eigen):
-        return best_split_of_eigen(data_set, eigens, eigen)
+    if eigen_subset is not None:
+        eigens = dict((eigen, eigens[eigen]) for eigen in eigen_subset)
     # find best split per eigen
-    best_split_per_eigen = map(best_split_of_all_eigens, eigens)
+    best_split_per_eigen = plu.map_eigens(executor, best_split_of_eigen, data_set, eigens, weights)
 
-    g_min_cond_gini = float('inf')
+    g_best_eigen, g_best_split_value, g_min_cond_gini = None, None, float('inf')
     for eigen, split_value, min_cond_gini in best_split_per_eigen:
         if min_cond_gini < g_min_cond_gini:
             g_best_eigen, g_best_split_value, g_min_cond_gini = eigen, split_value, min_cond_gini
@@ -94,16 +122,11 @@ def split_all(data_set, eigens, split_eigen, split_value):
             eigens_split[eigen] = orig_eigen_values[idx]
         yield data_set_split, eigens_split
 
-def mode(data_set):
+def mode(data_set, weights=None):
     """
     :param data_set:
-    :return: mode of data set
+    :param weights: weight of each data. None means every weight is 1
+    :return: mode of data set. When several data have maximum count, the last one is returned.
     """
-    distinct_data = set(data_set.flat)
-    #  lambda returns a tuple of (distinct data, its count)
-    l_dist_sum = lambda d: (d, sum(data_set == d))
-    distinct_data_sum_list = map(l_dist_sum, distinct_data)
-    # lambda returns the mode (= a data which has maximum count)
-    l_get_mode = lambda d1, d2: d1 if d1[1] > d2[1] else d2
-    mode = reduce(l_get_mode, distinct_data_sum_list)
-    return mode[0]
\ No newline at end of file
+    distinct_data, counts = class_counts(data_set, weights)
+    return distinct_data[len(counts) - 1 - np.argmax(counts[::-1])]
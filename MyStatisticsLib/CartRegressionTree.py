@@ -1,53 +1,670 @@
+import MyStatisticsLib.BestFirstUtil as bfu
 import MyStatisticsLib.CartRegressionTreeUtil as crtu
+import MyStatisticsLib.PartitionUtil as pu
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.WeightUtil as wu
+import MyStatisticsLib.FlatTree as ft
+import MyStatisticsLib.PruneUtil as pru
 import MyStatisticsLib.TreePlot as plt
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 
 class CartRegressionTree:
     data_set_size_threshold = 5
     deviation_sum_threshold = 1
+    # ParallelUtil.SplitExecutor used to score eigens concurrently, None to score them one after another
+    split_executor = None
+    # 不为None时，每个特征先被量化为最多max_bins个分位数区间，用区间的直方图选择分片特征值
+    max_bins = None
+    # 为True时，每个特征只在根结点排序一次，各结点按特征值的顺序扫描一遍数据就能算出所有分片的差方和。
+    # 差方和只有舍入误差的分片按同样的规则算作相同，所以得到的树和不排序时完全相同
+    presort = False
+    # 可以在每个实例上单独设置的参数，没有设置的参数使用上面的类属性
+    setting_names = ("data_set_size_threshold", "deviation_sum_threshold", "split_executor", "max_bins", "presort")
+    # 每个停止参数对应的结点属性：结点的属性小于参数时，结点作为叶结点
+    stop_statistics = {"data_set_size_threshold": "data_set_size", "deviation_sum_threshold": "deviation_sum"}
+    # 结点没有实例字典，只保存这些属性。左右孩子直接保存在结点上，叶结点的left和right是None
+    __slots__ = ("root", "left", "right", "split_eigen", "split_value", "prediction", "deviation_sum", "data_set_size",
+                 "prune_alpha", "prune_step", "cv_alpha", "instance_settings", "flat_tree")
 
-    def __init__(self, root=False):
+    def __init__(self, root=False, **settings):
+        """
+        :param root: 是否是根结点
+        :param settings: setting_names中的参数，只对这棵树有效，孩子结点继承父结点的参数。
+                参数不同的多棵树可以在多个线程中同时构造
+        """
+        for name in settings:
+            if name not in CartRegressionTree.setting_names:
+                raise TypeError("Unknown setting: " + name)
+        # 在实例上设置的参数。一棵树的所有结点共用这个字典，所以字典创建后不再修改
+        self.instance_settings = settings
         self.root = root
-        self.children = list()
+        self.left = None
+        self.right = None
         self.split_eigen = None
         self.split_value = None
         self.prediction = None
         self.deviation_sum = None
         self.data_set_size = None
+        # 剪枝时的alpha和剪枝顺序，由pruning_path计算
+        self.prune_alpha = float("inf")
+        self.prune_step = float("inf")
+        # post_prune用交叉验证选出的alpha
+        self.cv_alpha = None
+        # decide_all编译的扁平数组，树被构造、剪枝或截断时清空
+        self.flat_tree = None
+
+    @property
+    def children(self):
+        """
+        :return: 孩子结点的元组(左孩子, 右孩子)，叶结点返回空元组
+        """
+        return () if self.left is None else (self.left, self.right)
+
+    def setting(self, name):
+        """
+        :param name: setting_names中的参数名
+        :return: 参数在这棵树上的值，没有在实例上设置的参数使用类属性
+        """
+        return self.instance_settings.get(name, getattr(CartRegressionTree, name))
+
+    def settings(self):
+        """
+        :return: 在这个实例上设置的参数
+        """
+        return dict(self.instance_settings)
+
+    def worker_settings(self):
+        """
+        :return: 传给工作进程的参数，包括没有在实例上设置的参数的当前值。
+                 工作进程之间已经是并行的，从主进程继承来的线程池在工作进程中没有线程，不能再用它给特征打分
+        """
+        settings = dict((name, self.setting(name)) for name in CartRegressionTree.setting_names)
+        settings["split_executor"] = None
+        return settings
+
+    def new_child(self):
+        """
+        :return: 继承当前结点参数的孩子结点
+        """
+        child = CartRegressionTree()
+        child.instance_settings = self.instance_settings
+        return child
 
-    def build(self, data_set, eigens):
+    def build(self, data_set, eigens, in_place=False, weights=None, compress=False):
         """
         构造CART回归树
         :param data_set: 测试数据集，类型是单轴的numpy.array
         :param eigens: 特征字典，字典的键值是特征名，类型是字符串；字典的值是特征数组,类型是单轴的numpy.array
+        :param in_place: 为True时，数据集和特征字典不会被复制到孩子结点。所有结点共用一个下标数组，
+                每个结点只拥有下标数组中的一段，分片时原地划分这一段下标。
+        :param weights: 每个数据的权重，None表示权重都是1。预测值是加权平均值，差方和是加权差方和，
+                data_set_size是权重之和。有权重时总是原地划分下标。
+        :param compress: 为True时，先把重复的数据压缩成一个带权重的数据再构造，重复数据多时更快。
         :return:
         """
+        self.flat_tree = None
+        if compress:
+            data_set, eigens, weights = wu.compress_duplicates(data_set, eigens, weights)
+        if self.setting("max_bins") is not None:
+            self.build_on_bins(data_set, eigens, weights)
+            return
+        if self.setting("presort"):
+            self.build_presorted(data_set, eigens, weights)
+            return
+        if in_place or weights is not None:
+            self.build_on_index(data_set, eigens, np.arange(len(data_set)), 0, len(data_set), weights)
+            return
+
         self.prediction = np.average(data_set)
         self.data_set_size = len(data_set)
         self.deviation_sum = crtu.deviation_sum(data_set)
 
         # 如果数据集太小,终止分片.把当前节点作为叶结点返回.
-        if self.data_set_size < CartRegressionTree.data_set_size_threshold:
+        if self.data_set_size < self.setting("data_set_size_threshold"):
             return
         # 如果最小的差方和小于预设阈值,说明数据集分片已经足够好.把当前节点作为叶结点返回.
-        if self.deviation_sum < CartRegressionTree.deviation_sum_threshold:
+        if self.deviation_sum < self.setting("deviation_sum_threshold"):
             return
 
-        self.split_eigen, self.split_value, min_dev_sum = crtu.choose_best_split(data_set, eigens)
+        executor = self.setting("split_executor")
+        self.split_eigen, self.split_value, min_dev_sum = crtu.choose_best_split(data_set, eigens, executor)
+        # 如果每个特征都只有一个特征值，无法分片，把当前节点作为叶结点返回.
+        if self.split_eigen is None:
+            return
         # 根据选出的分片特征(split_eigen)和特征值(split_value),把数据集和特征字典分片
         splits = crtu.split_all(data_set, eigens, self.split_eigen, self.split_value)
         # 给每个分片创建相应的子树
-        for data_set_split, eigens_split in splits:
-            child = CartRegressionTree()
+        self.left, self.right = self.new_child(), self.new_child()
+        for child, (data_set_split, eigens_split) in zip((self.left, self.right), splits):
             child.build(data_set_split, eigens_split)
-            self.children.append(child)
+
+    def build_on_index(self, data_set, eigens, index, start, end, weights=None):
+        """
+        用下标数组的一段index[start:end]对应的数据构造子树
+        :param data_set: 全部训练数据
+        :param eigens: 全部训练数据的特征字典
+        :param index: 所有结点共用的下标数组
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :return:
+        """
+        mid = self.split_on_index(data_set, eigens, index, start, end, weights)
+        if mid is None:
+            return
+        # 给每个下标段创建相应的子树
+        self.left, self.right = self.new_child(), self.new_child()
+        self.left.build_on_index(data_set, eigens, index, start, mid, weights)
+        self.right.build_on_index(data_set, eigens, index, mid, end, weights)
+
+    def split_on_index(self, data_set, eigens, index, start, end, weights=None):
+        """
+        计算当前结点的预测值，选择分片特征和特征值，并原地划分下标段index[start:end]。不构造孩子结点。
+        :param data_set: 全部训练数据
+        :param eigens: 全部训练数据的特征字典
+        :param index: 所有结点共用的下标数组
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :return: 划分点mid，左孩子的下标段是index[start:mid]，右孩子的下标段是index[mid:end]。
+                 如果当前结点是叶结点，返回None
+        """
+        node_index = index[start:end]
+        # 当前结点的数据只在计算时临时取出
+        node_data_set = data_set[node_index]
+        node_weights = None if weights is None else weights[node_index]
+        if self.evaluate(node_data_set, node_weights):
+            return None
+
+        node_eigens = pu.EigensView(eigens, node_index)
+        executor = self.setting("split_executor")
+        self.split_eigen, self.split_value, min_dev_sum = crtu.choose_best_split(node_data_set, node_eigens, executor,
+                                                                                 node_weights)
+        if self.split_eigen is None:
+            return None
+        # 原地划分下标段，左孩子是特征值小于等于split_value的数据
+        return pu.partition(index, start, end, node_eigens[self.split_eigen] <= self.split_value)
+
+    def evaluate(self, node_data_set, node_weights=None):
+        """
+        计算当前结点的预测值、差方和和数据量，并判断当前结点是否应该作为叶结点
+        :param node_data_set: 当前结点的数据
+        :param node_weights: 当前结点的数据的权重，None表示权重都是1
+        :return: 如果数据集太小或者差方和已经足够小，返回True
+        """
+        self.prediction = np.average(node_data_set, weights=node_weights)
+        self.data_set_size = wu.total_weight(node_weights, len(node_data_set))
+        self.deviation_sum = crtu.deviation_sum(node_data_set, node_weights)
+
+        # 如果数据集太小,终止分片.把当前节点作为叶结点返回.
+        if self.data_set_size < self.setting("data_set_size_threshold"):
+            return True
+        # 如果最小的差方和小于预设阈值,说明数据集分片已经足够好.把当前节点作为叶结点返回.
+        return self.deviation_sum < self.setting("deviation_sum_threshold")
+
+    def build_best_first(self, data_set, eigens, max_leaves=None, max_depth=None, time_budget=None, weights=None):
+        """
+        按最优优先的顺序构造CART回归树。待分片的结点按分片使差方和减少的量排成优先队列，
+        每次分片减少最多的结点，直到叶结点数、树深或者时间用完。没有被分片的结点作为叶结点，所以总是得到一棵完整的树。
+        不给出任何限制时，得到的树和build(in_place=True)构造的树相同。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param max_leaves: 最多的叶结点数，None表示没有限制
+        :param max_depth: 最大树深，根结点的深度是1，None表示没有限制
+        :param time_budget: 构造树的秒数，None表示没有限制
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return: 叶结点数
+        """
+        self.flat_tree = None
+        index = np.arange(len(data_set))
+
+        def evaluate(node, segment, split):
+            start, end = segment
+            if not split:
+                # 预算用完的结点只计算预测值，不再选择分片特征
+                node_index = index[start:end]
+                node.evaluate(data_set[node_index], None if weights is None else weights[node_index])
+                return None
+            # 结点被选出时下标段已经划分好，没有被分片的结点不会影响其它结点的下标段
+            mid = node.split_on_index(data_set, eigens, index, start, end, weights)
+            if mid is None:
+                return None
+            left_index, right_index = index[start:mid], index[mid:end]
+            weight_splits = None if weights is None else (weights[left_index], weights[right_index])
+            dev_sum = crtu.cond_deviation_sum((data_set[left_index], data_set[right_index]), weight_splits)
+            return node.deviation_sum - dev_sum, 2, (start, mid, end)
+
+        def expand(node, split):
+            start, mid, end = split
+            node.left, node.right = node.new_child(), node.new_child()
+            return [(node.left, (start, mid)), (node.right, (mid, end))]
+
+        return bfu.grow_best_first(self, (0, len(data_set)), evaluate, expand, make_leaf, max_leaves, max_depth,
+                                   time_budget)
+
+    def build_on_bins(self, data_set, eigens, weights=None):
+        """
+        用直方图构造CART回归树。每个特征只在开始时被量化一次，分成最多max_bins个分位数区间。
+        每个结点的每个特征用一个直方图保存各区间的数据量、权重和、加权和与加权平方和，
+        分片特征值只在区间的上界中选择，从直方图的前缀和一次算出所有分片的差方和。
+        孩子中数据较少的一个直接统计直方图，另一个的直方图等于父结点的直方图减去它的兄弟的直方图。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return:
+        """
+        edges, binned_eigens = crtu.quantize_eigens(eigens, self.setting("max_bins"))
+        self.build_on_binned(data_set, edges, binned_eigens, np.arange(len(data_set)), weights)
+
+    def build_on_binned(self, data_set, edges, binned_eigens, index, weights=None, max_depth=None):
+        """
+        用已经量化的特征构造CART回归树。同一份量化后的特征可以用来构造很多棵树，例如梯度提升的每一轮。
+        :param data_set: 全部训练数据
+        :param edges: CartRegressionTreeUtil.quantize_eigens返回的每个特征的区间上界
+        :param binned_eigens: CartRegressionTreeUtil.quantize_eigens返回的全部数据所在的区间
+        :param index: 参与构造的数据的下标，例如抽样得到的数据。它会被原地划分
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :param max_depth: 树的最大深度，None表示不限制
+        :return:
+        """
+        self.flat_tree = None
+        bin_nums = dict((eigen, len(edges[eigen])) for eigen in edges)
+        # 差方和与数据的平移无关。直方图统计减去均值后的数据，减少求差方和时相减的精度损失
+        centered = data_set - np.average(data_set[index], weights=None if weights is None else weights[index])
+        histograms = crtu.histograms_of_rows(centered, binned_eigens, index, bin_nums, weights,
+                                             self.setting("split_executor"))
+        self.build_on_histograms(data_set, centered, binned_eigens, edges, index, 0, len(index), histograms,
+                                 weights, max_depth)
+
+    def build_on_histograms(self, data_set, centered, binned_eigens, edges, index, start, end, histograms,
+                            weights=None, max_depth=None):
+        """
+        用下标数组的一段index[start:end]对应的数据和它们的直方图构造子树
+        :param data_set: 全部训练数据
+        :param centered: 减去均值后的全部训练数据
+        :param binned_eigens: 特征字典，字典的值是全部数据所在的区间
+        :param edges: 特征字典，字典的值是每个区间的上界
+        :param index: 所有结点共用的下标数组
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param histograms: 当前结点每个特征的直方图
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :param max_depth: 子树的最大深度，None表示不限制
+        :return:
+        """
+        node_index = index[start:end]
+        if self.evaluate(data_set[node_index], None if weights is None else weights[node_index]):
+            return
+        # 达到最大深度，把当前节点作为叶结点返回.
+        if max_depth is not None and max_depth <= 1:
+            return
+
+        min_dev_sum = float("inf")
+        for eigen, hist in histograms.items():
+            best_bin, dev_sum = crtu.best_split_of_histogram(hist)
+            if dev_sum < min_dev_sum:
+                split_bin, self.split_eigen, min_dev_sum = best_bin, eigen, dev_sum
+        # 如果每个特征都只有一个非空区间，无法分片，把当前节点作为叶结点返回.
+        if self.split_eigen is None:
+            return
+        self.split_value = edges[self.split_eigen][split_bin]
+        # 原地划分下标段，左孩子是区间不大于split_bin，即特征值小于等于split_value的数据
+        mid = pu.partition(index, start, end, binned_eigens[self.split_eigen][node_index] <= split_bin)
+
+        # 数据较少的孩子直接统计直方图，另一个孩子的直方图由父结点的直方图减去它得到
+        small_start, small_end = (start, mid) if mid - start <= end - mid else (mid, end)
+        bin_nums = dict((eigen, len(edges[eigen])) for eigen in edges)
+        small_histograms = crtu.histograms_of_rows(centered, binned_eigens, index[small_start:small_end], bin_nums,
+                                                   weights, self.setting("split_executor"))
+        large_histograms = dict((eigen, histograms[eigen] - small_histograms[eigen]) for eigen in histograms)
+        self.left, self.right = self.new_child(), self.new_child()
+        for child, child_start, child_end in ((self.left, start, mid), (self.right, mid, end)):
+            child_histograms = small_histograms if child_start == small_start else large_histograms
+            child.build_on_histograms(data_set, centered, binned_eigens, edges, index, child_start, child_end,
+                                      child_histograms, weights, None if max_depth is None else max_depth - 1)
+
+    def build_presorted(self, data_set, eigens, weights=None):
+        """
+        用预排序的特征构造CART回归树。每个特征只在开始时排序一次，得到按特征值排序的下标数组。
+        结点分片时，每个特征的有序下标段都被稳定地原地划分，孩子的下标段仍然按特征值有序，不需要再排序。
+        每个结点按特征值的顺序扫描一遍数据，用累加和与平方累加和算出所有分片特征值的差方和。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return:
+        """
+        size = len(data_set)
+        sorted_index = dict((eigen, np.argsort(eigens[eigen], kind="stable")) for eigen in eigens)
+        # 所有结点共用的工作数组，保存数据在当前结点下标段中的位置和是否属于左孩子
+        position = np.empty(size, dtype=np.intp)
+        is_left = np.empty(size, dtype=bool)
+        self.build_on_presorted(data_set, eigens, np.arange(size), sorted_index, 0, size, (position, is_left),
+                                weights)
+
+    def build_on_presorted(self, data_set, eigens, index, sorted_index, start, end, work, weights=None):
+        """
+        用下标数组的一段index[start:end]对应的数据构造子树
+        :param data_set: 全部训练数据
+        :param eigens: 全部训练数据的特征字典
+        :param index: 所有结点共用的下标数组，结点的下标段保持数据原来的顺序
+        :param sorted_index: 特征字典，字典的值是所有结点共用的下标数组，结点的下标段按特征值排序
+        :param start: 当前结点下标段的起点
+        :param end: 当前结点下标段的终点（不包含）
+        :param work: build_presorted创建的工作数组
+        :param weights: 全部训练数据的权重，None表示权重都是1
+        :return:
+        """
+        node_index = index[start:end]
+        node_data_set = data_set[node_index]
+        node_weights = None if weights is None else weights[node_index]
+        if self.evaluate(node_data_set, node_weights):
+            return
+
+        position, is_left = work
+        position[node_index] = np.arange(end - start)
+        # 每一行是按一个特征的特征值排序后，当前结点的数据在node_data_set中的位置
+        orders = np.vstack([position[sorted_index[eigen][start:end]] for eigen in eigens])
+        row_of_eigen = dict((eigen, row) for row, eigen in enumerate(eigens))
+        node_eigens = pu.EigensView(eigens, node_index)
+        best_split_per_eigen = plu.map_eigens(self.setting("split_executor"), crtu.best_split_of_presorted,
+                                              node_data_set, node_eigens, orders, row_of_eigen, node_weights)
+        self.split_eigen, self.split_value, min_dev_sum = crtu.best_of_splits(best_split_per_eigen,
+                                                                                 self.deviation_sum)
+        if self.split_eigen is None:
+            return
+
+        # 原地划分下标段，左孩子是特征值小于等于split_value的数据
+        left = node_eigens[self.split_eigen] <= self.split_value
+        is_left[node_index] = left
+        mid = pu.partition(index, start, end, left)
+        for eigen in eigens:
+            pu.partition(sorted_index[eigen], start, end, is_left[sorted_index[eigen][start:end]])
+        self.left, self.right = self.new_child(), self.new_child()
+        self.left.build_on_presorted(data_set, eigens, index, sorted_index, start, mid, work, weights)
+        self.right.build_on_presorted(data_set, eigens, index, sorted_index, mid, end, work, weights)
+
+    def build_parallel(self, data_set, eigens, workers=None, size_threshold=100000, weights=None):
+        """
+        用多个进程并行构造树。数据集、特征字典和下标数组只在共享内存中保存一份。
+        数据量大于size_threshold的结点由主进程分片；数据量不大于size_threshold的孩子子树交给工作进程构造。
+        工作进程在共享内存中原地划分自己的下标段，返回紧凑格式的子树，主进程再把它嫁接到父结点上。
+        得到的树和串行构造的树完全相同。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param workers: 工作进程数
+        :param size_threshold: 交给工作进程构造的子树的最大数据量
+        :param weights: 每个数据的权重，None表示权重都是1
+        :return:
+        """
+        self.flat_tree = None
+        # 直方图模式和预排序模式的分片很快，只串行构造
+        if len(data_set) <= size_threshold or self.setting("max_bins") is not None or self.setting("presort"):
+            self.build(data_set, eigens, in_place=True, weights=weights)
+            return
+
+        arrays = {"data_set": data_set, "index": np.arange(len(data_set))}
+        if weights is not None:
+            arrays["weights"] = weights
+        for eigen in eigens:
+            arrays[("eigen", eigen)] = eigens[eigen]
+        settings = self.worker_settings()
+        shared = plu.SharedArrays(arrays)
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                shared_data_set, shared_index = shared.arrays["data_set"], shared.arrays["index"]
+                shared_eigens = dict((eigen, shared.arrays[("eigen", eigen)]) for eigen in eigens)
+                shared_weights = shared.arrays.get("weights")
+                # grafts保存等待工作进程返回的(孩子结点, future)
+                grafts = list()
+                stack = [(self, 0, len(data_set))]
+                while len(stack) > 0:
+                    node, start, end = stack.pop()
+                    if node is not self and end - start <= size_threshold:
+                        future = pool.submit(build_subtree_in_worker, shared.descriptor(), start, end, settings)
+                        grafts.append((node, future))
+                        continue
+                    mid = node.split_on_index(shared_data_set, shared_eigens, shared_index, start, end, shared_weights)
+                    if mid is None:
+                        continue
+                    node.left, node.right = node.new_child(), node.new_child()
+                    stack.append((node.right, mid, end))
+                    stack.append((node.left, start, mid))
+                del shared_data_set, shared_index, shared_eigens, shared_weights
+                # 把工作进程构造的子树嫁接到父结点上
+                for node, future in grafts:
+                    node.from_compact(future.result())
+        finally:
+            shared.close()
+
+    def to_compact(self):
+        """
+        把子树转换为紧凑格式，用于在进程之间传递子树
+        :return: 先序排列的结点属性元组列表，元组的格式为(是否有孩子, 分片特征, 分片特征值, 预测值, deviation_sum, 数据量)
+        """
+        compact = list()
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            compact.append((node.left is not None, node.split_eigen, node.split_value, node.prediction,
+                            node.deviation_sum, node.data_set_size))
+            if node.left is not None:
+                stack.append(node.right)
+                stack.append(node.left)
+        return compact
+
+    def from_compact(self, compact):
+        """
+        用紧凑格式恢复子树，当前结点是子树的根结点
+        :param compact: to_compact返回的结点属性元组列表
+        :return:
+        """
+        self.flat_tree = None
+        stack = [self]
+        for has_children, split_eigen, split_value, prediction, deviation_sum, data_set_size in compact:
+            node = stack.pop()
+            node.split_eigen, node.split_value, node.prediction = split_eigen, split_value, prediction
+            node.deviation_sum, node.data_set_size = deviation_sum, data_set_size
+            if has_children:
+                node.left, node.right = node.new_child(), node.new_child()
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def decide(self, eigen):
+        """
+        根据一个输入样本的特征值进行预测，返回预测值
+        :param eigen: 特征字典，包含一个样本的每个特征的值
+        :return: 预测值
+        """
+        node = self
+        try:
+            # 特征值小于等于分片特征值时走向左孩子，否则走向右孩子，直到叶结点
+            while node.left is not None:
+                node = node.left if eigen[node.split_eigen] <= node.split_value else node.right
+            return node.prediction
+        except KeyError as e:
+            print("Key doesn't exist: " + e.__str__())
+
+    def compile(self):
+        """
+        把树编译为扁平数组，用于批量预测。每次调用都重新编译，树被修改后需要重新编译。
+        :return: FlatTree.FlatRegressionTree
+        """
+        return ft.FlatRegressionTree(self)
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        对多个样本进行预测。树先被编译为扁平数组，所有样本一层一层地一起沿树向下走，
+        每层只做一次向量化的比较，不对每个样本调用Python函数。
+        编译结果保存在flat_tree中，直到树被重新构造、剪枝或截断。用其它方式修改树后需要把flat_tree设为None
+        :param eigens: 特征字典，包含多个样本的每个特征的值；或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: numpy.array，每个样本的预测值
+        """
+        if self.flat_tree is None:
+            self.flat_tree = self.compile()
+        return self.flat_tree.decide_all(eigens, eigen_names)
+
+    def nodes(self):
+        """
+        不用递归，按先序遍历树的所有结点
+        :return: 结点的generator
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            if node.left is not None:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def pruning_path(self):
+        """
+        用弱连接剪枝计算剪枝序列。结点作为叶结点时的损失是它的差方和(deviation_sum)。
+        树既不复制也不修改，只在被剪枝的子树的根结点上保存剪枝时的alpha(prune_alpha)和剪枝顺序(prune_step，从1开始)。
+        第k棵子树就是把prune_step<=k的结点作为叶结点得到的树。
+        :return: 剪枝序列，元素的格式为(alpha, 被剪枝的子树)
+        """
+        nodes = list(self.nodes())
+        for node in nodes:
+            node.prune_alpha, node.prune_step = float("inf"), float("inf")
+        parent = pru.parents_of(nodes, lambda node: node.children)
+        node_loss = np.array([node.deviation_sum for node in nodes], dtype=float)
+        is_leaf = np.array([node.left is None for node in nodes])
+
+        path = list()
+        for step, (alpha, k) in enumerate(pru.weakest_link_path(parent, node_loss, is_leaf)):
+            nodes[k].prune_alpha, nodes[k].prune_step = alpha, step + 1
+            path.append((alpha, nodes[k]))
+        return path
+
+    def prune_by_path(self, alpha):
+        """
+        用pruning_path计算的prune_alpha剪枝，剪掉prune_alpha<=alpha的子树
+        :param alpha: alpha
+        :return:
+        """
+        for node in list(self.nodes()):
+            node.flat_tree = None
+            if node.prune_alpha <= alpha:
+                node.left, node.right = None, None
+
+    def errors_of_path(self, test_data_set, test_eigens, test_weights=None):
+        """
+        计算剪枝序列中每棵树在测试数据上的误差平方和。必须先调用pruning_path。
+        测试数据一次性沿整树向下划分。剪枝序列中第k棵树对一个样本的预测，等于该样本路径上第一个prune_step<=k的结点的
+        预测值，否则等于叶结点的预测值。所以一次遍历就能得到序列中所有树的误差。
+        :param test_data_set: 测试数据集
+        :param test_eigens: 测试数据集的特征字典
+        :param test_weights: 测试数据的权重，None表示权重都是1
+        :return: numpy.array，第k个元素是第k棵树的误差平方和，0号是整树
+        """
+        steps = sum(1 for node in self.nodes() if node.prune_step != float("inf"))
+        # error_change[k]是第k棵树比第k-1棵树多出的误差
+        error_change = np.zeros(steps + 2)
+        # 栈的元素格式为(结点, 到达该结点的测试样本下标, 祖先中最小的prune_step)
+        stack = [(self, np.arange(len(test_data_set)), float("inf"))]
+        while len(stack) > 0:
+            node, index, ancestor_step = stack.pop()
+            residual = test_data_set[index] - node.prediction
+            error = np.dot(residual, residual if test_weights is None else test_weights[index] * residual)
+            if node.left is None:
+                # 在祖先被剪枝之前，叶结点的预测有效
+                error_change[0] += error
+                error_change[min(ancestor_step, steps + 1)] -= error
+                continue
+            if node.prune_step < ancestor_step:
+                # 从结点被剪枝起，到祖先被剪枝之前，这个结点的预测有效
+                error_change[node.prune_step] += error
+                error_change[min(ancestor_step, steps + 1)] -= error
+            left = test_eigens[node.split_eigen][index] <= node.split_value
+            node_step = min(node.prune_step, ancestor_step)
+            stack.append((node.right, index[~left], node_step))
+            stack.append((node.left, index[left], node_step))
+        return np.cumsum(error_change)[:steps + 1]
+
+    def post_prune(self, data_set, eigens, folds=5, workers=None, weights=None, random_state=None):
+        """
+        用k折交叉验证选择alpha，对CART回归树做后剪枝。当前树必须是用data_set和eigens构造的。
+        先计算当前树的剪枝序列，第k棵树在alpha属于[alpha_k, alpha_k+1)时最优，用区间的几何平均数beta_k代表它。
+        每一折在一个工作进程中用其余数据构造一棵树，计算它的剪枝序列，再求出每个beta_k对应的树在这一折上的误差。
+        各折的误差相加后，选择误差最小的beta_k中最大的一个（树最小），把当前树剪枝为第k棵树。
+        数据集和特征字典只在共享内存中保存一份。
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param folds: 交叉验证的折数
+        :param workers: 工作进程数
+        :param weights: 每个数据的权重，None表示权重都是1
+        :param random_state: 划分各折的随机数种子
+        :return: 剪枝后的树。当前树被原地剪枝后返回，选出的alpha保存在cv_alpha中。
+        """
+        path = self.pruning_path()
+        alphas = np.array([0.] + [alpha for alpha, node in path] + [float("inf")])
+        with np.errstate(invalid="ignore"):
+            betas = np.where(np.isinf(alphas[1:]), alphas[:-1], np.sqrt(alphas[:-1] * alphas[1:]))
+
+        fold_of_data = np.random.RandomState(random_state).permutation(len(data_set)) % folds
+        arrays = {"data_set": data_set, "fold": fold_of_data}
+        if weights is not None:
+            arrays["weights"] = weights
+        for eigen in eigens:
+            arrays[("eigen", eigen)] = eigens[eigen]
+        settings = self.worker_settings()
+        with plu.SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(fold_errors_in_worker, shared.descriptor(), fold, settings, betas)
+                           for fold in range(folds)]
+                cv_errors = sum(future.result() for future in futures)
+
+        # 误差最小的树中选择最后出现的那一棵(树最小)
+        best_step = len(cv_errors) - 1 - int(np.argmin(cv_errors[::-1]))
+        self.cv_alpha = alphas[best_step]
+        for node in list(self.nodes()):
+            node.flat_tree = None
+            if node.prune_step <= best_step:
+                node.left, node.right = None, None
+        return self
+
+    def truncate(self, **settings):
+        """
+        把树原地截断为用更严格的停止参数构造的树。结点选择的分片和停止参数无关，
+        所以截断得到的树和用这些参数重新构造的树完全相同，不需要重新训练。
+        :param settings: stop_statistics中的参数，不能比构造这棵树时使用的参数更宽松
+        :return:
+        """
+        instance_settings = dict(self.instance_settings, **settings)
+        for node in self.nodes():
+            node.instance_settings = instance_settings
+            node.flat_tree = None
+            if node.left is not None and node.stops(settings):
+                # 先序遍历时孩子还没有入栈，被截断的子树不会再被遍历
+                node.left, node.right = None, None
+                make_leaf(node)
+
+    def stops(self, settings):
+        """
+        :param settings: stop_statistics中的参数
+        :return: 用这些参数构造树时，当前结点是否作为叶结点
+        """
+        return any(getattr(self, statistic) < settings[name]
+                   for name, statistic in CartRegressionTree.stop_statistics.items() if name in settings)
+
+    def route(self, columns, index):
+        """
+        把到达当前结点的样本分给孩子。特征值小于等于split_value的样本分给左孩子，其它样本分给右孩子
+        :param columns: 特征字典，字典的值是单轴的numpy.array
+        :param index: 到达当前结点的样本下标
+        :return: 按孩子的顺序，分给每个孩子的样本下标
+        """
+        left = columns[self.split_eigen][index] <= self.split_value
+        return [index[left], index[~left]]
 
     def traverse(self):
         """
         :return:  CART Tree in dictionary format
         """
-        if len(self.children) != 0:
+        if self.left is not None:
             tree = dict()
             sub_tree = dict()
             split_value = str(self.split_value)
@@ -64,4 +681,62 @@ class CartRegressionTree:
         draw CART Tree
         """
         tree_in_dict = self.traverse()
-        plt.createPlot(tree_in_dict)
\ No newline at end of file
+        plt.createPlot(tree_in_dict)
+
+
+def make_leaf(node):
+    """
+    把已经选择了分片特征、但没有被分片的结点变为叶结点
+    :param node: 结点
+    """
+    node.split_eigen, node.split_value = None, None
+
+
+def build_subtree_in_worker(descriptor, start, end, settings):
+    """
+    在工作进程中构造子树。数据集、特征字典和下标数组从共享内存中读取。
+    :param descriptor: ParallelUtil.SharedArrays.descriptor返回的共享内存描述
+    :param start: 子树的下标段的起点
+    :param end: 子树的下标段的终点（不包含）
+    :param settings: 主进程中的树的worker_settings
+    :return: 紧凑格式的子树
+    """
+    shm, arrays = plu.attach(descriptor)
+    try:
+        eigens = dict((key[1], value) for key, value in arrays.items() if isinstance(key, tuple))
+        subtree = CartRegressionTree(**settings)
+        subtree.build_on_index(arrays["data_set"], eigens, arrays["index"], start, end, arrays.get("weights"))
+        return subtree.to_compact()
+    finally:
+        # 关闭共享内存前，先释放对它的引用
+        del arrays, eigens
+        shm.close()
+
+
+def fold_errors_in_worker(descriptor, fold, settings, betas):
+    """
+    在工作进程中完成交叉验证的一折：用其余数据构造树，计算剪枝序列和每个beta对应的树在这一折上的误差平方和。
+    :param descriptor: ParallelUtil.SharedArrays.descriptor返回的共享内存描述
+    :param fold: 这一折的编号
+    :param settings: 主进程中的树的worker_settings
+    :param betas: 每个alpha区间的代表值
+    :return: numpy.array，每个beta对应的树的误差平方和
+    """
+    shm, arrays = plu.attach(descriptor)
+    try:
+        data_set, fold_of_data, weights = arrays["data_set"], arrays["fold"], arrays.get("weights")
+        eigens = dict((key[1], value) for key, value in arrays.items() if isinstance(key, tuple))
+        train, test = np.flatnonzero(fold_of_data != fold), np.flatnonzero(fold_of_data == fold)
+        tree = CartRegressionTree(root=True, **settings)
+        tree.build(data_set[train], dict((eigen, values[train]) for eigen, values in eigens.items()),
+                   weights=None if weights is None else weights[train])
+        path = tree.pruning_path()
+        errors = tree.errors_of_path(data_set[test], dict((eigen, values[test]) for eigen, values in eigens.items()),
+                                     None if weights is None else weights[test])
+        # beta对应的树是剪掉所有prune_alpha<=beta的子树后的树
+        steps = np.searchsorted([alpha for alpha, node in path], betas, side="right")
+        return errors[steps]
+    finally:
+        # 关闭共享内存前，先释放对它的引用
+        del arrays, eigens, data_set, fold_of_data, weights
+        shm.close()
@@ -1,33 +1,52 @@
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.PartitionUtil as pu
 import numpy as np
 
 
-def deviation_sum(data_set):
-    return np.var(data_set) * len(data_set)
+def deviation_sum(data_set, weights=None):
+    """
+    deviation sum = variance * (sample number)
+    :param data_set:
+    :param weights: weight of each data. None means every weight is 1.
+            Weighted deviation sum is sum(weight * (data - weighted mean)^2)
+    :return:
+    """
+    if weights is None:
+        return np.var(data_set) * len(data_set)
+    total = weights.sum()
+    if total == 0:
+        return 0.0
+    mean = np.dot(weights, data_set) / total
+    return float(np.dot(weights, (data_set - mean) ** 2))
 
 
-def cond_deviation_sum(splits):
+def cond_deviation_sum(splits, weight_splits=None):
     """
     calculate deviation sum of splits
     deviation sum = variance * (sample number)
     :param splits: tuple of (s1, s2),
     s1 is split whose data is less than split value.
     s2 is split whose data is greater than split value
+    :param weight_splits: tuple of weights of (s1, s2). None means every weight is 1
     :return:
     """
     s1, s2 = splits
-    s1_dev_sum = deviation_sum(s1)
+    w1, w2 = (None, None) if weight_splits is None else weight_splits
+    s1_dev_sum = deviation_sum(s1, w1)
     # If s2 is empty, it's impossible to split data set.
     # So, don't let it happen by set s2_dev_sum = float('inf').
-    s2_dev_sum = deviation_sum(s2) if len(s2) != 0 else float('inf')
+    s2_dev_sum = deviation_sum(s2, w2) if len(s2) != 0 else float('inf')
     return s1_dev_sum + s2_dev_sum
 
 
-def best_split_of_eigen(data_set, eigens, eigen):
+def best_split_of_eigen(data_set, eigens, eigen, weights=None):
     """
     尝试用指定的特征名（eigen）的每一个特征值把数据集分片，找到对应最小差方和的特征值
+    差方和在舍入误差范围内相同的特征值中，选择最小的一个，见ties_of_minimum
     :param data_set: 数据集，类型是单轴的numpy.array
     :param eigens: dictionary of all eigens. Its index is eigen name, and values are eigen values
     :param eigen: 特征名
+    :param weights: 每个数据的权重，None表示权重都是1
     :return: specified eigen name, best eigen value, minimum deviation sum
     """
     def split_data_set(distinct_value):
@@ -36,38 +55,63 @@ def best_split_of_eigen(data_set, eigens, eigen):
         s2 = data_set[eigen_values > distinct_value]
         return s1, s2
 
+    def split_weights(distinct_value):
+        return weights[eigen_values <= distinct_value], weights[eigen_values > distinct_value]
+
     eigen_values = eigens[eigen]
-    distinct_value = list(set(eigen_values))
+    distinct_value = np.unique(eigen_values)
     # get splits per each distinct eigen value
     all_splits = map(split_data_set, distinct_value)
     # calculate deviation sum of splits per each distinct eigen value
-    all_dev_sum = list(map(cond_deviation_sum, all_splits))
-    # get minimum deviation sum
-    min_dev_sum = min(all_dev_sum)
-    min_dev_sum_index = all_dev_sum.index(min_dev_sum)
-    # get the eigen value that generate the minimum deviation sum
-    best_split_value = distinct_value[min_dev_sum_index]
-    return eigen, best_split_value, min_dev_sum
+    if weights is None:
+        all_dev_sum = list(map(cond_deviation_sum, all_splits))
+    else:
+        all_dev_sum = list(map(cond_deviation_sum, all_splits, map(split_weights, distinct_value)))
+    # get the smallest eigen value that generate the minimum deviation sum
+    best = np.flatnonzero(ties_of_minimum(all_dev_sum, deviation_sum(data_set, weights)))[0]
+    return eigen, distinct_value[best], all_dev_sum[best]
 
 
-def choose_best_split(data_set, eigens):
+def choose_best_split(data_set, eigens, executor=None, weights=None):
     """
     Choose best split for data set
     :param data_set:
     :param eigens: dictionary of all eigens. Its index is eigen name, and values are eigen values
+    :param executor: ParallelUtil.SplitExecutor to score eigens concurrently. None to score them one after another
+    :param weights: weight of each data. None means every weight is 1
     :return: best eigen name, best eigen value, minimum deviation sum
-              if g_min_sqr_sum is "inf", it's not possible to split data set
+              if g_min_sqr_sum is "inf", it's not possible to split data set, and best eigen name is None
     """
-    def best_split_of_all_eigens(eigen):
-        return best_split_of_eigen(data_set, eigens, eigen)
     # find best split per eigen
-    best_split_per_eigen = map(best_split_of_all_eigens, eigens)
+    best_split_per_eigen = plu.map_eigens(executor, best_split_of_eigen, data_set, eigens, weights)
+    return best_of_splits(best_split_per_eigen, deviation_sum(data_set, weights))
+
 
-    g_min_dev_sum = float('inf')
-    for eigen, split_value, min_dev_sum in best_split_per_eigen:
-        if min_dev_sum < g_min_dev_sum:
-            g_best_eigen, g_best_split_value, g_min_dev_sum = eigen, split_value, min_dev_sum
-    return g_best_eigen, g_best_split_value, g_min_dev_sum
+def best_of_splits(best_split_per_eigen, total_dev_sum=0.):
+    """
+    :param best_split_per_eigen: list of (eigen name, best eigen value, minimum deviation sum) of each eigen
+    :param total_dev_sum: deviation sum of the node, it scales the tolerance of ties, see ties_of_minimum
+    :return: the split with minimum deviation sum. When several eigens have it, the first one is returned.
+              best eigen name is None if it's not possible to split data set
+    """
+    best_split_per_eigen = list(best_split_per_eigen)
+    all_dev_sum = [min_dev_sum for eigen, split_value, min_dev_sum in best_split_per_eigen]
+    if len(all_dev_sum) == 0 or min(all_dev_sum) == float('inf'):
+        return None, None, float('inf')
+    return best_split_per_eigen[np.flatnonzero(ties_of_minimum(all_dev_sum, total_dev_sum))[0]]
+
+
+def ties_of_minimum(all_dev_sum, total_dev_sum):
+    """
+    find deviation sums which are equal to the minimum up to rounding errors. The same split gets slightly different
+    deviation sums from np.var and from running sums, so every way of choosing splits regards them as ties and
+    chooses the first one, and the presorted build gets the same tree as the default build.
+    :param all_dev_sum: deviation sums of splits
+    :param total_dev_sum: deviation sum of the node. The tolerance is relative to it and to the minimum
+    :return: boolean numpy.array, True for deviation sums tied with the minimum
+    """
+    all_dev_sum = np.asarray(all_dev_sum, dtype=float)
+    return np.isclose(all_dev_sum, all_dev_sum.min(), rtol=1e-9, atol=1e-9 * max(total_dev_sum, 0))
 
 
 def split_all(data_set, eigens, split_eigen, split_value):
@@ -87,4 +131,145 @@ def split_all(data_set, eigens, split_eigen, split_value):
         for eigen in eigens:
             orig_eigen_values = eigens[eigen]
             eigens_split[eigen] = orig_eigen_values[idx]
-        yield data_set_split, eigens_split
\ No newline at end of file
+        yield data_set_split, eigens_split
+
+
+def quantize(eigen_values, max_bins):
+    """
+    quantize a continuous eigen into at most max_bins quantile bins
+    bin b holds the values in (edges[b-1], edges[b]], so "value <= edges[b]" is the same as "code <= b".
+    If the eigen has no more than max_bins distinct values, every distinct value has its own bin.
+    :param eigen_values: values of the eigen
+    :param max_bins: maximum number of bins
+    :return: edges => upper bound of each bin. They are values of the eigen, in ascending order
+              codes => bin of each value
+    """
+    edges = np.unique(eigen_values)
+    if len(edges) > max_bins:
+        quantiles = np.arange(1, max_bins + 1) / float(max_bins)
+        edges = np.unique(np.quantile(eigen_values, quantiles, method="inverted_cdf"))
+    codes = np.searchsorted(edges, eigen_values, side="left")
+    return edges, codes.astype(np.min_scalar_type(len(edges) - 1))
+
+
+def quantize_eigens(eigens, max_bins):
+    """
+    quantize every eigen with quantize
+    :param eigens: dictionary of all eigens. Its index is eigen name, and values are eigen values
+    :param max_bins: maximum number of bins of each eigen
+    :return: edges => dictionary of eigen name and upper bound of each bin
+              binned_eigens => dictionary of eigen name and bin of each value
+    """
+    edges, binned_eigens = dict(), dict()
+    for eigen in eigens:
+        edges[eigen], binned_eigens[eigen] = quantize(eigens[eigen], max_bins)
+    return edges, binned_eigens
+
+
+def histogram(data_set, codes, bin_num, weights=None):
+    """
+    :param data_set:
+    :param codes: bin of each data, returned by quantize
+    :param bin_num: number of bins
+    :param weights: weight of each data. None means every weight is 1
+    :return: array of shape (4, bin_num). Rows are number of data, sum of weights, weighted sum of data and
+              weighted sum of squares of data in each bin
+    """
+    weights = np.ones(len(data_set)) if weights is None else weights
+    weighted_data_set = weights * data_set
+    return np.vstack((np.bincount(codes, minlength=bin_num),
+                      np.bincount(codes, weights, minlength=bin_num),
+                      np.bincount(codes, weighted_data_set, minlength=bin_num),
+                      np.bincount(codes, weighted_data_set * data_set, minlength=bin_num)))
+
+
+def histogram_of_eigen(data_set, binned_eigens, eigen, bin_nums, weights=None):
+    """
+    histogram of one eigen. It's the scoring function used with executor.
+    :param data_set:
+    :param binned_eigens: dictionary of eigen name and bin of each data
+    :param eigen: eigen name
+    :param bin_nums: dictionary of eigen name and number of bins
+    :param weights: weight of each data. None means every weight is 1
+    :return: histogram of the eigen
+    """
+    return histogram(data_set, binned_eigens[eigen], bin_nums[eigen], weights)
+
+
+def histograms_of_rows(data_set, binned_eigens, rows, bin_nums, weights=None, executor=None):
+    """
+    histograms of all eigens of some rows
+    :param data_set: all data
+    :param binned_eigens: dictionary of eigen name and bin of all data
+    :param rows: index of the rows
+    :param bin_nums: dictionary of eigen name and number of bins
+    :param weights: weight of all data. None means every weight is 1
+    :param executor: ParallelUtil.SplitExecutor to count eigens concurrently. None to count them one after another
+    :return: dictionary of eigen name and histogram
+    """
+    row_weights = None if weights is None else weights[rows]
+    histograms = plu.map_eigens(executor, histogram_of_eigen, data_set[rows], pu.EigensView(binned_eigens, rows),
+                                bin_nums, row_weights)
+    return dict(zip(binned_eigens.keys(), histograms))
+
+
+def best_split_of_histogram(hist):
+    """
+    find the bin to split data set "code <= bin" vs "code > bin" which generates minimum deviation sum.
+    Deviation sums of all bins are derived from prefix sums of the histogram, data is not read again.
+    deviation sum = weighted sum of squares - (weighted sum)^2 / sum of weights
+    :param hist: histogram returned by histogram
+    :return: best bin, minimum deviation sum. Deviation sum is "inf" if it's not possible to split data set.
+    """
+    left = np.cumsum(hist, axis=1)
+    right = left[:, -1:] - left
+
+    def dev_sum(part):
+        return np.maximum(part[3] - part[2] * part[2] / np.where(part[1] > 0, part[1], 1), 0)
+
+    all_dev_sum = dev_sum(left) + dev_sum(right)
+    # Splitting at an empty bin is the same as splitting at the bin before it.
+    # Splitting at the last non-empty bin gets an empty right split, which is not possible.
+    all_dev_sum[(hist[0] == 0) | (right[0] == 0)] = float("inf")
+    best_bin = int(np.argmin(all_dev_sum))
+    return best_bin, all_dev_sum[best_bin]
+
+
+def best_split_of_presorted(data_set, eigens, eigen, orders, row_of_eigen, weights=None):
+    """
+    The same as best_split_of_eigen, but data set is scanned once in the order of eigen values.
+    Deviation sums of all eigen values are derived from running sums and running sums of squares, so they may
+    differ from cond_deviation_sum by rounding errors. Like best_split_of_eigen, when several eigen values have the
+    same deviation sum up to rounding errors, the smallest one is chosen.
+    :param data_set: data set of the node
+    :param eigens: dictionary of eigens of the node
+    :param eigen: eigen name
+    :param orders: 2-D array. Each row is positions of data of the node sorted by values of an eigen
+    :param row_of_eigen: dictionary of eigen name and row of orders
+    :param weights: weight of each data. None means every weight is 1
+    :return: specified eigen name, best eigen value, minimum deviation sum
+    """
+    order = orders[row_of_eigen[eigen]]
+    eigen_values = eigens[eigen]
+    sorted_values = eigen_values[order]
+    # last position of each distinct value, except the maximum value whose s2 is empty
+    last = np.flatnonzero(sorted_values[1:] != sorted_values[:-1])
+    if len(last) == 0:
+        return eigen, sorted_values[0], float("inf")
+
+    sorted_weights = np.ones(len(order)) if weights is None else weights[order]
+    # deviation sum doesn't change when data is shifted. Shift data to reduce loss of precision.
+    sorted_data = data_set[order] - np.average(data_set, weights=weights)
+    running = np.cumsum(np.vstack((sorted_weights, sorted_weights * sorted_data,
+                                   sorted_weights * sorted_data * sorted_data)), axis=1)
+    left = running[:, last]
+    right = running[:, -1:] - left
+
+    def dev_sum(part):
+        return part[2] - part[1] * part[1] / np.where(part[0] > 0, part[0], 1)
+
+    all_dev_sum = dev_sum(left) + dev_sum(right)
+
+    # among ties the smallest eigen value is chosen
+    best = np.flatnonzero(ties_of_minimum(all_dev_sum, dev_sum(running[:, -1])))[0]
+    return eigen, sorted_values[last[best]], max(all_dev_sum[best], 0.)
@@ -0,0 +1,90 @@
+import numpy as np
+import csv
+
+
+class IteratorChunks:
+    """
+    Chunks read from an iterator.
+    Training reads chunks many times, so a function which returns a new iterator is saved instead of the iterator.
+    """
+    def __init__(self, iterator_factory):
+        """
+        :param iterator_factory: function without argument, which returns an iterator of (data set, eigens)
+                data set is numpy array of categories, eigens is dictionary of eigen name and eigen values
+        """
+        self.iterator_factory = iterator_factory
+
+    def __iter__(self):
+        return iter(self.iterator_factory())
+
+
+class CsvChunks:
+    """
+    Chunks read from a CSV file. The first line of the file is header of eigen names.
+    All values are read as strings.
+    """
+    def __init__(self, path, target, chunk_size=100000, delimiter=","):
+        """
+        :param path: path of CSV file
+        :param target: name of the column of categories
+        :param chunk_size: number of lines in a chunk
+        :param delimiter: delimiter of CSV file
+        """
+        self.path = path
+        self.target = target
+        self.chunk_size = chunk_size
+        self.delimiter = delimiter
+
+    def __iter__(self):
+        with open(self.path, newline="") as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader)
+            lines = list()
+            for line in reader:
+                lines.append(line)
+                if len(lines) == self.chunk_size:
+                    yield self.to_chunk(header, lines)
+                    lines = list()
+            if len(lines) > 0:
+                yield self.to_chunk(header, lines)
+
+    def to_chunk(self, header, lines):
+        """
+        :param header: eigen names
+        :param lines: lines of CSV file
+        :return: data set, eigens
+        """
+        values = np.array(lines, dtype=str)
+        eigens = dict()
+        for column, name in enumerate(header):
+            if name != self.target:
+                eigens[name] = values[:, column]
+        return values[:, header.index(self.target)], eigens
+
+
+class NpyChunks:
+    """
+    Chunks read from a 2-D .npy file. The file is memory-mapped, only one chunk is loaded into memory at a time.
+    """
+    def __init__(self, path, target_column, eigen_names=None, chunk_size=100000):
+        """
+        :param path: path of .npy file
+        :param target_column: index of the column of categories
+        :param eigen_names: names of the other columns. Default names are their column indexes.
+        :param chunk_size: number of rows in a chunk
+        """
+        self.array = np.load(path, mmap_mode="r")
+        self.target_column = target_column
+        self.eigen_columns = [c for c in range(self.array.shape[1]) if c != target_column]
+        if eigen_names is None:
+            eigen_names = [str(c) for c in self.eigen_columns]
+        self.eigen_names = list(eigen_names)
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for start in range(0, len(self.array), self.chunk_size):
+            block = np.array(self.array[start:start + self.chunk_size])
+            eigens = dict()
+            for name, column in zip(self.eigen_names, self.eigen_columns):
+                eigens[name] = block[:, column]
+            yield block[:, self.target_column], eigens
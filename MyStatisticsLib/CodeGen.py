@@ -0,0 +1,225 @@
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.DecisionTree as dt
+import numpy as np
+import hashlib
+import importlib.util
+import math
+import os
+
+# deepest nesting of if statements in one generated function. Python limits the levels of indentation, so deeper
+# sub-trees are generated as separate functions.
+MAX_NESTING = 40
+
+
+def to_source(tree, function_name="decide"):
+    """
+    generate python source of a function which makes the same decision as tree.decide for one sample.
+    A binary split becomes an if statement whose body is the left sub-tree, followed by the right sub-tree, so the
+    function only compares values and returns. Like decide, a node of DecisionTree chooses its child with one dictionary
+    lookup, see write_dispatch.
+    Unlike decide, the function raises KeyError if the sample has no value of an eigen used on its path.
+    :param tree: trained CartClassificationTree, CartRegressionTree or DecisionTree
+    :param function_name: name of the generated function. It takes one argument, the dictionary of eigens of a sample
+    :return: source of a python module
+    """
+    if not isinstance(tree, (cct.CartClassificationTree, crt.CartRegressionTree, dt.DecisionTree)):
+        raise TypeError("Can't generate source of " + type(tree).__name__)
+    tables, functions = list(), list()
+    # (name of function, root of its sub-tree) of all functions, they are generated in this order
+    pending = [(function_name, tree)]
+    for name, root in pending:
+        lines = ["def " + name + "(eigen):"]
+        write_node(root, 1, lines, tables, pending, function_name)
+        functions.append("\n".join(lines))
+    header = "# generated from a trained " + type(tree).__name__ + "\n"
+    if isinstance(tree, dt.DecisionTree):
+        # found by lookups below an eigen value which has no child
+        header += "no_children = dict()\n"
+    return header + "".join(table + "\n" for table in tables) + "\n\n" + "\n\n\n".join(functions) + "\n"
+
+
+def write_node(node, level, lines, tables, pending, function_name, bound=None):
+    """
+    append source lines of a sub-tree
+    :param node: root of the sub-tree
+    :param level: level of indentation of the lines
+    :param lines: source lines of the function being generated
+    :param tables: source lines of dictionaries of DecisionTree nodes
+    :param pending: list of (function name, sub-tree) of functions. A deep sub-tree is appended to it
+    :param function_name: name of the generated function, prefix of names of other functions
+    :param bound: dictionary of eigen name and local variable, for eigens which are already read on the path of the
+            sub-tree. None if no eigen is read yet
+    :return:
+    """
+    indent = "    " * level
+    if isinstance(node, dt.DecisionTree):
+        children = list(node.child_items())
+        if len(children) == 0:
+            lines.append(indent + "return " + literal(node.category))
+            return
+    elif node.left is None:
+        lines.append(indent + "return " + literal(node.prediction))
+        return
+
+    if level > MAX_NESTING:
+        name = function_name + "_" + str(len(pending))
+        pending.append((name, node))
+        lines.append(indent + "return " + name + "(eigen)")
+        return
+    if isinstance(node, dt.DecisionTree):
+        write_dispatch(node, children, level, lines, tables, pending, function_name)
+        return
+    # each eigen is read into a local variable by the first node which uses it on the path
+    bound = dict() if bound is None else bound
+    if node.split_eigen not in bound:
+        bound = dict(bound)
+        bound[node.split_eigen] = "value_" + str(len(bound))
+        lines.append(indent + bound[node.split_eigen] + " = eigen[" + literal(node.split_eigen) + "]")
+    operator = " <= " if isinstance(node, crt.CartRegressionTree) else " == "
+    lines.append(indent + "if " + bound[node.split_eigen] + operator + literal(node.split_value) + ":")
+    # every path of the left sub-tree returns, so the right sub-tree follows without else
+    write_node(node.left, level + 1, lines, tables, pending, function_name, bound)
+    write_node(node.right, level, lines, tables, pending, function_name, bound)
+
+
+def write_dispatch(node, children, level, lines, tables, pending, function_name):
+    """
+    append source lines of a DecisionTree node which has children. Like decide, each level costs one lookup.
+    If every level of the sub-tree uses one eigen, the sub-tree becomes nested dictionaries from eigen value to
+    child, whose innermost values are categories, and it's decided by a chain of lookups without any comparison.
+    Otherwise a dictionary from eigen value to position of the child is followed by if statements which compare the
+    position with python integers, about log2(number of children) of them.
+    :param node: the node
+    :param children: list of (eigen value, child) of the node
+    :param level: level of indentation of the lines
+    :param lines: source lines of the function being generated
+    :param tables: source lines of dictionaries
+    :param pending: list of (function name, sub-tree) of functions. A deep sub-tree is appended to it
+    :param function_name: name of the generated function, prefix of names of other functions
+    :return:
+    """
+    indent = "    " * level
+    table = "table_" + str(len(tables))
+    levels = eigens_of_levels(node)
+    if levels is not None:
+        tables.append(table + " = " + nested_literal(node))
+        # an eigen value which has no child has no decision, the lookups below it find nothing
+        lookups = "".join(".get(eigen[" + literal(eigen) + "], no_children)" for eigen in levels[:-1])
+        lines.append(indent + "return " + table + lookups + ".get(eigen[" + literal(levels[-1]) + "])")
+        return
+    eigen = "eigen[" + literal(node.best_eigen_name) + "]"
+    tables.append(table + " = {" + ", ".join(literal(value) + ": " + str(position)
+                                             for position, (value, child) in enumerate(children)) + "}")
+    lines.append(indent + "child = " + table + ".get(" + eigen + ")")
+    lines.append(indent + "if child is None:")
+    lines.append(indent + "    return None")
+    write_positions([child for value, child in children], 0, len(children), level, lines, tables, pending,
+                    function_name)
+
+
+def eigens_of_levels(node):
+    """
+    :param node: node of DecisionTree
+    :return: tuple of the eigen used by the nodes of each level of the sub-tree, if all nodes of a level use the same
+              eigen and all leaves are on the last level. Empty tuple for a leaf, None for other sub-trees
+    """
+    children = [child for value, child in node.child_items()]
+    if len(children) == 0:
+        return ()
+    levels = eigens_of_levels(children[0])
+    if levels is None or any(eigens_of_levels(child) != levels for child in children[1:]):
+        return None
+    return (node.best_eigen_name,) + levels
+
+
+def nested_literal(node):
+    """
+    :param node: node of DecisionTree
+    :return: python expression of nested dictionaries from eigen value to child, whose innermost values are categories
+    """
+    children = list(node.child_items())
+    if len(children) == 0:
+        return literal(node.category)
+    return "{" + ", ".join(literal(value) + ": " + nested_literal(child) for value, child in children) + "}"
+
+
+def write_positions(children, start, end, level, lines, tables, pending, function_name):
+    """
+    append if statements which choose one of children[start:end] by its position, saved in the variable child
+    :param children: children of a DecisionTree node
+    :param start: first position
+    :param end: last position (exclusive)
+    :param level: level of indentation of the lines
+    :return:
+    """
+    if end - start == 1:
+        write_node(children[start], level, lines, tables, pending, function_name)
+        return
+    mid = (start + end) // 2
+    lines.append("    " * level + "if child < " + str(mid) + ":")
+    # every path returns, so the other half follows without else
+    write_positions(children, start, mid, level + 1, lines, tables, pending, function_name)
+    write_positions(children, mid, end, level, lines, tables, pending, function_name)
+
+
+def literal(value):
+    """
+    :param value: eigen name, split value or prediction
+    :return: python expression of the value
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return 'float("' + repr(value) + '")'
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return repr(value)
+    raise TypeError("Value can't be written into source: " + repr(value))
+
+
+def load_source(source, function_name="decide"):
+    """
+    :param source: source returned by to_source
+    :param function_name: name of the generated function
+    :return: the generated function
+    """
+    namespace = dict()
+    exec(compile(source, "<generated tree>", "exec"), namespace)
+    return namespace[function_name]
+
+
+def compile_tree(tree, cache_dir=None, function_name="decide"):
+    """
+    generate the decision function of a tree and load it
+    :param tree: trained CartClassificationTree, CartRegressionTree or DecisionTree
+    :param cache_dir: directory to save the source. The file is named by the hash of the source, so a tree which is
+            generated again reuses the file and the bytecode python cached for it. None to only load it in memory
+    :param function_name: name of the generated function
+    :return: function of one argument, the dictionary of eigens of a sample
+    """
+    source = to_source(tree, function_name)
+    if cache_dir is None:
+        return load_source(source, function_name)
+    path = os.path.join(cache_dir, "tree_" + hashlib.sha256(source.encode("utf-8")).hexdigest()[:16] + ".py")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, so that other processes never load a partial file
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(source)
+        os.replace(temp_path, path)
+    return load_file(path, function_name)
+
+
+def load_file(path, function_name="decide"):
+    """
+    load a generated function from a file saved by compile_tree. The tree is not needed.
+    :param path: path of the source file
+    :param function_name: name of the generated function
+    :return: the generated function
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, function_name)
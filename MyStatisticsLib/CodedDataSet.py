@@ -0,0 +1,112 @@
+import MyStatisticsLib.DecisionTreeUtil as dtu
+import MyStatisticsLib.WeightUtil as wu
+import numpy as np
+import copy
+
+
+class CodedDataSet:
+    """
+    Columnar data set for training of decision trees.
+    Every eigen is factorized only once into small integer codes. The codes of all eigens are saved in one
+    contiguous 2-D array, row i of the array holds codes of the i-th eigen.
+        names: eigen names, in the same order as rows of codes
+        dictionaries: dictionaries[i] are the distinct values of i-th eigen. dictionaries[i][codes[i]] == eigen values
+        categories: distinct categories of data set. categories[class_codes] == data set
+        weights: weight of each data, None means every weight is 1
+    """
+    def __init__(self, data_set, eigens, categories=None, dictionaries=None, weights=None):
+        """
+        :param data_set: categories of data, type is numpy.array
+        :param eigens: dictionary of eigens. key is eigen name, value is eigen values
+        :param categories: distinct categories. If it's given, data set is encoded with it instead of factorized.
+        :param dictionaries: distinct values of each eigen. If it's given, eigens are encoded with it instead of
+                factorized. Data sets encoded with same categories and dictionaries share the same codes.
+        :param weights: weight of each data. None means every weight is 1
+        """
+        self.weights = None if weights is None else np.asarray(weights)
+        self.names = list(eigens.keys())
+        if categories is None:
+            self.categories, class_codes = dtu.factorize(data_set)
+        else:
+            self.categories, class_codes = categories, encode_known(categories, data_set)
+        self.class_codes = class_codes.astype(np.min_scalar_type(max(len(self.categories) - 1, 0)))
+
+        self.dictionaries = list()
+        codes = list()
+        for i, eigen_values in enumerate(eigens.values()):
+            if dictionaries is None:
+                distinct_values, value_codes = dtu.factorize(eigen_values)
+            else:
+                distinct_values, value_codes = dictionaries[i], encode_known(dictionaries[i], eigen_values)
+            self.dictionaries.append(distinct_values)
+            codes.append(value_codes)
+        # use the smallest integer type that can hold codes of all eigens
+        max_value_num = max([len(d) for d in self.dictionaries] + [1])
+        self.codes = np.empty((len(codes), len(self.class_codes)), dtype=np.min_scalar_type(max_value_num - 1))
+        for i, value_codes in enumerate(codes):
+            self.codes[i] = value_codes
+
+    def __len__(self):
+        return len(self.class_codes)
+
+    def value_num(self, column):
+        """
+        :param column: index of eigen
+        :return: number of distinct values of the eigen
+        """
+        return len(self.dictionaries[column])
+
+    def compress(self):
+        """
+        compress duplicate data into one weighted data. Duplicates are found on codes, so it's cheap.
+        :return: new CodedDataSet, whose weights are sums of weights of duplicates
+        """
+        first_index, groups = wu.duplicate_groups(np.vstack((self.class_codes, self.codes)))
+        weights = self.weights if self.weights is not None else np.ones(len(self), dtype=np.int64)
+        compressed = copy.copy(self)
+        compressed.class_codes = self.class_codes[first_index]
+        compressed.codes = np.ascontiguousarray(self.codes[:, first_index])
+        compressed.weights = dtu.count(groups, len(first_index), weights)
+        return compressed
+
+    def decode(self, column, code):
+        """
+        :param column: index of eigen
+        :param code: code of eigen value
+        :return: original eigen value of the code
+        """
+        return self.dictionaries[column][code]
+
+
+def encode_known(distinct_values, values):
+    """
+    encode values which must exist in distinct values
+    :param distinct_values: distinct values, sorted
+    :param values: numpy array of values
+    :return: code of each value
+    """
+    codes = dtu.encode(distinct_values, values)
+    if np.any(codes < 0):
+        raise ValueError("Value doesn't exist in dictionary: " + str(np.asarray(values)[codes < 0][0]))
+    return codes
+
+
+def schema_of_chunks(chunks):
+    """
+    read all chunks once, and collect distinct categories and distinct values of each eigen
+    :param chunks: iterable of (data set, dictionary of eigens)
+    :return: CodedDataSet without data. Its categories and dictionaries are used to encode every chunk.
+    """
+    names, categories, dictionaries = None, None, None
+    for data_set, eigens in chunks:
+        if names is None:
+            names = list(eigens.keys())
+            categories = np.unique(data_set)
+            dictionaries = [np.unique(eigens[name]) for name in names]
+        else:
+            categories = np.union1d(categories, data_set)
+            dictionaries = [np.union1d(d, eigens[name]) for d, name in zip(dictionaries, names)]
+    if names is None:
+        raise ValueError("No chunk to read")
+    empty_eigens = dict((name, d[:0]) for name, d in zip(names, dictionaries))
+    return CodedDataSet(categories[:0], empty_eigens, categories, dictionaries)
@@ -1,92 +1,340 @@
+import MyStatisticsLib.BestFirstUtil as bfu
 import MyStatisticsLib.DecisionTreeUtil as dtu
+import MyStatisticsLib.CodedDataSet as cds
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.PartitionUtil as pu
+import MyStatisticsLib.FlatTree as ft
+import MyStatisticsLib.PruneUtil as pru
 import MyStatisticsLib.TreePlot as plt
+import numpy as np
 
 class DecisionTree:
     info_gain_ratio_threshold = 0.1
     alpha = 0
+    # ParallelUtil.SplitExecutor used to count eigens concurrently, None to count them one after another
+    split_executor = None
+    # settings which can be set on each instance. Class attributes above are used when they are not set
+    setting_names = ("info_gain_ratio_threshold", "alpha", "split_executor")
+    # node attribute of each stopping setting: a node is a leaf if its attribute is less than the setting
+    stop_statistics = {"info_gain_ratio_threshold": "max_info_gain_ratio"}
+    # nodes have no instance dictionary. Children are a linked list: first_child of the node, then next_sibling of
+    # each child. value is the value of best eigen of the parent which leads to the node. Only internal nodes have
+    # child_of_value, a dictionary of eigen value and child for decide, leaves have None.
+    __slots__ = ("root", "category", "value", "first_child", "next_sibling", "child_of_value", "best_eigen_name",
+                 "max_info_gain_ratio", "entropy", "loss", "prune_alpha", "instance_settings")
 
-    def __init__(self, root=False):
+    def __init__(self, root=False, **settings):
+        """
+        :param root: True for root node
+        :param settings: settings in setting_names, which are used only by this tree. Children inherit settings of
+                their parent, so trees with different settings can be built in threads at the same time.
+        """
+        for name in settings:
+            if name not in DecisionTree.setting_names:
+                raise TypeError("Unknown setting: " + name)
+        # settings set on the instance. All nodes of a tree share the dictionary, so it's never modified
+        self.instance_settings = settings
         self.category = None
-        self.children = dict()
         self.root = root
+        self.value = None
+        self.first_child = None
+        self.next_sibling = None
+        self.child_of_value = None
+        self.best_eigen_name = None
+        self.max_info_gain_ratio = None
+        self.entropy = None
+        self.loss = None
+        # alpha at which this sub-tree is pruned, calculated by pruning_path
+        self.prune_alpha = float("inf")
+
+    @property
+    def children(self):
+        """
+        :return: dictionary of eigen value and child, in the order of children. It's built when it's read, changing
+                  it doesn't change the tree.
+        """
+        return dict(self.child_items())
+
+    def child_items(self):
+        """
+        :return: generator of (eigen value, child) in the order of children
+        """
+        child = self.first_child
+        while child is not None:
+            yield child.value, child
+            child = child.next_sibling
+
+    def set_children(self, children):
+        """
+        :param children: list of (eigen value, child). An empty list makes the node a leaf node.
+        :return:
+        """
+        self.first_child = None
+        for value, child in reversed(children):
+            child.value, child.next_sibling = value, self.first_child
+            self.first_child = child
+        self.child_of_value = dict(children) if len(children) > 0 else None
+
+    def setting(self, name):
+        """
+        :param name: name in setting_names
+        :return: value of the setting for this tree. Class attribute is used if it's not set on the instance
+        """
+        return self.instance_settings.get(name, getattr(DecisionTree, name))
 
-    def build(self, data_set, eigens):
+    def settings(self):
+        """
+        :return: settings set on this instance
+        """
+        return dict(self.instance_settings)
+
+    def new_child(self):
+        """
+        :return: a child node which inherits settings of this node
+        """
+        child = DecisionTree()
+        child.instance_settings = self.instance_settings
+        return child
+
+    def build(self, data_set, eigens, weights=None, compress=False):
         """
         build tree with data set and eigens
         :param data_set: data set
-        :param eigens: dictionary of eigens. key is eigen name, value is eigen values
+        :param eigens: dictionary of eigens. key is eigen name, value is eigen values.
+                It can also be a CodedDataSet, in that case data_set and weights are ignored.
+        :param weights: weight of each data. None means every weight is 1.
+                Integer weights work like duplicating data, the tree is the same as the tree built with duplicates.
+        :param compress: True to compress duplicate data into weighted data before building.
+                The tree is the same, but it's faster when data set has many duplicates.
         :return:
         """
+        if not isinstance(eigens, cds.CodedDataSet):
+            # factorize every eigen into integer codes only once
+            eigens = cds.CodedDataSet(data_set, eigens, weights=weights)
+        coded_data_set = eigens.compress() if compress else eigens
+
+        # The tree grows one level at a time without recursion.
+        # frontier is the list of (node, index of eigens not used by ancestors) to be built in this level.
+        # node_of_row saves the position in frontier of the node each row belongs to, -1 if row is in a leaf.
+        frontier = [(self, list(range(len(coded_data_set.names))))]
+        node_of_row = np.zeros(len(coded_data_set), dtype=np.intp)
+        while len(frontier) > 0:
+            rows = np.flatnonzero(node_of_row >= 0)
+            nodes = node_of_row[rows]
+            class_counts, tables = count_frontier(coded_data_set, rows, nodes, frontier, self.setting("split_executor"))
+            frontier, best_column_of_node, child_of_node = grow_frontier(coded_data_set, frontier, class_counts, tables)
+            # move each row to the child it belongs to. Rows of leaf nodes are marked with -1
+            node_of_row[rows] = dtu.move_to_children(coded_data_set.codes, rows, nodes, best_column_of_node,
+                                                     child_of_node)
+
+    def build_best_first(self, data_set, eigens, max_leaves=None, max_depth=None, time_budget=None, weights=None):
+        """
+        build tree best first. Frontier nodes are ordered by max info gain ratio of their best eigen multiplied by
+        their data count, and the best one is split until max_leaves, max_depth or time_budget runs out.
+        Frontier nodes which are not split become leaves, so the tree is always valid.
+        Without any budget, the tree is the same as the tree built by build.
+        :param data_set: data set
+        :param eigens: dictionary of eigens. key is eigen name, value is eigen values.
+                It can also be a CodedDataSet, in that case data_set and weights are ignored.
+        :param max_leaves: maximum number of leaves. None means no limit
+        :param max_depth: maximum depth of tree, the depth of root is 1. None means no limit
+        :param time_budget: seconds to grow the tree. None means no limit
+        :param weights: weight of each data. None means every weight is 1.
+        :return: number of leaves
+        """
+        coded_data_set = eigens if isinstance(eigens, cds.CodedDataSet) else \
+            cds.CodedDataSet(data_set, eigens, weights=weights)
+
+        def evaluate(node, state, split):
+            rows, columns = state
+            # without eigens, grow only calculates category of the node
+            columns = columns if split else list()
+            nodes = np.zeros(len(rows), dtype=np.intp)
+            class_counts, tables = count_frontier(coded_data_set, rows, nodes, [(node, columns)], self.setting("split_executor"))
+            best_column = node.grow(coded_data_set, class_counts[0], columns,
+                                    frontier_ratios(coded_data_set, class_counts, tables), 0)
+            if best_column is None:
+                return None
+            # the only node is node 0, so keys of its values are codes of the values
+            codes = dtu.value_pairs(tables[best_column], len(coded_data_set.categories))[0]
+            gain = node.max_info_gain_ratio * class_counts[0].sum()
+            return gain, len(codes), (rows, columns, best_column, codes)
+
+        def expand(node, split):
+            rows, columns, best_column, codes = split
+            # after best eigen is used, remove it from eigens of children
+            columns_split = [column for column in columns if column != best_column]
+            codes_of_rows = coded_data_set.codes[best_column, rows]
+            children = list()
+            for code in codes:
+                child = node.new_child()
+                children.append((coded_data_set.decode(best_column, code), child))
+            node.set_children(children)
+            return [(child, (rows[codes_of_rows == code], columns_split))
+                    for (value, child), code in zip(children, codes)]
+
+        return bfu.grow_best_first(self, (np.arange(len(coded_data_set)), list(range(len(coded_data_set.names)))),
+                                   evaluate, expand, lambda node: None, max_leaves, max_depth, time_budget)
+
+    def build_from_chunks(self, chunks):
+        """
+        build tree with data set which is read chunk by chunk, so that data set doesn't need to fit in memory.
+        Chunks are read once to collect distinct values, then once per tree level to count contingency tables of
+        frontier nodes. The tree is the same as the tree built by build with the whole data set.
+        :param chunks: iterable of (data set, dictionary of eigens) that can be iterated many times.
+                e.g. ChunkSource.CsvChunks, ChunkSource.NpyChunks or ChunkSource.IteratorChunks
+        :return:
+        """
+        schema = cds.schema_of_chunks(chunks)
+        frontier = [(self, list(range(len(schema.names))))]
+        # levels saves (best_column_of_node, child_of_node) of each built level, to route rows from root
+        levels = list()
+        while len(frontier) > 0:
+            class_counts, tables = 0, dict()
+            for data_set, eigens in chunks:
+                coded_chunk = cds.CodedDataSet(data_set, eigens, schema.categories, schema.dictionaries)
+                rows = np.arange(len(coded_chunk))
+                nodes = np.zeros(len(coded_chunk), dtype=np.intp)
+                for best_column_of_node, child_of_node in levels:
+                    nodes = dtu.move_to_children(coded_chunk.codes, rows, nodes, best_column_of_node, child_of_node)
+                    rows, nodes = rows[nodes >= 0], nodes[nodes >= 0]
+                chunk_class_counts, chunk_tables = count_frontier(coded_chunk, rows, nodes, frontier,
+                                                                  self.setting("split_executor"))
+                # sum up counts of all chunks. Sparse tables are merged after every chunk, so they never hold more
+                # than the distinct (node, value, category) triples of the level
+                class_counts = class_counts + chunk_class_counts
+                for column, table in chunk_tables.items():
+                    tables[column] = dtu.merge_tables([tables[column], table]) if column in tables else table
+            frontier, best_column_of_node, child_of_node = grow_frontier(schema, frontier, class_counts, tables)
+            levels.append((best_column_of_node, child_of_node))
+
+    def grow(self, coded_data_set, counts, columns, ratios, position):
+        """
+        calculate entropy, loss and category of the node and choose the best eigen to split it
+        :param coded_data_set: CodedDataSet, only its names and categories are used
+        :param counts: count (or sum of weights) of each category of the data belonging to the node
+        :param columns: index of eigens that are not used by ancestors
+        :param ratios: dictionary of eigen index and info gain ratios of all frontier nodes
+        :param position: position of this node in frontier
+        :return: index of the best eigen. None if the node is a leaf node.
+        """
+        categories = coded_data_set.categories
         # calculate entropy and loss of this node
-        self.entropy = dtu.empirical_entropy(data_set)
-        self.loss = self.entropy * len(data_set)
+        self.entropy = dtu.entropy_of_counts(counts)
+        self.loss = self.entropy * counts.sum()
 
-        # get categories in the data set
-        categories = set(data_set.flat)
         # if only 1 category exists, return this node as leaf node.
-        if len(categories) == 1:
-            self.category = data_set[0]
-            return
+        if np.count_nonzero(counts) == 1:
+            self.category = categories[np.argmax(counts)]
+            return None
 
         # use mode of all categories as node category
-        mode = dtu.mode(data_set)
+        mode = dtu.mode_of_counts(categories, counts)
         self.category = mode
 
         # if no eigen exists, return this node as leaf node
-        if eigens == None or len(eigens) == 0:
-            return
+        if len(columns) == 0:
+            return None
 
-        best_eigen = dtu.best_eigen_for_info_gain_ration(data_set, eigens)
+        best_eigen = dtu.best_eigen_of_ratios([(coded_data_set.names[column], ratios[column][position])
+                                               for column in columns])
         self.best_eigen_name = best_eigen[0]
         self.max_info_gain_ratio = best_eigen[1]
 
         # when max info gain ratio of best eigen is still less than threshold, stop split
         # return this node as leaf node
-        if self.max_info_gain_ratio < DecisionTree.info_gain_ratio_threshold:
-            return
-
-        # after best eigen is used, pop it from eigens dictionary
-        best_eigen_values = eigens.pop(self.best_eigen_name)
-        splits = dtu.split_all(data_set, eigens, best_eigen_values)
-        for split in splits:
-            best_eigen_distinct_value, data_split, eigens_split = split
-            child = DecisionTree()
-            child.build(data_split, eigens_split)
-            self.children[best_eigen_distinct_value] = child
+        if self.max_info_gain_ratio < self.setting("info_gain_ratio_threshold"):
+            return None
+        return coded_data_set.names.index(self.best_eigen_name)
+
+    def is_leaf(self, alpha=None):
+        """
+        :param alpha: if alpha is given, a node whose prune_alpha <= alpha is also regarded as leaf node
+        :return: True if the node is a leaf node
+        """
+        return self.first_child is None or (alpha is not None and self.prune_alpha <= alpha)
+
+    def nodes(self, alpha=None):
+        """
+        iterate all nodes of the tree in pre-order without recursion
+        :param alpha: if alpha is given, descendants of nodes whose prune_alpha <= alpha are skipped
+        :return: generator of nodes
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            if not node.is_leaf(alpha):
+                # push children reversely, so that they are popped in their original order
+                stack.extend(reversed([child for value, child in node.child_items()]))
 
     def loss_of_leaf(self):
         """
         calculate loss of all leaves of node
-        :param node:
-        :return: the root of sub-tree
+        :return: loss of leaves of the sub-tree. Regulation item (alpha) is added to loss of each leaf.
         """
-        if len(self.children) != 0:
-            loss = 0
-            for child in self.children.values():
+        alpha = self.setting("alpha")
+        loss = 0
+        for node in self.nodes():
+            if node.first_child is None:
                 # sum up the loss of each leaf
                 # Add regulation item (alpha) to each leaf loss.Total regulation item will be multiplied by leaf number
-                loss += child.loss_of_leaf() + DecisionTree.alpha
-            return loss;
-        else:
-            # if i am a leaf node, return my loss.
-            return self.loss
+                loss += node.loss + alpha
+        return loss
 
     def post_prune(self):
         """
         prune tree nodes
+        Loss and number of leaves of every sub-tree are summed up in one post-order sweep, and reused by parent
+        after the sub-tree is pruned. So the time of pruning is linear to the size of tree.
         :return:
         """
-        if len(self.children) != 0:
-            for child in self.children.values():
-                child.post_prune()
-
+        alpha = self.setting("alpha")
+        # loss and number of leaves of the (pruned) sub-tree of each node
+        leaf_loss, leaf_num = dict(), dict()
+        # visit nodes in reversed pre-order, so that every node is visited after all its children are pruned
+        for node in reversed(list(self.nodes())):
+            if node.first_child is None:
+                leaf_loss[id(node)], leaf_num[id(node)] = node.loss, 1
+                continue
+            loss = sum([leaf_loss[id(child)] for value, child in node.child_items()])
+            num = sum([leaf_num[id(child)] for value, child in node.child_items()])
+            # if loss of leaf nodes is greater or equal to loss of parent, prune this sub-tree
             # For root node, no need to prune it. Because decision tree needs at least two levels.
-            if self.root:
-                return
+            if not node.root and loss + alpha * num >= node.loss + alpha:
+                node.set_children([])
+                loss, num = node.loss, 1
+            leaf_loss[id(node)], leaf_num[id(node)] = loss, num
 
-            # if loss of leaf nodes is greater or equal to loss of parent, prune this sub-tree
-            if self.loss_of_leaf() >= self.loss + DecisionTree.alpha:
-                self.children.clear()
+    def pruning_path(self):
+        """
+        calculate the alpha at which each sub-tree would be pruned (weakest link pruning), and save it in prune_alpha
+        of the root of sub-tree. The tree itself is not pruned. After that, a tree pruned by any alpha can be used
+        with decide_all(eigens, alpha) or prune_by_path(alpha), without pruning the tree again.
+        :return: list of tuple (alpha, root of pruned sub-tree), alpha is in non-decreasing order
+        """
+        nodes = list(self.nodes())
+        for node in nodes:
+            node.prune_alpha = float("inf")
+        parent = pru.parents_of(nodes, lambda node: [child for value, child in node.child_items()])
+        node_loss = np.array([node.loss for node in nodes], dtype=float)
+        is_leaf = np.array([node.first_child is None for node in nodes])
+
+        path = list()
+        for alpha, k in pru.weakest_link_path(parent, node_loss, is_leaf):
+            nodes[k].prune_alpha = alpha
+            path.append((alpha, nodes[k]))
+        return path
+
+    def prune_by_path(self, alpha):
+        """
+        prune the tree with alpha, using prune_alpha calculated by pruning_path
+        :param alpha: alpha
+        :return:
+        """
+        for node in list(self.nodes(alpha)):
+            if node.is_leaf(alpha):
+                node.set_children([])
 
     def decide(self, data):
         """
@@ -94,34 +342,187 @@ class DecisionTree:
         :param data: dictionary of a sample of all eigens
         :return:
         """
-        if len(self.children) == 0:
-            # if i am a leaf node, return my decision
-            return self.category
-        else:
+        node = self
+        while node.first_child is not None:
             try:
-                best_eigen_value = data[self.best_eigen_name]
-                chosen_child = self.children[best_eigen_value]
-                return chosen_child.decide(data)
+                best_eigen_value = data[node.best_eigen_name]
             except KeyError as e:
                 print("Key doesn't exist: " + e.__str__())
+                return None
+            node = node.child_of_value.get(best_eigen_value)
+            if node is None:
+                print("Key doesn't exist: " + repr(best_eigen_value))
+                return None
+        # when a leaf node is reached, return its decision
+        return node.category
+
+    def compile(self, alpha=None):
+        """
+        compile the tree into flat arrays
+        :param alpha: if alpha is given, the tree is compiled as if it's pruned by prune_by_path(alpha)
+        :return: FlatDecisionTree
+        """
+        return ft.FlatDecisionTree(self, alpha)
+
+    def decide_all(self, eigens, alpha=None):
+        """
+        make decisions for many samples at once
+        :param eigens: dictionary of eigens. key is eigen name, value is numpy array of eigen values of all samples
+        :param alpha: if alpha is given, decisions are made as if the tree is pruned by prune_by_path(alpha)
+        :return: numpy array of decisions
+        """
+        return self.compile(alpha).decide_all(eigens)
+
+    def truncate(self, **settings):
+        """
+        truncate the tree in place into the tree built with stricter stopping settings. The split chosen by a node
+        doesn't depend on stopping settings, so the truncated tree is the same as the tree built with the settings,
+        without training again.
+        :param settings: settings in stop_statistics. They can't be looser than the settings used to build the tree
+        :return:
+        """
+        instance_settings = dict(self.instance_settings, **settings)
+        for node in self.nodes():
+            node.instance_settings = instance_settings
+            if node.first_child is not None and node.stops(settings):
+                # children are not pushed yet in pre-order, so the truncated sub-tree is not visited
+                node.set_children([])
+
+    def stops(self, settings):
+        """
+        :param settings: settings in stop_statistics
+        :return: True if the node is a leaf when the tree is built with the settings
+        """
+        return any(getattr(self, statistic) < settings[name]
+                   for name, statistic in DecisionTree.stop_statistics.items() if name in settings)
+
+    def route(self, columns, index):
+        """
+        send samples reaching this node to its children by value of best eigen.
+        Samples whose value has no child stop at this node.
+        :param columns: dictionary of eigen name and numpy array of eigen values
+        :param index: index of samples reaching this node
+        :return: index of samples of each child, in the order of children
+        """
+        values = columns[self.best_eigen_name][index]
+        return [index[values == value] for value, child in self.child_items()]
 
     def traverse(self):
         """
         :return:  Decision Tree in dictionary format
         """
-        if len(self.children) != 0:
-            tree = dict()
-            sub_tree = dict()
-            for eigen_value, child in self.children.items():
-                sub_tree[eigen_value] = child.traverse()
-            tree[self.best_eigen_name] = sub_tree
-            return tree
-        else:
+        if self.first_child is None:
             return self.category
+        tree = dict()
+        # stack of (node, dictionary that the node is written into)
+        stack = [(self, tree)]
+        while len(stack) > 0:
+            node, node_tree = stack.pop()
+            sub_tree = dict()
+            for eigen_value, child in node.child_items():
+                if child.first_child is not None:
+                    sub_tree[eigen_value] = dict()
+                    stack.append((child, sub_tree[eigen_value]))
+                else:
+                    sub_tree[eigen_value] = child.category
+            node_tree[node.best_eigen_name] = sub_tree
+        return tree
 
     def draw(self):
         """
         draw Decision Tree
         """
         tree_in_dict = self.traverse()
-        plt.createPlot(tree_in_dict)
\ No newline at end of file
+        plt.createPlot(tree_in_dict)
+
+
+def count_frontier(coded_data_set, rows, nodes, frontier, executor=None):
+    """
+    count categories and contingency tables of all frontier nodes of a tree level in one pass per eigen
+    :param coded_data_set: CodedDataSet
+    :param rows: index of rows belonging to frontier nodes
+    :param nodes: position in frontier of the node each row belongs to
+    :param frontier: list of (node, index of eigens not used by ancestors)
+    :param executor: ParallelUtil.SplitExecutor to count eigens concurrently. None to count them one after another
+    :return: count of categories of each frontier node,
+              dictionary of eigen index and sparse contingency tables of all frontier nodes, see
+              DecisionTreeUtil.frontier_tables
+    """
+    class_num = len(coded_data_set.categories)
+    class_codes = coded_data_set.class_codes[rows].astype(np.intp)
+    node_num = len(frontier)
+    weights = None if coded_data_set.weights is None else coded_data_set.weights[rows]
+    class_counts = dtu.count(nodes * class_num + class_codes, node_num * class_num, weights)
+    class_counts = class_counts.reshape(node_num, class_num)
+
+    used_columns = sorted(set(c for node, columns in frontier for c in columns))
+    # codes of the rows are gathered one eigen at a time, and a process pool shares the full columns only once
+    eigens_of_rows = pu.EigensView(dict((column, coded_data_set.codes[column]) for column in used_columns), rows)
+    value_nums = dict((column, coded_data_set.value_num(column)) for column in used_columns)
+    tables = plu.map_eigens(executor, dtu.frontier_table_of_eigen,
+                            np.vstack((nodes, class_codes)), eigens_of_rows, node_num, class_num, value_nums,
+                            weights)
+    return class_counts, dict(zip(used_columns, tables))
+
+
+def grow_frontier(coded_data_set, frontier, class_counts, tables):
+    """
+    grow all frontier nodes of a tree level, and create their children
+    :param coded_data_set: CodedDataSet, only its names, categories and dictionaries are used
+    :param frontier: list of (node, index of eigens not used by ancestors)
+    :param class_counts: count of categories of each frontier node
+    :param tables: dictionary of eigen index and sparse contingency tables of all frontier nodes
+    :return: next frontier,
+              index of best eigen of each frontier node (-1 for leaf node),
+              dictionary of eigen index and (value_num, keys, children) that maps frontier node * value_num + eigen
+              value code to position of child in next frontier, see DecisionTreeUtil.move_to_children
+    """
+    node_num = len(frontier)
+    class_num = len(coded_data_set.categories)
+    ratios = frontier_ratios(coded_data_set, class_counts, tables)
+    # dictionary of eigen index and (keys, positions of children). Keys are appended in increasing order
+    child_of_node = dict()
+    # dictionary of eigen index and (node * value_num + value code which occur, where keys of each node start)
+    pairs_of_column = dict()
+    best_column_of_node = np.full(node_num, -1)
+    next_frontier = list()
+    for position, (node, columns) in enumerate(frontier):
+        best_column = node.grow(coded_data_set, class_counts[position], columns, ratios, position)
+        if best_column is None:
+            continue
+        best_column_of_node[position] = best_column
+        value_num = coded_data_set.value_num(best_column)
+        if best_column not in pairs_of_column:
+            pairs = dtu.value_pairs(tables[best_column], class_num)[0]
+            pairs_of_column[best_column] = pairs, np.searchsorted(pairs, np.arange(node_num + 1) * value_num)
+        pairs, starts = pairs_of_column[best_column]
+        keys, positions = child_of_node.setdefault(best_column, (list(), list()))
+        # after best eigen is used, remove it from eigens of children
+        columns_split = [column for column in columns if column != best_column]
+        children = list()
+        for key in pairs[starts[position]:starts[position + 1]]:
+            code = key - position * value_num
+            child = node.new_child()
+            children.append((coded_data_set.decode(best_column, code), child))
+            keys.append(key)
+            positions.append(len(next_frontier))
+            next_frontier.append((child, columns_split))
+        node.set_children(children)
+    child_of_node = dict((column, (coded_data_set.value_num(column), np.array(keys, dtype=np.int64),
+                                   np.array(positions, dtype=np.intp)))
+                         for column, (keys, positions) in child_of_node.items())
+    return next_frontier, best_column_of_node, child_of_node
+
+
+def frontier_ratios(coded_data_set, class_counts, tables):
+    """
+    :param coded_data_set: CodedDataSet, only its categories and dictionaries are used
+    :param class_counts: count of categories of each frontier node
+    :param tables: dictionary of eigen index and sparse contingency tables of all frontier nodes
+    :return: dictionary of eigen index and info gain ratios of all frontier nodes
+    """
+    node_num, class_num = class_counts.shape
+    entropy = dtu.entropy_of_counts(class_counts)
+    return dict((column, dtu.frontier_info_gain_ratios(table, node_num, coded_data_set.value_num(column), class_num,
+                                                       entropy))
+                for column, table in tables.items())
@@ -1,21 +1,317 @@
 from functools import reduce
-import math
+import MyStatisticsLib.ParallelUtil as plu
+import numpy as np
 
+# cache of n*log2(n) for integer counts below N_LOG2_N_CACHE_SIZE. cache[n] = n*log2(n), cache[0] = 0.
+# It's built once and never changes, so threads can read it without a lock. Larger counts are calculated directly.
+N_LOG2_N_CACHE_SIZE = 1 << 16
+n_log2_n_cache = np.arange(N_LOG2_N_CACHE_SIZE, dtype=float)
+n_log2_n_cache[1:] *= np.log2(n_log2_n_cache[1:])
 
-def empirical_entropy(date_set):
+
+def n_log2_n(counts):
+    """
+    look up n*log2(n) for integer counts
+    :param counts: integer or numpy array of non-negative counts.
+            Weighted counts (float) and counts not less than N_LOG2_N_CACHE_SIZE are calculated directly instead of
+            looked up.
+    :return: n*log2(n) of each count. 0*log2(0) is regarded as 0.
+    """
+    counts = np.asarray(counts)
+    if counts.dtype.kind != "f":
+        counts = counts.astype(np.intp)
+        if counts.size == 0 or counts.max() < N_LOG2_N_CACHE_SIZE:
+            return n_log2_n_cache[counts]
+        counts = counts.astype(float)
+    return counts * np.log2(np.where(counts > 0, counts, 1))
+
+
+def factorize(values):
+    """
+    encode values into integer codes
+    :param values: numpy array of values
+    :return: distinct values (sorted), code of each value. distinct_values[codes] == values
+    """
+    distinct_values, codes = np.unique(values, return_inverse=True)
+    return distinct_values, codes.reshape(-1)
+
+
+def encode(distinct_values, values):
+    """
+    encode values with distinct values returned by factorize
+    :param distinct_values: distinct values, sorted
+    :param values: numpy array of values
+    :return: code of each value. Values not in distinct values are encoded as -1.
+    """
+    values = np.asarray(values)
+    if len(distinct_values) == 0:
+        return np.full(values.shape, -1)
+    codes = np.searchsorted(distinct_values, values)
+    codes[codes == len(distinct_values)] = 0
+    return np.where(distinct_values[codes] == values, codes, -1)
+
+
+def count(codes, minlength, weights=None):
+    """
+    count each code, or sum weights of each code
+    :param codes: non-negative integer codes
+    :param minlength: minimum number of counts
+    :param weights: weight of each code. None means every weight is 1
+    :return: count of each code. Counts stay integers when weights are integers, e.g. numbers of duplicate rows,
+            so entropy of them is the same as entropy of the rows before compression.
+    """
+    counts = np.bincount(codes, weights=weights, minlength=minlength)
+    if weights is not None and np.asarray(weights).dtype.kind in "iub":
+        counts = np.rint(counts).astype(np.int64)
+    return counts
+
+
+def contingency_table(class_codes, class_num, value_codes, value_num, weights=None):
+    """
+    count data of each (eigen value, category) pair in one pass
+    :param class_codes: integer codes of categories of data set
+    :param class_num: number of distinct categories
+    :param value_codes: integer codes of eigen values, same length as class_codes
+    :param value_num: number of distinct eigen values
+    :param weights: weight of each data. None means every weight is 1
+    :return: count matrix, row is eigen value and column is category
+    """
+    table = count(value_codes.astype(np.intp) * class_num + class_codes, value_num * class_num, weights)
+    return table.reshape(value_num, class_num)
+
+
+def entropy_of_counts(counts):
+    """
+    calculate entropy from counts of categories
+    H = log2(n) - sum(c*log2(c))/n = (n*log2(n) - sum(c*log2(c))) / n
+    :param counts: counts of each category. If it's a matrix, entropy is calculated for each row.
+    :return: entropy (of each row)
+    """
+    total = counts.sum(axis=-1)
+    return (n_log2_n(total) - n_log2_n(counts).sum(axis=-1)) / np.where(total > 0, total, 1)
+
+
+def cond_entropy_of_table(table):
+    """
+    calculate conditional entropy from contingency table of an eigen
+    H(D|A) = sum(|Di|/|D| * H(Di)) = sum(|Di|*log2(|Di|) - sum(c*log2(c))) / |D|
+    :param table: contingency table returned by contingency_table
+    :return: conditional entropy
+    """
+    total = table.sum()
+    return (n_log2_n(table.sum(axis=1)).sum() - n_log2_n(table).sum()) / float(total)
+
+
+def info_gain_ratio_of_table(table):
+    """
+    calculate information gain ratio from contingency table of an eigen
+    :param table: contingency table returned by contingency_table
+    :return: info gain ratio
+    """
+    entropy = entropy_of_counts(table.sum(axis=0))
+    return (entropy - cond_entropy_of_table(table)) / entropy
+
+
+def table_of_eigen(class_codes, eigens, eigen, class_num, weights=None):
+    """
+    build contingency table of one eigen
+    :param class_codes: integer codes of categories of data set
+    :param eigens: dictionary of eigen name and eigen values
+    :param eigen: eigen name
+    :param class_num: number of distinct categories
+    :param weights: weight of each data. None means every weight is 1
+    :return: contingency table of the eigen
+    """
+    distinct_values, value_codes = factorize(eigens[eigen])
+    return contingency_table(class_codes, class_num, value_codes, len(distinct_values), weights)
+
+
+def tables_of_eigens(data_set, eigens, executor=None, weights=None):
+    """
+    build contingency table of every eigen. Each eigen is counted by a single pass over its values.
+    :param data_set: data set belonging to one node of decision tree
+    :param eigens: dictionary of eigen name and eigen values
+    :param executor: ParallelUtil.SplitExecutor to count eigens concurrently. None to count them one after another
+    :param weights: weight of each data. None means every weight is 1
+    :return: list of tuple. Each tuple is like (eigen A, contingency table of eigen A)
+    """
+    categories, class_codes = factorize(data_set)
+    tables = plu.map_eigens(executor, table_of_eigen, class_codes, eigens, len(categories), weights)
+    return list(zip(eigens.keys(), tables))
+
+
+def frontier_tables(nodes, node_num, class_codes, class_num, value_codes, value_num, weights=None):
+    """
+    count data of each (frontier node, eigen value, category) triple in one pass.
+    It builds contingency tables of one eigen for all frontier nodes of a tree level at once. Only triples which occur
+    are counted, so the size of the tables is limited by the number of rows, not by node_num * value_num * class_num.
+    :param nodes: frontier node (0 ~ node_num-1) that each row belongs to
+    :param node_num: number of frontier nodes
+    :param class_codes: integer codes of categories of the rows
+    :param class_num: number of distinct categories
+    :param value_codes: integer codes of eigen values of the rows
+    :param value_num: number of distinct eigen values
+    :param weights: weight of each row. None means every weight is 1
+    :return: sparse tables (keys, counts). keys are sorted distinct (node * value_num + value) * class_num + class of
+              the rows, counts are count of each key. Info gain ratios of all nodes are calculated by
+              frontier_info_gain_ratios.
+    """
+    key = (nodes.astype(np.int64) * value_num + value_codes) * class_num + class_codes
+    keys, inverse = np.unique(key, return_inverse=True)
+    return keys, count(inverse.reshape(-1), len(keys), weights)
+
+
+def merge_tables(tables):
+    """
+    sum up sparse tables returned by frontier_tables, e.g. tables of the same frontier counted in many chunks
+    :param tables: list of sparse tables (keys, counts)
+    :return: sparse table (keys, counts) of the sum
+    """
+    keys, inverse = np.unique(np.concatenate([keys for keys, counts in tables]), return_inverse=True)
+    return keys, count(inverse.reshape(-1), len(keys), np.concatenate([counts for keys, counts in tables]))
+
+
+def value_pairs(tables, class_num):
+    """
+    sum up sparse tables over categories
+    :param tables: sparse tables (keys, counts) returned by frontier_tables
+    :param class_num: number of distinct categories
+    :return: sorted distinct node * value_num + eigen value code which occur, count of data of each of them
+    """
+    keys, counts = tables
+    pairs = keys // class_num
+    starts = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1])))[:len(pairs)]
+    pair_counts = np.add.reduceat(counts, starts) if len(starts) > 0 else counts[:0]
+    return pairs[starts], pair_counts
+
+
+def frontier_info_gain_ratios(tables, node_num, value_num, class_num, entropy):
+    """
+    calculate information gain ratio of one eigen for all frontier nodes at once from sparse tables.
+    It's the same as info_gain_ratio_of_table of the contingency table of each node.
+    :param tables: sparse tables (keys, counts) returned by frontier_tables
+    :param node_num: number of frontier nodes
+    :param value_num: number of distinct eigen values
+    :param class_num: number of distinct categories
+    :param entropy: entropy of each frontier node
+    :return: info gain ratio of the eigen for each frontier node
+    """
+    keys, counts = tables
+    nodes = keys // (value_num * class_num)
+    pairs, pair_counts = value_pairs(tables, class_num)
+    total = np.bincount(nodes, weights=counts, minlength=node_num)
+    cond_entropy = (np.bincount(pairs // value_num, weights=n_log2_n(pair_counts), minlength=node_num) -
+                    np.bincount(nodes, weights=n_log2_n(counts), minlength=node_num)) / np.where(total > 0, total, 1)
+    # nodes with only 1 category have no entropy to gain, they are leaf nodes anyway
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (entropy - cond_entropy) / entropy
+
+
+def frontier_table_of_eigen(nodes_and_classes, eigens, eigen, node_num, class_num, value_nums, weights=None):
+    """
+    count contingency tables of one eigen for all frontier nodes. It's the scoring function used with executor.
+    :param nodes_and_classes: 2-D array. Row 0 is frontier node of each row, row 1 is code of category of each row
+    :param eigens: dictionary of eigen index and codes of eigen values
+    :param eigen: eigen index
+    :param node_num: number of frontier nodes
+    :param class_num: number of distinct categories
+    :param value_nums: dictionary of eigen index and number of distinct eigen values
+    :param weights: weight of each row. None means every weight is 1
+    :return: sparse tables (keys, counts) returned by frontier_tables
+    """
+    nodes, class_codes = nodes_and_classes
+    value_codes = eigens[eigen].astype(np.intp)
+    return frontier_tables(nodes, node_num, class_codes, class_num, value_codes, value_nums[eigen], weights)
+
+
+def move_to_children(codes, rows, nodes, best_column_of_node, child_of_node):
+    """
+    move rows of frontier nodes to the children they belong to
+    :param codes: 2-D array of codes of eigen values, row is eigen and column is data
+    :param rows: index of data in codes
+    :param nodes: frontier node of each row
+    :param best_column_of_node: index of best eigen of each frontier node, -1 for leaf node
+    :param child_of_node: dictionary of eigen index and (value_num, keys, children). keys are sorted
+            frontier node * value_num + eigen value code of every child, children are positions of the children in
+            next frontier
+    :return: position of child in next frontier of each row. -1 if row belongs to a leaf node.
+    """
+    next_nodes = np.full(len(rows), -1)
+    for column, (value_num, keys, children) in child_of_node.items():
+        split_by_column = np.flatnonzero(best_column_of_node[nodes] == column)
+        value_codes = codes[column, rows[split_by_column]]
+        key = nodes[split_by_column].astype(np.int64) * value_num + value_codes
+        found = np.minimum(np.searchsorted(keys, key), len(keys) - 1)
+        # rows whose eigen value has no child of their node don't move to any child
+        next_nodes[split_by_column] = np.where((keys[found] == key) & (value_codes >= 0), children[found], -1)
+    return next_nodes
+
+
+def tables_of_codes(class_codes, class_num, coded_data_set, rows, columns):
+    """
+    build contingency table of some eigens of a coded data set
+    :param class_codes: integer codes of categories of the rows
+    :param class_num: number of distinct categories
+    :param coded_data_set: CodedDataSet. Its weights are used if it has.
+    :param rows: index of rows in coded_data_set
+    :param columns: index of eigens in coded_data_set
+    :return: list of tuple. Each tuple is like (eigen A, contingency table of eigen A)
+    """
+    weights = None if coded_data_set.weights is None else coded_data_set.weights[rows]
+    tables = list()
+    for column in columns:
+        value_codes = coded_data_set.codes[column, rows]
+        table = contingency_table(class_codes, class_num, value_codes, coded_data_set.value_num(column), weights)
+        tables.append((coded_data_set.names[column], table))
+    return tables
+
+
+def best_eigen_of_tables(tables):
+    """
+    Choose the best eigen which has max information gain ratio
+    :param tables: list of tuple. Each tuple is like (eigen A, contingency table of eigen A)
+    :return: tuple(best eigen, maximum info gain ratio)
+    """
+    return best_eigen_of_ratios([(eigen, info_gain_ratio_of_table(table)) for eigen, table in tables])
+
+
+def best_eigen_of_ratios(info_gain_ratios):
+    """
+    Choose the best eigen which has max information gain ratio
+    :param info_gain_ratios: list of tuple. Each tuple is like (eigen A, info gain ratio of eigen A)
+    :return: tuple(best eigen, maximum info gain ratio)
+    """
+    # lambda that returns the best eigen and maximum information gain ratio
+    l_get_best = lambda igr1, igr2: igr1 if igr1[1] > igr2[1] else igr2
+    return reduce(l_get_best, info_gain_ratios)
+
+
+def split_rows(rows, value_codes, value_num):
+    """
+    Split row index according to codes of eigen values. Each split corresponds to 1 distinct eigen value.
+    Only row index is split, the data itself is not copied.
+    :param rows: index of rows
+    :param value_codes: codes of eigen values of the rows
+    :param value_num: number of distinct eigen values
+    :return: code => code of distinct eigen value
+              rows_split => index of rows whose eigen value is "code"
+    """
+    order = np.argsort(value_codes, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(value_codes, minlength=value_num))))
+    for code in range(value_num):
+        if bounds[code + 1] > bounds[code]:
+            yield code, rows[order[bounds[code]:bounds[code + 1]]]
+
+
+def empirical_entropy(date_set, weights=None):
     """
     calculate entropy of data set
     :param date_set: data set for calculation. The information in data set is the category of data.
+    :param weights: weight of each data. None means every weight is 1
     :return: empirical entropy of data set
     """
-    def calc_partial_entropy(category):
-        cnt = sum(date_set==category)
-        prob = cnt/float(total)
-        return -1 * prob * math.log(prob, 2)
-    total = len(date_set)
-    categories = set(date_set.flat)
-    entropy_values = map(calc_partial_entropy, categories)
-    return sum(entropy_values)
+    categories, class_codes = factorize(date_set)
+    return entropy_of_counts(count(class_codes, len(categories), weights))
 
 
 def split_data_set(data_set, eigen_values):
@@ -60,89 +356,72 @@ def empirical_cond_entropy(data_set, eigen_values):
             note: The real name of eigen A is not passed in, because it's not related to the calculation.
     :return: empirical conditional entropy of data set for eigen A
     """
-    def calc_partial_cond_entropy(split):
-        prob = len(split)/float(total)
-        entropy = empirical_entropy(split)
-        return prob*entropy
-
-    total = len(data_set)
-    splits = split_data_set(data_set, eigen_values)
-    entropy_values = map(calc_partial_cond_entropy, splits)
-    return sum(entropy_values)
+    eigen, table = tables_of_eigens(data_set, {None: eigen_values})[0]
+    return cond_entropy_of_table(table)
 
 
 def empirical_cond_entropy_of_eigens(data_set, eigens):
     """
     Calculate conditional entropy of all eigens
-    This function iterate each eigen in eigens, and call empirical_cond_entropy for each eigen.
+    This function builds contingency table of each eigen, and calculates conditional entropy from the table.
     :param data_set: data set for calculation
     :param eigens: dictionary of all eigens and their values
     :return: list of tuple. Each tuple is like (eigen X, conditional entropy of eigen X)
     """
-    def empirical_cond_entropy_closure(eigen_values):
-        return empirical_cond_entropy(data_set, eigen_values)
-    entropy_per_eigen = map(empirical_cond_entropy_closure, eigens.values())
-    return zip(eigens.keys(), entropy_per_eigen)
+    tables = tables_of_eigens(data_set, eigens)
+    return [(eigen, cond_entropy_of_table(table)) for eigen, table in tables]
 
 
 def empirical_info_gain_of_eigens(data_set, eigens):
     """
     Calculate information gain of all eigens respectively
-    This function iterate each eigen in eigens, and calculate information gain for each eigen
+    This function builds contingency table of each eigen, and calculates information gain from the table
     :param data_set: data set belonging to one node of decision tree
     :param eigens: dictionary of eigen name and eigen values
     :return: list of tuple. Each tuple is like (eigen A, info gain of eigen A)
     """
-    def empirical_info_gain_closure(eigen_values):
-        cond_entropy = empirical_cond_entropy(data_set, eigen_values)
-        info_gain = entropy - cond_entropy
-        return info_gain
-    entropy = empirical_entropy(data_set)
-    info_gain_per_eigen = map(empirical_info_gain_closure, eigens.values())
-    return zip(eigens.keys(), info_gain_per_eigen)
+    tables = tables_of_eigens(data_set, eigens)
+    return [(eigen, entropy_of_counts(table.sum(axis=0)) - cond_entropy_of_table(table)) for eigen, table in tables]
 
 
 def empirical_info_gain_ratio_of_eigens(data_set, eigens):
     """
     Calculate information gain ratio of all eigens respectively
-    This function iterate each eigen in eigens, and calculate information gain ratio for each eigen
+    This function builds contingency table of each eigen, and calculates information gain ratio from the table
     :param data_set: data set belonging to one node of decision tree
     :param eigens: dictionary of eigen name and eigen values
     :return: list of tuple. Each tuple is like (eigen A, info gain ratio of eigen A)
     """
-    def empirical_info_gain_ratio_closure(eigen_values):
-        cond_entropy = empirical_cond_entropy(data_set, eigen_values)
-        info_gain = entropy - cond_entropy
-        return info_gain/entropy
-    entropy = empirical_entropy(data_set)
-    info_gain_ratio_per_eigen = map(empirical_info_gain_ratio_closure, eigens.values())
-    return zip(eigens.keys(), info_gain_ratio_per_eigen)
+    tables = tables_of_eigens(data_set, eigens)
+    return [(eigen, info_gain_ratio_of_table(table)) for eigen, table in tables]
 
 
-def best_eigen_for_info_gain_ration(data_set, eigens):
+def best_eigen_for_info_gain_ration(data_set, eigens, executor=None, weights=None):
     """
     Choose the best eigen which has max information gain ratio
     :param data_set: data set belonging to one node of decision tree
     :param eigens: dictionary of eigen name and eigen values
+    :param executor: ParallelUtil.SplitExecutor to count eigens concurrently. None to count them one after another
+    :param weights: weight of each data. None means every weight is 1
     :return: tuple(best eigen name, maximum info gain ratio)
     """
-    info_gain_ratios = empirical_info_gain_ratio_of_eigens(data_set, eigens)
-    # lambda that returns the best eigen and maximum information gain ratio
-    l_get_best = lambda igr1, igr2: igr1 if igr1[1] > igr2[1] else igr2
-    best_info_gain_ratio = reduce(l_get_best, info_gain_ratios)
-    return best_info_gain_ratio
+    return best_eigen_of_tables(tables_of_eigens(data_set, eigens, executor, weights))
+
+
+def mode_of_counts(distinct_data, counts):
+    """
+    :param distinct_data: distinct data, sorted
+    :param counts: count of each distinct data
+    :return: mode. When several data have maximum count, the last one is returned.
+    """
+    return distinct_data[len(counts) - 1 - np.argmax(counts[::-1])]
 
 
-def mode(data_set):
+def mode(data_set, weights=None):
     """
     :param data_set:
-    :return: mode of data set
-    """
-    distinct_data = set(data_set.flat)
-    #  lambda returns a tuple of (distinct data, its count)
-    l_dist_sum = lambda d: (d, sum(data_set == d))
-    distinct_data_sum_list = map(l_dist_sum, distinct_data)
-    # lambda returns the mode (= a data which has maximum count)
-    l_get_mode = lambda d1, d2: d1 if d1[1] > d2[1] else d2
-    mode = reduce(l_get_mode, distinct_data_sum_list)
-    return mode[0]
\ No newline at end of file
+    :param weights: weight of each data. None means every weight is 1
+    :return: mode of data set. With weights, it's the data with maximum sum of weights.
+    """
+    distinct_data, codes = factorize(data_set)
+    return mode_of_counts(distinct_data, count(codes, len(distinct_data), weights))
@@ -0,0 +1,414 @@
+import MyStatisticsLib.DecisionTreeUtil as dtu
+import MyStatisticsLib.KDTree as kdt
+import numpy as np
+
+
+class FlatDecisionTree:
+    """
+    DecisionTree compiled into flat arrays. Node 0 is the root, nodes are numbered in pre-order.
+        eigen_names: names of eigens used by the tree
+        dictionaries: dictionaries[i] are sorted values of i-th eigen which appear in the tree
+        split_eigen: index of split eigen of each node in eigen_names, -1 for leaf node
+        child_offset: child_table[child_offset[k] + code] is the child of node k for eigen value of "code"
+        child_table: children of all nodes. -1 means the node has no child for the eigen value.
+        categories: distinct categories of nodes
+        category: index of category of each node in categories
+    """
+    def __init__(self, tree, alpha=None):
+        """
+        :param tree: trained DecisionTree
+        :param alpha: if alpha is given, nodes whose prune_alpha <= alpha are compiled as leaf nodes
+        """
+        nodes = list(tree.nodes(alpha))
+        node_ids = dict((id(node), k) for k, node in enumerate(nodes))
+
+        # collect eigen values used by children of each eigen
+        values_of_eigen = dict()
+        for node in nodes:
+            if not node.is_leaf(alpha):
+                values_of_eigen.setdefault(node.best_eigen_name, list()).extend(node.children.keys())
+        self.eigen_names = list(values_of_eigen.keys())
+        self.dictionaries = [dtu.factorize(np.array(values))[0] for values in values_of_eigen.values()]
+
+        self.categories, self.category = dtu.factorize(np.array([node.category for node in nodes]))
+        self.split_eigen = np.full(len(nodes), -1)
+        self.child_offset = np.zeros(len(nodes), dtype=np.intp)
+        child_table = list()
+        for k, node in enumerate(nodes):
+            if node.is_leaf(alpha):
+                continue
+            eigen = self.eigen_names.index(node.best_eigen_name)
+            dictionary = self.dictionaries[eigen]
+            self.split_eigen[k] = eigen
+            self.child_offset[k] = len(child_table)
+            children = np.full(len(dictionary), -1)
+            codes = dtu.encode(dictionary, np.array(list(node.children.keys())))
+            children[codes] = [node_ids[id(child)] for child in node.children.values()]
+            child_table.extend(children)
+        self.child_table = np.array(child_table, dtype=np.intp)
+
+    def decide_all(self, eigens):
+        """
+        make decisions for many samples at once. All samples go down the tree level by level together.
+        :param eigens: dictionary of eigens. key is eigen name, value is numpy array of eigen values of all samples
+        :return: numpy array of decisions. Like DecisionTree.decide, decision is None if a sample has an eigen value
+                 which doesn't exist in the tree.
+        """
+        length = len(next(iter(eigens.values()))) if len(eigens) > 0 else 0
+        # encode eigen values of samples only once
+        codes = np.empty((len(self.eigen_names), length), dtype=np.intp)
+        for eigen, name in enumerate(self.eigen_names):
+            codes[eigen] = dtu.encode(self.dictionaries[eigen], eigens[name])
+
+        node_of_sample = np.zeros(length, dtype=np.intp)
+        samples = np.arange(length)
+        while len(samples) > 0:
+            split_eigen = self.split_eigen[node_of_sample[samples]]
+            # samples which arrive at leaf nodes are decided
+            samples, split_eigen = samples[split_eigen >= 0], split_eigen[split_eigen >= 0]
+            value_codes = codes[split_eigen, samples]
+            child = self.child_table[self.child_offset[node_of_sample[samples]] + value_codes]
+            # samples with unknown eigen values are marked by -1
+            child[value_codes < 0] = -1
+            node_of_sample[samples] = child
+            samples = samples[child >= 0]
+
+        decisions = self.categories[self.category[np.maximum(node_of_sample, 0)]]
+        if np.any(node_of_sample < 0):
+            decisions = decisions.astype(object)
+            decisions[node_of_sample < 0] = None
+        return decisions
+
+
+class FlatClassificationTree:
+    """
+    CartClassificationTree compiled into flat arrays. Node 0 is the root, nodes are numbered in pre-order.
+        eigen_names: names of eigens used by the tree
+        dictionaries: dictionaries[i] are sorted split values of i-th eigen
+        split_eigen: index of split eigen of each node in eigen_names, -1 for leaf node
+        split_code: code of split value of each node in its dictionary. Samples whose eigen value has this code go
+            to the left child, other samples go to the right child
+        left_child, right_child: children of each node, -1 for leaf node
+        categories: distinct predictions of nodes
+        category: index of prediction of each node in categories
+    """
+    def __init__(self, tree):
+        """
+        :param tree: trained CartClassificationTree
+        """
+        nodes = list(tree.nodes())
+        node_ids = dict((id(node), k) for k, node in enumerate(nodes))
+        values_of_eigen = dict()
+        for node in nodes:
+            if len(node.children) != 0:
+                values_of_eigen.setdefault(node.split_eigen, list()).append(node.split_value)
+        self.eigen_names = list(values_of_eigen.keys())
+        self.dictionaries = [dtu.factorize(np.array(values))[0] for values in values_of_eigen.values()]
+
+        self.categories, self.category = dtu.factorize(np.array([node.prediction for node in nodes]))
+        self.split_eigen = np.full(len(nodes), -1)
+        self.split_code = np.full(len(nodes), -1)
+        self.left_child = np.full(len(nodes), -1)
+        self.right_child = np.full(len(nodes), -1)
+        for k, node in enumerate(nodes):
+            if len(node.children) == 0:
+                continue
+            eigen = self.eigen_names.index(node.split_eigen)
+            self.split_eigen[k] = eigen
+            self.split_code[k] = dtu.encode(self.dictionaries[eigen], np.array([node.split_value]))[0]
+            self.left_child[k], self.right_child[k] = [node_ids[id(child)] for child in node.children]
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        make decisions for many samples at once. All samples go down the tree level by level together.
+        :param eigens: dictionary of eigens. key is eigen name, value is numpy array of eigen values of all samples.
+                It can also be a 2-D numpy array, each row is a sample and each column is an eigen.
+        :param eigen_names: names of columns when eigens is a 2-D numpy array
+        :return: numpy array of decisions
+        """
+        codes = eigen_codes(self.eigen_names, self.dictionaries, eigens, eigen_names)
+        node_of_sample = np.zeros(codes.shape[1], dtype=np.intp)
+        samples = np.arange(codes.shape[1])
+        while len(samples) > 0:
+            split_eigen = self.split_eigen[node_of_sample[samples]]
+            # samples which arrive at leaf nodes are decided
+            samples, split_eigen = samples[split_eigen >= 0], split_eigen[split_eigen >= 0]
+            nodes = node_of_sample[samples]
+            # a value which is not a split value of the eigen is encoded as -1, it never equals a split code
+            go_left = codes[split_eigen, samples] == self.split_code[nodes]
+            node_of_sample[samples] = np.where(go_left, self.left_child[nodes], self.right_child[nodes])
+        return self.categories[self.category[node_of_sample]]
+
+
+class FlatRegressionTree:
+    """
+    CartRegressionTree compiled into flat arrays. Node 0 is the root, nodes are numbered in pre-order.
+        eigen_names: names of eigens used by the tree
+        split_eigen: index of split eigen of each node in eigen_names, -1 for leaf node
+        threshold: split value of each node. Samples with eigen value <= threshold go to the left child
+        left_child, right_child: children of each node, -1 for leaf node
+        prediction: prediction of each node
+    """
+    def __init__(self, tree):
+        """
+        :param tree: trained CartRegressionTree
+        """
+        nodes = list(tree.nodes())
+        node_ids = dict((id(node), k) for k, node in enumerate(nodes))
+        self.eigen_names = list()
+        self.split_eigen = np.full(len(nodes), -1)
+        self.threshold = np.zeros(len(nodes))
+        self.left_child = np.full(len(nodes), -1)
+        self.right_child = np.full(len(nodes), -1)
+        self.prediction = np.array([node.prediction for node in nodes], dtype=float)
+        for k, node in enumerate(nodes):
+            if len(node.children) == 0:
+                continue
+            if node.split_eigen not in self.eigen_names:
+                self.eigen_names.append(node.split_eigen)
+            self.split_eigen[k] = self.eigen_names.index(node.split_eigen)
+            self.threshold[k] = node.split_value
+            self.left_child[k], self.right_child[k] = [node_ids[id(child)] for child in node.children]
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        make decisions for many samples at once. All samples go down the tree level by level together.
+        :param eigens: dictionary of eigens. key is eigen name, value is numpy array of eigen values of all samples.
+                It can also be a 2-D numpy array, each row is a sample and each column is an eigen.
+        :param eigen_names: names of columns when eigens is a 2-D numpy array
+        :return: numpy array of predictions
+        """
+        values = eigen_matrix(self.eigen_names, eigens, eigen_names)
+        node_of_sample = route(self, values, np.zeros(values.shape[1], dtype=np.intp), np.arange(values.shape[1]))
+        return self.prediction[node_of_sample]
+
+
+class FlatRegressionEnsemble:
+    """
+    Many FlatRegressionTree fused into one set of flat arrays, e.g. trees of gradient boosting.
+    Nodes of all trees are concatenated, roots[t] is the root of t-th tree. Predictions of nodes are already
+    multiplied by the weight of their tree, so prediction of ensemble is bias + sum of predictions of leaves.
+    Unlike FlatRegressionTree, a leaf node is its own left and right child and its threshold is inf, so every
+    (tree, sample) pair simply takes "depth" steps without checking whether it has arrived at a leaf.
+    """
+    # maximum number of (tree, sample) pairs routed together. Small batches stay in cache.
+    batch_pairs = 1 << 18
+
+    def __init__(self, flat_trees, tree_weights, bias=0.):
+        """
+        :param flat_trees: list of FlatRegressionTree
+        :param tree_weights: weight of each tree, e.g. learning rate of gradient boosting
+        :param bias: constant added to every prediction
+        """
+        self.bias = bias
+        self.eigen_names = list()
+        for flat in flat_trees:
+            self.eigen_names.extend(name for name in flat.eigen_names if name not in self.eigen_names)
+        sizes = [len(flat.split_eigen) for flat in flat_trees]
+        self.roots = np.cumsum([0] + sizes[:-1]).astype(np.intp)
+        split_eigen, threshold, left_child, right_child, prediction = list(), list(), list(), list(), list()
+        for root, flat, weight in zip(self.roots, flat_trees, tree_weights):
+            # map eigen index of the tree to eigen index of the ensemble
+            eigen_map = np.array([self.eigen_names.index(name) for name in flat.eigen_names] + [-1])
+            split_eigen.append(eigen_map[flat.split_eigen])
+            threshold.append(flat.threshold)
+            left_child.append(np.where(flat.left_child >= 0, flat.left_child + root, -1))
+            right_child.append(np.where(flat.right_child >= 0, flat.right_child + root, -1))
+            prediction.append(flat.prediction * weight)
+        # the leading empty arrays keep dtypes when there is no tree
+        self.split_eigen = np.concatenate([np.zeros(0, dtype=np.intp)] + split_eigen)
+        self.threshold = np.concatenate([np.zeros(0)] + threshold)
+        self.left_child = np.concatenate([np.zeros(0, dtype=np.intp)] + left_child)
+        self.right_child = np.concatenate([np.zeros(0, dtype=np.intp)] + right_child)
+        self.prediction = np.concatenate([np.zeros(0)] + prediction)
+
+        leaf = self.split_eigen < 0
+        nodes = np.arange(len(leaf))
+        self.split_eigen[leaf], self.threshold[leaf] = 0, np.inf
+        self.left_child[leaf], self.right_child[leaf] = nodes[leaf], nodes[leaf]
+        # depth is the maximum number of steps from a root to a leaf
+        self.depth = 0
+        frontier = self.roots[~leaf[self.roots]]
+        while len(frontier) > 0:
+            self.depth += 1
+            frontier = np.concatenate((self.left_child[frontier], self.right_child[frontier]))
+            frontier = frontier[~leaf[frontier]]
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        make decisions for many samples at once. All samples go down all trees level by level together.
+        :param eigens: dictionary of eigens, or a 2-D numpy array whose rows are samples
+        :param eigen_names: names of columns when eigens is a 2-D numpy array
+        :return: numpy array of predictions
+        """
+        values = eigen_matrix(self.eigen_names, eigens, eigen_names)
+        length = values.shape[1]
+        predictions = np.full(length, float(self.bias))
+        tree_num = len(self.roots)
+        if tree_num == 0:
+            return predictions
+        # values[eigen, sample] is read as flat_values[eigen * length + sample]
+        flat_values = values.ravel()
+        batch = max(1, self.batch_pairs // tree_num)
+        for start in range(0, length, batch):
+            samples = np.arange(start, min(start + batch, length))
+            # every (tree, sample) pair starts at the root of the tree
+            node_of_pair = np.repeat(self.roots, len(samples))
+            position_of_pair = np.tile(samples, tree_num)
+            for step in range(self.depth):
+                go_left = flat_values[self.split_eigen[node_of_pair] * length + position_of_pair] <= \
+                    self.threshold[node_of_pair]
+                node_of_pair = np.where(go_left, self.left_child[node_of_pair], self.right_child[node_of_pair])
+            predictions[samples] += self.prediction[node_of_pair].reshape(tree_num, len(samples)).sum(axis=0)
+        return predictions
+
+
+class FlatKDTree:
+    """
+    KDTree compiled into flat arrays. Node 0 is the root, nodes are numbered in pre-order.
+        split: split dimension of each node
+        median: median of each node on its split dimension
+        left_child, right_child: children of each node, -1 if the node has no such child
+        points: points on the split planes of all nodes, the last column is the index of the point in orig_data
+        data_start, data_end: points[data_start[k]:data_end[k]] are points on the split plane of node k
+        orig_data: the data which the tree is built with
+    searchNearest and search return the same results as the methods of KDTree.
+    """
+    def __init__(self, tree):
+        """
+        :param tree: KDTree after build
+        """
+        nodes = list(tree.nodes())
+        node_ids = dict((id(node), k) for k, node in enumerate(nodes))
+        self.split = np.array([node.split for node in nodes], dtype=np.intp)
+        self.median = np.array([node.median for node in nodes], dtype=float)
+        self.left_child = np.array([-1 if node.left is None else node_ids[id(node.left)] for node in nodes],
+                                   dtype=np.intp)
+        self.right_child = np.array([-1 if node.right is None else node_ids[id(node.right)] for node in nodes],
+                                    dtype=np.intp)
+        sizes = [len(node.data) for node in nodes]
+        self.data_end = np.cumsum(sizes).astype(np.intp)
+        self.data_start = self.data_end - sizes
+        self.points = np.concatenate([node.data for node in nodes])
+        self.orig_data = np.asarray(tree.orig_data)
+
+    def searchNearest(self, target, min_dist=(-1, None), node=0):
+        """
+        search the nearest neighbor of target
+        :param target: target data to be searched, type is numpy.array
+        :param min_dist: current minimum distance and nearest points, format (min dist, nearest points)
+        :param node: node to start searching from
+        :return: (min distance, nearest points). Last column of nearest points is their index in orig_data
+        """
+        node_data = self.points[self.data_start[node]:self.data_end[node]]
+        distance = np.sqrt(np.sum(np.square(target - node_data[:, :-1]), axis=1))
+        min_distance = distance.min()
+        if min_dist[0] < 0 or min_dist[0] > min_distance:
+            min_dist = (min_distance, node_data[distance == min_distance])
+
+        split, median = self.split[node], self.median[node]
+        near, far = (self.left_child[node], self.right_child[node]) if target[split] <= median else \
+            (self.right_child[node], self.left_child[node])
+        if near >= 0:
+            min_dist = self.searchNearest(target, min_dist, near)
+        # the other side is searched only when the ball of min distance intersects with the split plane
+        if far >= 0 and np.abs(target[split] - median) < min_dist[0]:
+            min_dist = self.searchNearest(target, min_dist, far)
+        return min_dist
+
+    def search(self, target, k=1, od_ball=None, node=0):
+        """
+        search the nearest k neighbors of target
+        :param target: target data to be searched, type is numpy.array
+        :param k: number of neighbors to be searched
+        :param od_ball: MinKOrderedDict of neighbors found so far, None when the search starts
+        :param node: node to start searching from
+        :return: MinKOrderedDict, key is distance and value is list of neighbors
+        """
+        if od_ball is None:
+            od_ball = kdt.MinKOrderedDict(k)
+            if k >= len(self.orig_data):
+                for i in range(0, len(self.orig_data)):
+                    od_ball[i] = self.orig_data[i]
+                return od_ball
+
+        node_data = self.points[self.data_start[node]:self.data_end[node]]
+        node_radius = np.sqrt(np.sum(np.square(target - node_data[:, :-1]), axis=1))
+        for i in range(0, len(node_data)):
+            od_ball[node_radius[i]] = node_data[i]
+
+        split, median = self.split[node], self.median[node]
+        near, far = (self.left_child[node], self.right_child[node]) if target[split] <= median else \
+            (self.right_child[node], self.left_child[node])
+        if near >= 0:
+            self.search(target, k, od_ball, near)
+        if far >= 0 and (od_ball.capacity < k or np.abs(target[split] - median) < od_ball.getMaxKey()):
+            self.search(target, k, od_ball, far)
+        return od_ball
+
+
+def eigen_matrix(names, eigens, eigen_names=None):
+    """
+    :param names: names of eigens used by a flat tree
+    :param eigens: dictionary of eigens, or a 2-D numpy array whose rows are samples
+    :param eigen_names: names of columns when eigens is a 2-D numpy array
+    :return: 2-D float array, row i is values of names[i] of all samples
+    """
+    if not isinstance(eigens, dict):
+        eigens = np.asarray(eigens)
+        if eigen_names is None or eigens.ndim != 2 or eigens.shape[1] != len(eigen_names):
+            raise ValueError("eigen_names must name every column of the 2-D eigen array")
+        eigens = dict(zip(eigen_names, eigens.T))
+    for name in names:
+        if name not in eigens:
+            raise KeyError("Eigen doesn't exist: " + str(name))
+    length = len(next(iter(eigens.values()))) if len(eigens) > 0 else 0
+    values = np.empty((len(names), length))
+    for eigen, name in enumerate(names):
+        values[eigen] = eigens[name]
+    return values
+
+
+def eigen_codes(names, dictionaries, eigens, eigen_names=None):
+    """
+    :param names: names of eigens used by a flat tree
+    :param dictionaries: dictionaries[i] are sorted values of names[i]
+    :param eigens: dictionary of eigens, or a 2-D numpy array whose rows are samples
+    :param eigen_names: names of columns when eigens is a 2-D numpy array
+    :return: 2-D integer array, row i is codes of values of names[i] of all samples. Values not in the dictionary
+              are encoded as -1.
+    """
+    if not isinstance(eigens, dict):
+        eigens = np.asarray(eigens)
+        if eigen_names is None or eigens.ndim != 2 or eigens.shape[1] != len(eigen_names):
+            raise ValueError("eigen_names must name every column of the 2-D eigen array")
+        eigens = dict(zip(eigen_names, eigens.T))
+    for name in names:
+        if name not in eigens:
+            raise KeyError("Eigen doesn't exist: " + str(name))
+    length = len(next(iter(eigens.values()))) if len(eigens) > 0 else 0
+    codes = np.empty((len(names), length), dtype=np.intp)
+    for eigen, name in enumerate(names):
+        codes[eigen] = dtu.encode(dictionaries[eigen], eigens[name])
+    return codes
+
+
+def route(flat, values, node_of_pair, sample_of_pair):
+    """
+    route samples down binary flat trees level by level until they arrive at leaf nodes
+    :param flat: FlatRegressionTree or FlatRegressionEnsemble
+    :param values: eigen values returned by eigen_matrix
+    :param node_of_pair: start node of each (node, sample) pair
+    :param sample_of_pair: sample of each pair
+    :return: leaf node of each pair
+    """
+    node_of_pair = node_of_pair.copy()
+    pairs = np.arange(len(node_of_pair))
+    while len(pairs) > 0:
+        split_eigen = flat.split_eigen[node_of_pair[pairs]]
+        # pairs which arrive at leaf nodes are decided
+        pairs, split_eigen = pairs[split_eigen >= 0], split_eigen[split_eigen >= 0]
+        nodes = node_of_pair[pairs]
+        go_left = values[split_eigen, sample_of_pair[pairs]] <= flat.threshold[nodes]
+        node_of_pair[pairs] = np.where(go_left, flat.left_child[nodes], flat.right_child[nodes])
+    return node_of_pair
@@ -0,0 +1,133 @@
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.CartRegressionTreeUtil as crtu
+import MyStatisticsLib.FlatTree as ft
+import numpy as np
+
+
+class GradientBoostingTree:
+    """
+    梯度提升回归树。每一轮用一棵浅的CART回归树拟合当前预测的残差（平方损失的负梯度），
+    预测值是初始值加上每棵树的预测值乘以学习率。
+    所有的树共用一份量化后的特征，特征只在开始时量化一次，每一轮只统计直方图，不再复制或划分特征字典。
+    结点的停止条件由tree_settings中的参数决定，没有给出的参数使用min_data_set_size和min_deviation_ratio。
+    """
+    # 学习率(shrinkage)
+    learning_rate = 0.1
+    # 最多训练的轮数
+    max_rounds = 100
+    # 每棵树的最大深度
+    max_depth = 3
+    # 每一轮不放回抽样的数据比例，1表示使用全部数据
+    subsample = 1.0
+    # 每个特征最多量化为多少个分位数区间
+    max_bins = 255
+    # 验证集上的误差连续这么多轮没有下降时，停止训练
+    early_stopping_rounds = 10
+    # 每棵树的结点数据量小于它时不再分片
+    min_data_set_size = 2
+    # 每棵树的结点差方和小于初始差方和的这个比例时不再分片。残差每一轮都在变小，
+    # 如果使用CartRegressionTree的绝对阈值，后面几轮的树都只剩一个叶结点
+    min_deviation_ratio = 1e-12
+    # 可以在每个实例上单独设置的参数，没有设置的参数使用上面的类属性
+    setting_names = ("learning_rate", "max_rounds", "max_depth", "subsample", "max_bins", "early_stopping_rounds",
+                     "min_data_set_size", "min_deviation_ratio")
+
+    def __init__(self, random_state=None, tree_settings=None, **settings):
+        """
+        :param random_state: 抽样的随机数种子
+        :param tree_settings: 构造每棵树时使用的CartRegressionTree的参数，例如data_set_size_threshold。
+                它覆盖由min_data_set_size和min_deviation_ratio得到的停止条件
+        :param settings: setting_names中的参数，只对这个模型有效
+        """
+        for name, value in settings.items():
+            if name not in GradientBoostingTree.setting_names:
+                raise TypeError("Unknown setting: " + name)
+            setattr(self, name, value)
+        self.random_state = random_state
+        self.tree_settings = dict() if tree_settings is None else dict(tree_settings)
+        self.init_prediction = None
+        self.trees = list()
+        # 每一轮之后训练集和验证集上的均方误差
+        self.train_errors = list()
+        self.valid_errors = list()
+        self.ensemble = None
+
+    def build(self, data_set, eigens, valid_data_set=None, valid_eigens=None, weights=None):
+        """
+        训练梯度提升回归树
+        :param data_set: 训练数据集，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param valid_data_set: 验证数据集。给出时，用它提前停止训练，只保留验证误差最小时的树
+        :param valid_eigens: 验证数据集的特征字典
+        :param weights: 每个训练数据的权重，None表示权重都是1
+        :return:
+        """
+        edges, binned_eigens = crtu.quantize_eigens(eigens, self.max_bins)
+        random = np.random.RandomState(self.random_state)
+        size = len(data_set)
+        sample_size = max(1, int(round(size * self.subsample)))
+
+        self.init_prediction = np.average(data_set, weights=weights)
+        tree_settings = {"data_set_size_threshold": self.min_data_set_size,
+                         "deviation_sum_threshold": self.min_deviation_ratio * crtu.deviation_sum(data_set, weights)}
+        tree_settings.update(self.tree_settings)
+        self.trees = list()
+        self.train_errors, self.valid_errors = list(), list()
+        prediction = np.full(size, self.init_prediction)
+        if valid_data_set is not None:
+            valid_prediction = np.full(len(valid_data_set), self.init_prediction)
+        best_rounds = 0
+        for boosting_round in range(self.max_rounds):
+            residual = data_set - prediction
+            if sample_size < size:
+                rows = np.sort(random.choice(size, sample_size, replace=False))
+            else:
+                rows = np.arange(size)
+            tree = crt.CartRegressionTree(root=True, **tree_settings)
+            tree.build_on_binned(residual, edges, binned_eigens, rows, weights, self.max_depth)
+            self.trees.append(tree)
+
+            # 树的分片特征值都是区间的上界，用原始特征值预测和用量化后的特征预测结果相同
+            prediction += self.learning_rate * tree.decide_all(eigens)
+            self.train_errors.append(np.average((data_set - prediction) ** 2, weights=weights))
+            if valid_data_set is None:
+                best_rounds = len(self.trees)
+                continue
+            valid_prediction += self.learning_rate * tree.decide_all(valid_eigens)
+            self.valid_errors.append(np.average((valid_data_set - valid_prediction) ** 2))
+            if best_rounds == 0 or self.valid_errors[-1] < self.valid_errors[best_rounds - 1]:
+                best_rounds = len(self.trees)
+            elif len(self.trees) - best_rounds >= self.early_stopping_rounds:
+                break
+
+        # 只保留验证误差最小时的树
+        del self.trees[best_rounds:]
+        self.ensemble = self.compile()
+
+    def compile(self):
+        """
+        把所有的树融合为一组扁平数组，用于批量预测
+        :return: FlatTree.FlatRegressionEnsemble
+        """
+        flat_trees = [tree.compile() for tree in self.trees]
+        return ft.FlatRegressionEnsemble(flat_trees, [self.learning_rate] * len(flat_trees),
+                                         self.init_prediction)
+
+    def decide(self, eigen):
+        """
+        根据一个输入样本的特征值进行预测
+        :param eigen: 特征字典，包含一个样本的每个特征的值
+        :return: 预测值
+        """
+        return self.init_prediction + self.learning_rate * sum(tree.decide(eigen) for tree in self.trees)
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        对多个样本进行预测。所有的树被融合为一组扁平数组，所有样本在所有的树中一层一层地一起向下走。
+        :param eigens: 特征字典，包含多个样本的每个特征的值；或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: numpy.array，每个样本的预测值
+        """
+        if self.ensemble is None:
+            self.ensemble = self.compile()
+        return self.ensemble.decide_all(eigens, eigen_names)
@@ -0,0 +1,178 @@
+import MyStatisticsLib.DecisionTree as dt
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.PruneUtil as pru
+import numpy as np
+import copy
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+
+class GridSearch:
+    """
+    Search stopping settings of a tree on a grid without training a tree for every combination.
+    The most permissive tree (the minimum of every setting) is built once. The split chosen by a node doesn't depend
+    on stopping settings, so the tree built with any stricter combination is that tree truncated at the nodes which
+    stop under the combination. Test samples are routed down the grown tree once, then the test loss of every
+    combination is summed up from the nodes that become leaves, in a pool of worker processes.
+    """
+    # number of combinations evaluated by one task of the worker pool
+    chunk_size = 64
+
+    def __init__(self, tree_class, grid, settings=None, workers=None):
+        """
+        :param tree_class: DecisionTree, CartClassificationTree or CartRegressionTree
+        :param grid: dictionary of setting name and list of values. Names must be in tree_class.stop_statistics
+        :param settings: other settings of the tree, e.g. max_bins of CartRegressionTree
+        :param workers: number of worker processes
+        """
+        for name in grid:
+            if name not in tree_class.stop_statistics:
+                raise ValueError("Not a stopping setting of " + tree_class.__name__ + ": " + name)
+        self.tree_class = tree_class
+        self.grid = dict((name, list(values)) for name, values in grid.items())
+        self.settings = dict() if settings is None else dict(settings)
+        self.workers = workers
+        self.tree = None
+        # list of (settings, test loss, number of leaves) of every combination in the order of grid
+        self.results = list()
+        self.best_settings = None
+        self.best_loss = None
+
+    def search(self, data_set, eigens, test_data_set, test_eigens, weights=None):
+        """
+        build the most permissive tree and evaluate every combination of the grid with test data.
+        Test loss is error rate for classification trees, and mean squared error for regression trees.
+        :param data_set: data set
+        :param eigens: dictionary of eigens. key is eigen name, value is eigen values
+        :param test_data_set: test data set
+        :param test_eigens: dictionary of eigens of test data
+        :param weights: weight of each data. None means every weight is 1
+        :return: settings of the combination with the minimum test loss. Among equal losses the one with the
+                  fewest leaves wins, then the first one in the grid.
+        """
+        permissive = dict((name, min(values)) for name, values in self.grid.items())
+        self.tree = self.tree_class(root=True, **self.settings, **permissive)
+        self.tree.build(data_set, eigens, weights=weights)
+
+        arrays = node_arrays(self.tree, self.grid, test_data_set, test_eigens)
+        names = list(self.grid)
+        combinations = list(itertools.product(*self.grid.values()))
+        with plu.SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(self.workers) as pool:
+                futures = [pool.submit(losses_in_worker, shared.descriptor(), names,
+                                       combinations[start:start + GridSearch.chunk_size])
+                           for start in range(0, len(combinations), GridSearch.chunk_size)]
+                losses = [loss for future in futures for loss in future.result()]
+
+        size = max(len(test_data_set), 1)
+        self.results = [(dict(zip(names, combination)), loss / size, leaf_num)
+                        for combination, (loss, leaf_num) in zip(combinations, losses)]
+        best = min(range(len(self.results)), key=lambda k: self.results[k][1:])
+        self.best_settings, self.best_loss = self.results[best][0], self.results[best][1]
+        return self.best_settings
+
+    def best_tree(self):
+        """
+        :return: a copy of the grown tree truncated with the best settings, which is the same as the tree built with
+                  the best settings
+        """
+        # an executor in settings can't be copied, the copy shares it
+        executor = self.tree.setting("split_executor")
+        tree = copy.deepcopy(self.tree, {id(executor): executor})
+        tree.truncate(**self.best_settings)
+        return tree
+
+
+def children_of(node):
+    """
+    :param node: node of DecisionTree, CartClassificationTree or CartRegressionTree
+    :return: children in their order. A list for DecisionTree, whose children property is a dictionary of eigen value
+              and child. A tuple (left, right) for CART trees, which is empty for a leaf
+    """
+    return list(node.children.values()) if isinstance(node.children, dict) else node.children
+
+
+def node_arrays(tree, grid, test_data_set, test_eigens):
+    """
+    route test samples down the tree once, and collect the arrays needed to evaluate any truncation of the tree
+    :param tree: the grown tree
+    :param grid: dictionary of setting name and list of values
+    :param test_data_set: test data set
+    :param test_eigens: dictionary of eigens of test data
+    :return: dictionary of arrays of nodes in pre-order:
+              "size": number of nodes of each sub-tree, so sub-tree of node k is nodes[k:k+size[k]]
+              "is_leaf": True for leaves of the grown tree
+              "node_loss": test loss of samples reaching the node when the node is a leaf
+              "lost": test loss of samples which stop at an internal node because no child matches their value
+              ("statistic", name): node attribute compared with each setting, inf for leaves
+    """
+    nodes = list(tree.nodes())
+    position = dict((id(node), k) for k, node in enumerate(nodes))
+    is_leaf = np.array([len(node.children) == 0 for node in nodes])
+    regression = isinstance(tree, crt.CartRegressionTree)
+    columns = dict((eigen, np.asarray(values)) for eigen, values in test_eigens.items())
+    test_data_set = np.asarray(test_data_set)
+
+    node_loss, lost = np.zeros(len(nodes)), np.zeros(len(nodes))
+    stack = [(tree, np.arange(len(test_data_set)))]
+    while len(stack) > 0:
+        node, index = stack.pop()
+        k = position[id(node)]
+        prediction = node.category if isinstance(node, dt.DecisionTree) else node.prediction
+        if regression:
+            node_loss[k] = np.sum((test_data_set[index] - prediction) ** 2)
+        else:
+            node_loss[k] = np.count_nonzero(test_data_set[index] != prediction)
+        if is_leaf[k]:
+            continue
+        child_indexes = node.route(columns, index)
+        # a sample which reaches no child has no decision, it's always wrong
+        lost[k] = len(index) - sum(len(child_index) for child_index in child_indexes)
+        stack.extend(zip(children_of(node), child_indexes))
+
+    parent = pru.parents_of(nodes, children_of)
+    size = pru.subtree_statistics(parent, node_loss, is_leaf)[2]
+    arrays = {"size": size, "is_leaf": is_leaf, "node_loss": node_loss, "lost": lost}
+    for name in grid:
+        statistic = tree.stop_statistics[name]
+        arrays[("statistic", name)] = np.array([np.inf if leaf else getattr(node, statistic)
+                                                for node, leaf in zip(nodes, is_leaf)], dtype=float)
+    return arrays
+
+
+def truncated_loss(arrays, settings):
+    """
+    :param arrays: returned by node_arrays
+    :param settings: dictionary of setting name and value
+    :return: test loss and number of leaves of the tree truncated with settings
+    """
+    size, is_leaf = arrays["size"], arrays["is_leaf"]
+    stops = is_leaf.copy()
+    for name, value in settings.items():
+        stops |= arrays[("statistic", name)] < value
+    # nodes inside the sub-tree of a stopping node are cut off
+    cut = np.zeros(len(size) + 1, dtype=np.intp)
+    stopping = np.flatnonzero(stops & ~is_leaf)
+    np.add.at(cut, stopping + 1, 1)
+    np.add.at(cut, stopping + size[stopping], -1)
+    kept = np.cumsum(cut[:-1]) == 0
+    leaves = kept & stops
+    return arrays["node_loss"][leaves].sum() + arrays["lost"][kept & ~stops].sum(), int(np.count_nonzero(leaves))
+
+
+def losses_in_worker(descriptor, names, combinations):
+    """
+    evaluate combinations of settings in a worker process. Arrays of nodes are read from shared memory.
+    :param descriptor: descriptor of shared memory block with arrays returned by node_arrays
+    :param names: setting names
+    :param combinations: list of tuples of setting values
+    :return: list of (test loss, number of leaves) of each combination
+    """
+    shm, arrays = plu.attach(descriptor)
+    try:
+        return [truncated_loss(arrays, dict(zip(names, combination))) for combination in combinations]
+    finally:
+        # views of the block must be released before it's closed
+        del arrays
+        shm.close()
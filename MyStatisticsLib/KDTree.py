@@ -64,14 +64,32 @@ class MinKOrderedDict(OrderedDict):
 
 # KDTree
 class KDTree:
+    # nodes have no instance dictionary. left and right are the children, None if the node has no such child.
+    # orig_data is only saved in root node
+    __slots__ = ("depth", "split", "median", "data", "left", "right", "orig_data")
+
     # depth is the depth of tree node
-    def __init__(self, depth=0, parent=None):
+    def __init__(self, depth=0):
         self.depth = depth
-        self.parent = parent
         self.split = -1
         self.median = -1
         self.data = None
-        self.children = dict()
+        self.left = None
+        self.right = None
+        self.orig_data = None
+
+    # return: dictionary of "left"/"right" and child, built when it's read
+    @property
+    def children(self):
+        return dict((side, getattr(self, side)) for side in ("left", "right") if getattr(self, side) is not None)
+
+    # iterate all nodes of the tree in pre-order without recursion
+    def nodes(self):
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in (node.right, node.left) if child is not None)
 
     #  data is a m X n matrix. Each row is a separate data. Each column is 1 dimension of data. Type is numpy.array
     #  m is the number of data
@@ -115,8 +133,9 @@ class KDTree:
 
         for median_idx, type in (l_median_idx, r_median_idx):
             if np.size(median_idx) > 0:
-                self.children[type] = KDTree(self.depth + 1, self)
-                self.children[type].build(data[median_idx])
+                child = KDTree(self.depth + 1)
+                child.build(data[median_idx])
+                setattr(self, type, child)
 
     #  search the nearest neighbor of target
     #  target: target data to be searched, type is numpy.array
@@ -144,11 +163,11 @@ class KDTree:
         #  self.split is the dimension by which child tree nodes are split
         #  if target is less than median on the split dimension, search left child. Otherwise search right child.
         type = "left" if target[self.split] <= self.median else "right"
-        if type in self.children.keys():
-            min_dist = self.children[type].searchNearest(target, min_dist)
+        if getattr(self, type) is not None:
+            min_dist = getattr(self, type).searchNearest(target, min_dist)
 
         # for a non-leaf node, we need to judge if their children contains a nearest neighbor
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             # first, only when the super-ball intersects with split super-surface of current node
             # then the node's children will probably contains nearest neighbor
             #       D = distance between center of ball and super-surface = "np.abs(target[self.split] - self.median)"
@@ -159,8 +178,8 @@ class KDTree:
             if np.abs(target[self.split] - self.median) < min_dist[0]:
                 # search the other child that didn't tried during depth first search
                 type = "right" if target[self.split] <= self.median else "left"
-                if type in self.children.keys():
-                    min_dist = self.children[type].searchNearest(target, min_dist)
+                if getattr(self, type) is not None:
+                    min_dist = getattr(self, type).searchNearest(target, min_dist)
         return min_dist
 
     #  search the nearest k neighbor of target
@@ -198,11 +217,11 @@ class KDTree:
         #  self.split is the dimension by which child tree nodes are split
         #  if target is less than median on the split dimension, search left child, otherwise search right child
         type = "left" if target[self.split] <= self.median else "right"
-        if type in self.children.keys():
-            self.children[type].search(target, k, od_ball)
+        if getattr(self, type) is not None:
+            getattr(self, type).search(target, k, od_ball)
 
         # for a non-leaf node, we need to judge if their children contains a nearest neighbor
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             # first, only when biggest super-ball intersects with split super-plane of current node
             # then the node's children will probably contains nearest neighbor
             #       D = distance between center of ball and super-plane = "np.abs(target[self.split] - self.median)"
@@ -213,22 +232,22 @@ class KDTree:
             if od_ball.capacity < k or np.abs(target[self.split] - self.median) < od_ball.getMaxKey():
                 # search the other child that didn't tried during depth first search
                 type = "right" if target[self.split] <= self.median else "left"
-                if type in self.children.keys():
-                    self.children[type].search(target, k, od_ball)
+                if getattr(self, type) is not None:
+                    getattr(self, type).search(target, k, od_ball)
         return od_ball
 
     def traverse(self):
         """
         :return:  KD Tree in dictionary format
         """
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             tree = dict()
             sub_tree = dict()
             my_median = str(self.median)
 
-            for child in self.children:
+            for child in [side for side in ("left", "right") if getattr(self, side) is not None]:
                 op = "<" if child == "left" else ">"
-                sub_tree[op + my_median] = self.children[child].traverse()
+                sub_tree[op + my_median] = getattr(self, child).traverse()
 
             tree_tag = "dim=" + str(self.split) + ", data num =" + str(len(self.data))
             tree[tree_tag] = sub_tree
@@ -62,14 +62,31 @@ class MinKOrderedDict(OrderedDict):
 
 # KDTree
 class KDTree:
+    # 节点没有实例字典，只保存这些属性。left和right是左右子树，没有子树时是None。orig_data只保存在根节点中
+    __slots__ = ("depth", "split", "median", "data", "left", "right", "orig_data")
+
     # depth 是当前节点在树中的深度，根节点深度为0
-    def __init__(self, depth=0, parent=None):
+    def __init__(self, depth=0):
         self.depth = depth
-        self.parent = parent
         self.split = -1
         self.median = -1
         self.data = None
-        self.children = dict()
+        self.left = None
+        self.right = None
+        self.orig_data = None
+
+    # 返回值: "left"/"right"和子树的字典，读取时才生成
+    @property
+    def children(self):
+        return dict((side, getattr(self, side)) for side in ("left", "right") if getattr(self, side) is not None)
+
+    # 不用递归，按先序遍历树的所有节点
+    def nodes(self):
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in (node.right, node.left) if child is not None)
 
     #  构建KD树
     #  data是一个m乘n的矩阵。矩阵的每一行是一个邻居点，行中的每一列是邻居的一个坐标/维度
@@ -116,8 +133,9 @@ class KDTree:
         r_median_idx = np.where(data[:, self.split] > self.median), "right"
         for median_idx, type in (l_median_idx, r_median_idx):
             if np.size(median_idx) > 0:
-                self.children[type] = KDTree(self.depth + 1, self)
-                self.children[type].build(data[median_idx])
+                child = KDTree(self.depth + 1)
+                child.build(data[median_idx])
+                setattr(self, type, child)
 
     #  search the nearest neighbor of target
     #  target: target data to be searched
@@ -145,11 +163,11 @@ class KDTree:
         #  self.split is the dimension by which child tree nodes are split
         #  if target is less than median on the split dimension, search left child. Otherwise search right child.
         type = "left" if target[self.split] <= self.median else "right"
-        if type in self.children.keys():
-            min_dist = self.children[type].searchNearest(target, min_dist)
+        if getattr(self, type) is not None:
+            min_dist = getattr(self, type).searchNearest(target, min_dist)
 
         # for a non-leaf node, we need to judge if their children contains a nearest neighbor
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             # first, only when the super-ball intersects with split super-surface of current node
             # then the node's children will probably contains nearest neighbor
             #       D = distance between center of ball and super-surface = "np.abs(target[self.split] - self.median)"
@@ -160,8 +178,8 @@ class KDTree:
             if np.abs(target[self.split] - self.median) < min_dist[0]:
                 # search the other child that didn't tried during depth first search
                 type = "right" if target[self.split] <= self.median else "left"
-                if type in self.children.keys():
-                    min_dist = self.children[type].searchNearest(target, min_dist)
+                if getattr(self, type) is not None:
+                    min_dist = getattr(self, type).searchNearest(target, min_dist)
         return min_dist
 
     #  搜索目标点最近的K个邻居
@@ -200,11 +218,11 @@ class KDTree:
 
         # 深度优先搜索KD树，先搜索距离目标点近的子树，递归实现。self.split是划分超平面的维度。
         type = "left" if target[self.split] <= self.median else "right"
-        if type in self.children.keys():
-            self.children[type].search(target, k, od_ball)
+        if getattr(self, type) is not None:
+            getattr(self, type).search(target, k, od_ball)
 
         # 递归搜索返回后，对于非叶节点，判断距离目标点远的子树是否含有比搜索结果更近的邻居
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             # 1）如果，搜索结果中的邻居个数小于k，则需要寻找比结果中超球更大的超球。
             # 2）如果，搜索结果中的邻居个数等于k，则判断结果中最大的超球和当前节点的超平面Sc是否相交。如果相交，说明
             # 距离目标点远的子树内可能有更近的邻居。
@@ -215,22 +233,22 @@ class KDTree:
             if od_ball.capacity < k or np.abs(target[self.split] - self.median) < od_ball.getMaxKey():
                 # search the other child that didn't tried during depth first search
                 type = "right" if target[self.split] <= self.median else "left"
-                if type in self.children.keys():
-                    self.children[type].search(target, k, od_ball)
+                if getattr(self, type) is not None:
+                    getattr(self, type).search(target, k, od_ball)
         return od_ball
 
     def traverse(self):
         """
         :return:  KD Tree in dictionary format
         """
-        if len(self.children) > 0:
+        if self.left is not None or self.right is not None:
             tree = dict()
             sub_tree = dict()
             my_median = str(self.median)
 
-            for child in self.children:
+            for child in [side for side in ("left", "right") if getattr(self, side) is not None]:
                 op = "<" if child == "left" else ">"
-                sub_tree[op + my_median] = self.children[child].traverse()
+                sub_tree[op + my_median] = getattr(self, child).traverse()
 
             tree_tag = "dim=" + str(self.split) + ", data num =" + str(len(self.data))
             tree[tree_tag] = sub_tree
@@ -0,0 +1,38 @@
+import sys
+
+
+def footprint(tree):
+    """
+    measure memory used by the structure of a tree: node objects, their instance dictionaries and the containers
+    held by nodes, e.g. lists or dictionaries of children. Objects shared by many nodes, like the settings of a tree,
+    are counted once. Values referred by nodes, like predictions and numpy arrays of KDTree points, are not counted.
+    :param tree: DecisionTree, CartClassificationTree, CartRegressionTree or KDTree
+    :return: dictionary of "nodes": number of nodes, "bytes": bytes of the structure, "bytes_per_node"
+    """
+    counted = set()
+    total = 0
+    node_num = 0
+    for node in tree.nodes():
+        node_num += 1
+        for obj in [node] + containers_of(node):
+            if id(obj) not in counted:
+                counted.add(id(obj))
+                total += sys.getsizeof(obj)
+    return {"nodes": node_num, "bytes": total, "bytes_per_node": total / max(node_num, 1)}
+
+
+def containers_of(node):
+    """
+    :param node: node of a tree
+    :return: instance dictionary of the node if it has one, and lists, tuples, dictionaries and sets saved in its
+              attributes
+    """
+    values = list()
+    containers = list()
+    if hasattr(node, "__dict__"):
+        containers.append(vars(node))
+        values.extend(vars(node).values())
+    for cls in type(node).__mro__:
+        values.extend(getattr(node, name) for name in getattr(cls, "__slots__", ()) if hasattr(node, name))
+    containers.extend(value for value in values if isinstance(value, (list, tuple, dict, set)))
+    return containers
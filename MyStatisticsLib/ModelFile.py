@@ -0,0 +1,167 @@
+import MyStatisticsLib.FlatTree as ft
+import numpy as np
+import json
+import struct
+
+# A model file is
+#     magic (8 bytes), format version (uint32), header length (uint32), header (JSON, utf-8), arrays
+# The header saves the kind of flat tree, its other values (e.g. eigen names) and the layout of arrays as a list of
+# (name, dtype, shape, offset). Every array starts at a multiple of ALIGNMENT bytes of the file, so a loaded array is
+# an aligned view of the memory-mapped file.
+MAGIC = b"MSLTREE\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct("<8sII")
+
+# saved attributes of each kind of flat tree: (arrays, lists of arrays, other values)
+KINDS = {
+    "FlatDecisionTree": (("split_eigen", "child_offset", "child_table", "categories", "category"),
+                         ("dictionaries",), ("eigen_names",)),
+    "FlatClassificationTree": (("split_eigen", "split_code", "left_child", "right_child", "categories", "category"),
+                               ("dictionaries",), ("eigen_names",)),
+    "FlatRegressionTree": (("split_eigen", "threshold", "left_child", "right_child", "prediction"),
+                           (), ("eigen_names",)),
+    "FlatRegressionEnsemble": (("roots", "split_eigen", "threshold", "left_child", "right_child", "prediction"),
+                               (), ("eigen_names", "bias", "depth")),
+    "FlatKDTree": (("split", "median", "left_child", "right_child", "data_start", "data_end", "points", "orig_data"),
+                   (), ()),
+}
+# integer arrays of these kinds are saved as int32 when their values fit. FlatRegressionEnsemble multiplies
+# split_eigen by the number of samples, which must not overflow, so its arrays are saved as they are.
+INT32_KINDS = ("FlatDecisionTree", "FlatClassificationTree", "FlatRegressionTree", "FlatKDTree")
+
+
+def flatten(model):
+    """
+    :param model: DecisionTree, CartClassificationTree, CartRegressionTree, GradientBoostingTree, KDTree, or a flat
+            tree in FlatTree
+    :return: flat tree of the model
+    """
+    if type(model).__name__ in KINDS:
+        return model
+    if hasattr(model, "compile"):
+        return model.compile()
+    if hasattr(model, "orig_data"):
+        return ft.FlatKDTree(model)
+    raise TypeError("Can't save model of type " + type(model).__name__)
+
+
+def save(model, path, float32=False):
+    """
+    save a model as flat arrays into a binary model file
+    :param model: model accepted by flatten. A DecisionTree is saved without pruning, compile it with alpha and save
+            the flat tree to save a pruned tree.
+    :param path: path of the model file
+    :param float32: True to save thresholds of regression trees as float32. Thresholds are rounded up, so samples
+            whose eigen value <= threshold still go to the left child, but a sample whose eigen value is between a
+            threshold and its rounding goes to the left child too.
+    :return:
+    """
+    flat = flatten(model)
+    kind = type(flat).__name__
+    array_names, list_names, value_names = KINDS[kind]
+    arrays = [(name, getattr(flat, name)) for name in array_names]
+    for name in list_names:
+        arrays.extend((name + "/" + str(i), array) for i, array in enumerate(getattr(flat, name)))
+
+    contents = list()
+    for name, array in arrays:
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError("Array of python objects can't be saved into a model file: " + name)
+        if kind in INT32_KINDS and array.dtype.kind == "i" and \
+                (array.size == 0 or -2 ** 31 <= array.min() and array.max() < 2 ** 31):
+            array = array.astype(np.int32)
+        if float32 and name == "threshold":
+            array = float32_upper(array)
+        contents.append((name, array))
+
+    values = dict((name, json_value(getattr(flat, name))) for name in value_names)
+    lists = dict((name, len(getattr(flat, name))) for name in list_names)
+    # offsets depend on the length of the header, so the header is encoded until its length doesn't change
+    header_size = 0
+    while True:
+        offset = aligned(PREFIX.size + header_size)
+        layout = list()
+        for name, array in contents:
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset = aligned(offset + array.nbytes)
+        header = json.dumps({"kind": kind, "values": values, "lists": lists, "arrays": layout}).encode("utf-8")
+        if len(header) == header_size:
+            break
+        header_size = len(header)
+
+    with open(path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for (name, array), (_, _, _, offset) in zip(contents, layout):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(array.tobytes())
+        # an empty array may start at the end of the file, pad the file to it
+        f.write(b"\0" * (offset - f.tell()))
+
+
+def load(path):
+    """
+    load a model file by memory-mapping it. Arrays of the returned flat tree are read-only views of the file, so
+    loading doesn't read the arrays, and processes which load the same file share its pages.
+    :param path: path of the model file
+    :return: flat tree in FlatTree
+    """
+    with open(path, "rb") as f:
+        magic, version, header_size = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError("Not a model file: " + str(path))
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported model file version: " + str(version))
+        header = json.loads(f.read(header_size).decode("utf-8"))
+
+    kind = header["kind"]
+    if kind not in KINDS:
+        raise ValueError("Unknown kind of model: " + kind)
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = dict((name, np.ndarray(tuple(shape), dtype=dtype, buffer=buffer, offset=offset))
+                  for name, dtype, shape, offset in header["arrays"])
+
+    # flat trees are rebuilt from their attributes, like unpickling
+    flat_class = getattr(ft, kind)
+    flat = flat_class.__new__(flat_class)
+    array_names, list_names, value_names = KINDS[kind]
+    for name in array_names:
+        setattr(flat, name, arrays[name])
+    for name in list_names:
+        setattr(flat, name, [arrays[name + "/" + str(i)] for i in range(header["lists"][name])])
+    for name in value_names:
+        setattr(flat, name, header["values"][name])
+    return flat
+
+
+def aligned(offset):
+    """
+    :param offset: offset in the file
+    :return: the smallest multiple of ALIGNMENT which is not less than offset
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def float32_upper(array):
+    """
+    :param array: numpy array of float64 values
+    :return: float32 array, each value is the smallest float32 value which is not less than the float64 value
+    """
+    upper = array.astype(np.float32)
+    below = upper < array
+    upper[below] = np.nextafter(upper[below], np.float32(np.inf))
+    return upper
+
+
+def json_value(value):
+    """
+    :param value: value saved in the header, e.g. eigen names
+    :return: value with numpy scalars converted to python scalars. Eigen names must be strings or numbers.
+    """
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
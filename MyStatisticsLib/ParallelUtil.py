@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import MyStatisticsLib.PartitionUtil as pu
+
+
+class SharedArrays:
+    """
+    Copy a dictionary of numpy arrays into one shared memory block.
+    Worker processes attach to the block by its descriptor and read the arrays without copying or pickling them.
+    """
+    def __init__(self, arrays):
+        """
+        :param arrays: dictionary of numpy arrays. Arrays of python objects can't be shared.
+        """
+        self.layout = list()
+        offset = 0
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise TypeError("Array of python objects can't be put into shared memory: " + str(key))
+            # align every array to 8 bytes
+            offset = (offset + 7) // 8 * 8
+            self.layout.append((key, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.arrays = view_arrays(self.shm, self.layout)
+        for key, array in arrays.items():
+            self.arrays[key][...] = array
+
+    def descriptor(self):
+        """
+        :return: picklable descriptor, which is passed to worker processes to attach the block
+        """
+        return self.shm.name, self.layout
+
+    def close(self):
+        """
+        release the shared memory block. Arrays returned by this object can't be used after close.
+        """
+        self.arrays = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def view_arrays(shm, layout):
+    """
+    :param shm: shared memory block
+    :param layout: list of (key, dtype, shape, offset) of arrays in the block
+    :return: dictionary of numpy arrays which are views of the block
+    """
+    arrays = dict()
+    for key, dtype, shape, offset in layout:
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+    return arrays
+
+
+def attach(descriptor):
+    """
+    attach a shared memory block created by SharedArrays in another process
+    :param descriptor: returned by SharedArrays.descriptor
+    :return: shared memory block, dictionary of numpy arrays
+    """
+    name, layout = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, view_arrays(shm, layout)
+
+
+def score_eigen_in_worker(func, descriptor, eigen, args, columns=None):
+    """
+    score one eigen in a worker process. Data set and eigens are read from shared memory.
+    :param func: scoring function, func(data_set, eigens, eigen, *args)
+    :param descriptor: descriptor of shared memory block with key "data_set", keys ("eigen", eigen name)
+            and keys ("arg", position) of numpy array arguments
+    :param eigen: eigen name
+    :param args: other arguments of func. Numpy array arguments are None here and read from the block
+    :param columns: None if eigens of the node are in the block. Otherwise (descriptor of the block of full eigen
+            columns shared by SplitExecutor.share_columns, eigen names of the node), and the block of the node has
+            key "index" of the rows of the node
+    :return: return value of func
+    """
+    shm, arrays = attach(descriptor)
+    data_set = arrays.pop("data_set")
+    if columns is None:
+        columns_shm, column_arrays = None, None
+        eigens = {key[1]: value for key, value in arrays.items() if key[0] == "eigen"}
+    else:
+        columns_descriptor, names = columns
+        columns_shm, column_arrays = attach(columns_descriptor)
+        eigens = pu.EigensView(dict((name, column_arrays[("eigen", name)]) for name in names), arrays["index"])
+    args = [arrays[("arg", i)] if ("arg", i) in arrays else arg for i, arg in enumerate(args)]
+    try:
+        result = func(data_set, eigens, eigen, *args)
+        # make sure the result doesn't refer to the shared memory after it's closed
+        return np.copy(result) if isinstance(result, np.ndarray) else result
+    finally:
+        # views of the blocks must be released before they're closed
+        del arrays, data_set, eigens, args, column_arrays
+        shm.close()
+        if columns_shm is not None:
+            columns_shm.close()
+
+
+def buffer_key(array):
+    """
+    :param array: eigen column
+    :return: key which is equal for two arrays only if they are views of the same memory with the same layout,
+              None if it's not a numpy array
+    """
+    if not isinstance(array, np.ndarray):
+        return None
+    return array.__array_interface__["data"][0], array.shape, array.strides, array.dtype.str
+
+
+class SplitExecutor:
+    """
+    Score eigens concurrently with a thread pool or a process pool.
+    Nodes smaller than size_threshold are scored one eigen after another, because the overhead is bigger than gain.
+    Results are always returned in the order of eigens, so the best split is chosen deterministically.
+    With a process pool, eigens given as PartitionUtil.EigensView are not copied for every node: the full eigen
+    columns are copied into shared memory once and kept until shutdown, and each node only passes its row index.
+    The columns must not be modified in place while they are shared.
+    """
+    def __init__(self, processes=False, workers=None, size_threshold=10000):
+        """
+        :param processes: True to use a process pool over shared memory, False to use a thread pool
+        :param workers: number of workers, default is decided by concurrent.futures
+        :param size_threshold: minimum data set size of a node to be scored concurrently
+        """
+        self.processes = processes
+        self.workers = workers
+        self.size_threshold = size_threshold
+        self.pool = None
+        # (dictionary of eigen name and (column, buffer_key of the column), SharedArrays of the columns)
+        self.columns = None
+
+    def map(self, func, data_set, eigens, *args):
+        """
+        call func(data_set, eigens, eigen, *args) for each eigen in eigens
+        :param func: scoring function. It must be a module level function when process pool is used.
+        :param data_set: data set of the node
+        :param eigens: dictionary of eigens of the node. key is eigen name, value is eigen values
+        :param args: other arguments of func
+        :return: list of return values of func, in the order of eigens
+        """
+        # data set may be a 2-D array, its last axis is always the rows
+        if np.shape(data_set)[-1] < self.size_threshold or len(eigens) < 2:
+            return [func(data_set, eigens, eigen, *args) for eigen in eigens]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers) if self.processes else ThreadPoolExecutor(self.workers)
+
+        if not self.processes:
+            futures = [self.pool.submit(func, data_set, eigens, eigen, *args) for eigen in eigens]
+            return [future.result() for future in futures]
+
+        # copy data of the node into shared memory once, all workers read the same block
+        arrays = {"data_set": data_set}
+        columns = None
+        if isinstance(eigens, pu.EigensView):
+            # full columns are shared across nodes, the node only shares its rows
+            columns = self.share_columns(eigens.eigens, list(eigens)), list(eigens)
+            arrays["index"] = eigens.node_index
+        else:
+            for eigen, eigen_values in eigens.items():
+                arrays[("eigen", eigen)] = eigen_values
+        # numpy array arguments like sample weights are as long as data set, share them too instead of pickling
+        args = list(args)
+        for i, arg in enumerate(args):
+            if isinstance(arg, np.ndarray) and not arg.dtype.hasobject:
+                arrays[("arg", i)] = arg
+                args[i] = None
+        with SharedArrays(arrays) as shared:
+            descriptor = shared.descriptor()
+            futures = [self.pool.submit(score_eigen_in_worker, func, descriptor, eigen, args, columns)
+                       for eigen in eigens]
+            return [future.result() for future in futures]
+
+    def share_columns(self, columns, names):
+        """
+        copy full eigen columns into shared memory, unless the columns shared last time are the same arrays
+        :param columns: dictionary of eigen name and values of all data
+        :param names: names of the eigens to share
+        :return: descriptor of the shared memory block, with keys ("eigen", eigen name)
+        """
+        if self.columns is not None:
+            shared_columns, shared = self.columns
+            if all(name in shared_columns and buffer_key(columns[name]) is not None and
+                   buffer_key(columns[name]) == shared_columns[name][1] for name in names):
+                return shared.descriptor()
+            self.columns = None
+            shared.close()
+        shared_columns = dict((name, (columns[name], buffer_key(columns[name]))) for name in names)
+        # the columns are kept alive, so their memory can't be reused by other arrays while they are shared
+        self.columns = shared_columns, SharedArrays(dict((("eigen", name), columns[name]) for name in names))
+        return self.columns[1].descriptor()
+
+    def shutdown(self):
+        """
+        shutdown the pool and release the shared eigen columns
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.columns is not None:
+            self.columns[1].close()
+            self.columns = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+
+def map_eigens(executor, func, data_set, eigens, *args):
+    """
+    call func(data_set, eigens, eigen, *args) for each eigen in eigens
+    :param executor: SplitExecutor. If it's None, eigens are scored one after another
+    :return: list of return values of func, in the order of eigens
+    """
+    if executor is None:
+        return [func(data_set, eigens, eigen, *args) for eigen in eigens]
+    return executor.map(func, data_set, eigens, *args)
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class EigensView:
+    """
+    只读的特征字典视图。它不复制特征数组，只保存原始特征字典和当前节点的数据下标。
+    用特征名取值时，才按下标取出当前节点的特征值，取出的数组用完即可释放。
+    EigensView可以代替特征字典传给choose_best_split等函数。
+    """
+    def __init__(self, eigens, node_index):
+        """
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是全部数据的特征数组
+        :param node_index: 当前节点的数据在全部数据中的下标
+        """
+        self.eigens = eigens
+        self.node_index = node_index
+
+    def __getitem__(self, eigen):
+        return self.eigens[eigen][self.node_index]
+
+    def __iter__(self):
+        return iter(self.eigens)
+
+    def __len__(self):
+        return len(self.eigens)
+
+    def __contains__(self, eigen):
+        return eigen in self.eigens
+
+    def keys(self):
+        return self.eigens.keys()
+
+    def values(self):
+        for eigen in self.eigens:
+            yield self[eigen]
+
+    def items(self):
+        for eigen in self.eigens:
+            yield eigen, self[eigen]
+
+
+def partition(index, start, end, mask):
+    """
+    原地划分下标数组的一段index[start:end]。mask为True的下标移到前面，mask为False的下标移到后面。
+    划分是稳定的，两部分内的下标都保持原来的顺序。
+    :param index: 下标数组（排列），所有节点共用
+    :param start: 当前节点下标段的起点
+    :param end: 当前节点下标段的终点（不包含）
+    :param mask: 布尔数组，长度等于end-start
+    :return: 划分点。左孩子的下标段是index[start:mid]，右孩子的下标段是index[mid:end]
+    """
+    node_index = index[start:end]
+    left = node_index[mask]
+    right = node_index[~mask]
+    mid = start + len(left)
+    index[start:mid] = left
+    index[mid:end] = right
+    return mid
+
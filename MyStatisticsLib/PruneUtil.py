@@ -0,0 +1,79 @@
+import numpy as np
+import heapq
+
+
+def parents_of(nodes, children_of):
+    """
+    :param nodes: all nodes of a tree in pre-order, nodes[0] is the root
+    :param children_of: function that returns children of a node
+    :return: position of parent of each node in nodes, -1 for the root
+    """
+    position = dict((id(node), k) for k, node in enumerate(nodes))
+    parent = np.full(len(nodes), -1)
+    for k, node in enumerate(nodes):
+        for child in children_of(node):
+            parent[position[id(child)]] = k
+    return parent
+
+
+def subtree_statistics(parent, node_loss, is_leaf):
+    """
+    sum up loss and number of leaves of every sub-tree in one post-order sweep
+    :param parent: position of parent of each node, nodes are in pre-order
+    :param node_loss: loss of each node when it's a leaf
+    :param is_leaf: True for leaf nodes
+    :return: loss of leaves of each sub-tree, number of leaves of each sub-tree, number of nodes of each sub-tree.
+              In pre-order, sub-tree of node k is nodes[k:k+size[k]]
+    """
+    leaf_loss = np.where(is_leaf, node_loss, 0.)
+    leaf_num = is_leaf.astype(np.intp)
+    size = np.ones(len(parent), dtype=np.intp)
+    for k in range(len(parent) - 1, 0, -1):
+        leaf_loss[parent[k]] += leaf_loss[k]
+        leaf_num[parent[k]] += leaf_num[k]
+        size[parent[k]] += size[k]
+    return leaf_loss, leaf_num, size
+
+
+def weakest_link_path(parent, node_loss, is_leaf):
+    """
+    weakest link pruning. Repeatedly prune the sub-tree with minimum g(t) = (C(t) - C(Tt)) / (|Tt| - 1) until only
+    the root and its children are left. Sub-tree statistics are updated incrementally, the tree is never copied.
+    :param parent: position of parent of each node, nodes are in pre-order and nodes[0] is the root
+    :param node_loss: loss of each node when it's a leaf, C(t)
+    :param is_leaf: True for leaf nodes
+    :return: list of tuple (alpha, position of the root of pruned sub-tree) in pruning order.
+              alpha is in non-decreasing order. The root is never pruned.
+    """
+    leaf_loss, leaf_num, size = subtree_statistics(parent, node_loss, is_leaf)
+
+    def g(k):
+        # alpha at which loss of node k equals to loss of its sub-tree
+        if leaf_num[k] <= 1:
+            return 0. if leaf_loss[k] >= node_loss[k] else float("inf")
+        return (node_loss[k] - leaf_loss[k]) / (leaf_num[k] - 1)
+
+    # ties are broken by pre-order position
+    heap = [(g(k), k) for k in range(1, len(parent)) if not is_leaf[k]]
+    heapq.heapify(heap)
+    removed = np.zeros(len(parent), dtype=bool)
+    path, alpha = list(), -float("inf")
+    while len(heap) > 0:
+        gk, k = heapq.heappop(heap)
+        # skip pruned nodes and outdated g(t)
+        if removed[k] or gk != g(k):
+            continue
+        # alpha of the pruning sequence never decreases
+        alpha = max(alpha, gk)
+        path.append((alpha, k))
+        removed[k:k + size[k]] = True
+        # update loss and number of leaves of ancestors
+        loss_change, num_change = node_loss[k] - leaf_loss[k], 1 - leaf_num[k]
+        p = parent[k]
+        while p >= 0:
+            leaf_loss[p] += loss_change
+            leaf_num[p] += num_change
+            if p != 0:
+                heapq.heappush(heap, (g(p), p))
+            p = parent[p]
+    return path
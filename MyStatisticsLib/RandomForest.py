@@ -0,0 +1,148 @@
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.ParallelUtil as plu
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+class RandomForest:
+    """
+    随机森林分类器。每棵CART分类树用自助抽样(bootstrap)得到的数据构造，每个结点只给随机抽取的max_eigens个特征打分。
+    自助抽样不复制数据：每个数据被抽中的次数作为它的整数权重，权重为0的数据就是这棵树的袋外(out-of-bag)数据。
+    所有的树在进程池中并行构造，数据集和特征字典只在共享内存中保存一份。
+    结点的停止条件由tree_settings中的参数决定，没有给出的参数使用CartClassificationTree的类属性。
+    """
+    # 树的数量
+    tree_num = 100
+    # 每个结点随机抽取的特征数，None表示特征数的平方根
+    max_eigens = None
+    # 可以在每个实例上单独设置的参数，没有设置的参数使用上面的类属性
+    setting_names = ("tree_num", "max_eigens")
+
+    def __init__(self, random_state=None, tree_settings=None, **settings):
+        """
+        :param random_state: 自助抽样和特征抽样的随机数种子
+        :param tree_settings: 构造每棵树时使用的CartClassificationTree的参数，例如data_set_size_threshold
+        :param settings: setting_names中的参数，只对这个随机森林有效
+        """
+        for name, value in settings.items():
+            if name not in RandomForest.setting_names:
+                raise TypeError("Unknown setting: " + name)
+            setattr(self, name, value)
+        self.random_state = random_state
+        self.tree_settings = dict() if tree_settings is None else dict(tree_settings)
+        self.trees = list()
+        # 训练数据的全部类别(已排序)
+        self.categories = None
+        # 袋外误差，由build计算
+        self.oob_error = None
+
+    def build(self, data_set, eigens, workers=None):
+        """
+        构造随机森林，并用同一次投票计算袋外误差
+        :param data_set: 训练数据集的类别，类型是单轴的numpy.array
+        :param eigens: 特征字典，字典的键值是特征名，字典的值是特征数组,类型是单轴的numpy.array
+        :param workers: 工作进程数
+        :return:
+        """
+        self.categories = np.unique(data_set)
+        max_eigens = self.max_eigens
+        if max_eigens is None:
+            max_eigens = max(1, int(np.sqrt(len(eigens))))
+        settings = cct.CartClassificationTree(**self.tree_settings).worker_settings()
+        settings["max_eigens"] = max_eigens
+        # 每棵树的种子由主进程决定，结果和工作进程的调度顺序无关
+        seeds = np.random.RandomState(self.random_state).randint(0, 2 ** 31 - 1, self.tree_num)
+
+        arrays = {"data_set": data_set}
+        for eigen in eigens:
+            arrays[("eigen", eigen)] = eigens[eigen]
+        with plu.SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(build_tree_in_worker, shared.descriptor(), seed, settings) for seed in seeds]
+                results = [future.result() for future in futures]
+
+        self.trees = list()
+        oob_masks = list()
+        for compact, oob in results:
+            tree = cct.CartClassificationTree(root=True, **self.tree_settings)
+            tree.from_compact(compact)
+            self.trees.append(tree)
+            oob_masks.append(np.unpackbits(oob, count=len(data_set)).astype(bool))
+
+        # 对训练数据的同一次投票里，只统计袋外的树的票，就得到袋外预测
+        oob_votes = self.votes(eigens, np.array(oob_masks))
+        has_oob = oob_votes.sum(axis=1) > 0
+        oob_prediction = self.categories[majority(oob_votes)]
+        self.oob_error = float(np.mean(oob_prediction[has_oob] != data_set[has_oob])) if has_oob.any() else None
+
+    def votes(self, eigens, masks=None, eigen_names=None):
+        """
+        所有的树对多个样本投票。每棵树的决策结果被编码为类别下标，堆叠成(树, 样本)矩阵后一次统计所有树的票数。
+        :param eigens: 特征字典，包含多个样本的每个特征的值；或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param masks: 布尔矩阵，masks[t, i]为False时第t棵树的票不计入第i个样本。None表示统计所有的票
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: (样本, 类别)票数矩阵，列的顺序和categories相同
+        """
+        codes = np.array([np.searchsorted(self.categories, tree.decide_all(eigens, eigen_names))
+                          for tree in self.trees])
+        if masks is None:
+            masks = np.ones(codes.shape, dtype=bool)
+        votes = np.zeros((codes.shape[1], len(self.categories)), dtype=np.int64)
+        for k in range(len(self.categories)):
+            votes[:, k] = np.count_nonzero((codes == k) & masks, axis=0)
+        return votes
+
+    def decide(self, eigen):
+        """
+        根据一个输入样本的特征值进行决策
+        :param eigen: 特征字典，包含一个样本的每个特征的值
+        :return: 票数最多的类别
+        """
+        votes = np.zeros(len(self.categories), dtype=np.int64)
+        for tree in self.trees:
+            votes[np.searchsorted(self.categories, tree.decide(eigen))] += 1
+        return self.categories[majority(votes)]
+
+    def decide_all(self, eigens, eigen_names=None):
+        """
+        对多个样本进行决策
+        :param eigens: 特征字典，包含多个样本的每个特征的值；或者二维numpy.array，每行是一个样本，每列是一个特征
+        :param eigen_names: eigens是二维数组时，每列对应的特征名
+        :return: numpy.array，每个样本票数最多的类别
+        """
+        return self.categories[majority(self.votes(eigens, eigen_names=eigen_names))]
+
+
+def majority(votes):
+    """
+    :param votes: 票数数组，最后一个轴是类别
+    :return: 票数最多的类别下标。票数相同时选择最后一个类别，和CartClassificationTreeUtil.mode一致
+    """
+    class_num = np.shape(votes)[-1]
+    return class_num - 1 - np.argmax(votes[..., ::-1], axis=-1)
+
+
+def build_tree_in_worker(descriptor, seed, settings):
+    """
+    在工作进程中用自助抽样的数据构造一棵树。数据集和特征字典从共享内存中读取。
+    :param descriptor: ParallelUtil.SharedArrays.descriptor返回的共享内存描述
+    :param seed: 这棵树的随机数种子
+    :param settings: 构造树时使用的CartClassificationTree的参数
+    :return: 紧凑格式的树，按位压缩的袋外数据掩码
+    """
+    shm, arrays = plu.attach(descriptor)
+    try:
+        data_set = arrays["data_set"]
+        eigens = dict((key[1], value) for key, value in arrays.items() if isinstance(key, tuple))
+        random = np.random.RandomState(seed)
+        size = len(data_set)
+        # 每个数据被抽中的次数就是它的权重
+        weights = np.bincount(random.randint(0, size, size), minlength=size)
+        index = np.flatnonzero(weights)
+        tree = cct.CartClassificationTree(root=True, **settings)
+        tree.build_on_index(data_set, eigens, index, 0, len(index), weights, random)
+        return tree.to_compact(), np.packbits(weights == 0)
+    finally:
+        # 关闭共享内存前，先释放对它的引用
+        del arrays, data_set, eigens
+        shm.close()
@@ -0,0 +1,58 @@
+import MyStatisticsLib.DecisionTreeUtil as dtu
+import numpy as np
+
+
+def duplicate_groups(code_rows):
+    """
+    find duplicate columns of a 2-D array of codes
+    :param code_rows: 2-D array of non-negative integer codes, row is eigen and column is data
+    :return: index of the first data of each group of duplicates, in the order they first appear
+              group of each data. Data with same codes in every row are in the same group.
+    """
+    size = np.shape(code_rows)[-1]
+    groups = np.zeros(size, dtype=np.int64)
+    group_num = 1
+    for codes in code_rows:
+        # combine codes row by row, and factorize the keys again so that they never overflow
+        keys = groups * (int(codes.max()) + 1 if size > 0 else 1) + codes
+        distinct_keys, groups = np.unique(keys, return_inverse=True)
+        groups = groups.reshape(-1)
+        group_num = len(distinct_keys)
+    if size == 0:
+        return np.zeros(0, dtype=np.intp), groups
+    # renumber groups in the order they first appear, so compressed data keeps the original order of data
+    first_index = np.full(group_num, size, dtype=np.intp)
+    np.minimum.at(first_index, groups, np.arange(size))
+    order = np.argsort(first_index)
+    rank = np.empty(group_num, dtype=np.int64)
+    rank[order] = np.arange(group_num)
+    return first_index[order], rank[groups]
+
+
+def compress_duplicates(data_set, eigens, weights=None):
+    """
+    Compress duplicate data into one weighted data.
+    Data with same category (or target value) and same value of every eigen are duplicates. The weight of the
+    compressed data is the sum of their weights, so a tree built with compressed data and weights is the same as
+    the tree built with the original data.
+    :param data_set: categories (or target values) of data, type is numpy.array
+    :param eigens: dictionary of eigens. key is eigen name, value is eigen values
+    :param weights: weight of each data. None means every weight is 1, then weights of compressed data are
+            numbers of duplicates.
+    :return: compressed data set, compressed eigens, weights of compressed data
+    """
+    code_rows = [dtu.factorize(data_set)[1]] + [dtu.factorize(values)[1] for values in eigens.values()]
+    first_index, groups = duplicate_groups(code_rows)
+    compressed_weights = dtu.count(groups, len(first_index), weights if weights is not None
+                                   else np.ones(len(groups), dtype=np.int64))
+    compressed_eigens = dict((eigen, np.asarray(values)[first_index]) for eigen, values in eigens.items())
+    return np.asarray(data_set)[first_index], compressed_eigens, compressed_weights
+
+
+def total_weight(weights, size):
+    """
+    :param weights: weight of each data, None means every weight is 1
+    :param size: number of data
+    :return: sum of weights
+    """
+    return size if weights is None else weights.sum()
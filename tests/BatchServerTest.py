@@ -0,0 +1,70 @@
+import numpy as np
+import asyncio
+import os
+import tempfile
+import time
+import MyStatisticsLib.BatchServer as bs
+import MyStatisticsLib.CartClassificationTree as cct
+
+random = np.random.RandomState(0)
+size = 5000
+eigens = {"a": random.randint(0, 8, size), "b": random.randint(0, 8, size), "c": random.randint(0, 8, size)}
+data_set = ((eigens["a"] + eigens["b"]) % 3 == 0).astype(int) ^ (eigens["c"] > 5)
+tree = cct.CartClassificationTree(root=True, data_set_size_threshold=5)
+tree.build(data_set, eigens)
+samples = [dict((name, int(values[k])) for name, values in eigens.items()) for k in range(1000)]
+expected = [tree.decide(sample) for sample in samples]
+
+
+async def client(address, samples, unix=False):
+    # 每个客户端用一个保持连接依次发送请求
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    decisions = list()
+    for sample in samples:
+        status, content = await bs.request(reader, writer, "POST", "/decide", sample)
+        decisions.append(content["decision"])
+    writer.close()
+    return decisions
+
+
+async def main():
+    # 进程内调用：并发的单个样本被合并为批量决策，结果和decide相同
+    server = bs.BatchServer(tree, max_batch=64, max_delay=0.002)
+    start = time.perf_counter()
+    decisions = await asyncio.gather(*[server.decide(sample) for sample in samples])
+    print("in process:", decisions == expected, "time (ms):", (time.perf_counter() - start) * 1000)
+    statistics = server.statistics()
+    print(statistics["batches"], statistics["mean_batch_size"])
+
+    # 缺少特征的样本只让它自己的调用失败
+    results = await asyncio.gather(server.decide({"a": 1}), server.decide(samples[0]), return_exceptions=True)
+    print(type(results[0]).__name__, results[1] == expected[0])
+
+    # 本地HTTP前端：多个保持连接的客户端并发请求
+    address = await server.start()
+    start = time.perf_counter()
+    chunks = [samples[k::20] for k in range(20)]
+    results = await asyncio.gather(*[client(address, chunk) for chunk in chunks])
+    print("http:", all(result == [tree.decide(sample) for sample in chunk] for result, chunk in zip(results, chunks)),
+          "time (ms):", (time.perf_counter() - start) * 1000)
+
+    reader, writer = await asyncio.open_connection(*address)
+    print(await bs.request(reader, writer, "POST", "/decide", [1, 2]))
+    print(await bs.request(reader, writer, "GET", "/unknown"))
+    status, statistics = await bs.request(reader, writer, "GET", "/statistics")
+    print(status, sorted(statistics))
+    writer.close()
+
+    # Unix套接字前端
+    if hasattr(asyncio, "start_unix_server"):
+        path = os.path.join(tempfile.mkdtemp(), "tree.sock")
+        await server.start(path=path)
+        print("unix:", await client(path, samples[:100], unix=True) == expected[:100])
+    await server.close()
+    print(server.statistics())
+
+
+asyncio.run(main())
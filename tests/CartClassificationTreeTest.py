@@ -22,6 +22,16 @@ tree.build(data_set, eigens)
 
 tree.draw()
 
+# 所有结点共用一个下标数组，原地划分下标，得到的树和复制数据构造的树相同
+in_place_tree = cct.CartClassificationTree(root=True)
+in_place_tree.build(data_set, eigens, in_place=True)
+print(in_place_tree.traverse() == tree.traverse())
+
+# 按最优优先的顺序构造，树深最多为2
+best_first_tree = cct.CartClassificationTree(root=True)
+print(best_first_tree.build_best_first(data_set, eigens, max_depth=2))
+print(best_first_tree.traverse())
+
 test_data_set = np.array([0,0,1,1])
 test_data_eigens = dict()
 test_data_eigens["age"] = np.array([1,2,3,2])
@@ -30,4 +40,6 @@ test_data_eigens["house"] = np.array([0,0,1,1])
 test_data_eigens["loan"] = np.array([1,2,2,1])
 
 best_tree = tree.post_prune(test_data_set, test_data_eigens)
-best_tree.draw()
\ No newline at end of file
+best_tree.draw()
+# 所有样本一起沿树向下划分，返回每个样本的决策结果
+print(best_tree.decide_all(test_data_eigens))
@@ -0,0 +1,51 @@
+import numpy as np
+import MyStatisticsLib.CartClassificationTreeUtil as cctu
+import MyStatisticsLib.DecisionTreeUtil as dtu
+
+
+def brute_force_cond_gini(data_set, eigen_values):
+    # 逐个特征值复制数据，划分为"等于"和"不等于"两部分，用cond_gini计算条件基尼指数
+    distinct_value = np.unique(eigen_values)
+    return distinct_value, np.array([cctu.cond_gini((data_set[eigen_values == value], data_set[eigen_values != value]))
+                                     for value in distinct_value])
+
+
+random = np.random.RandomState(0)
+data_set = random.randint(0, 3, 200)
+eigens = dict()
+eigens["a"] = random.randint(0, 5, 200)
+eigens["b"] = (data_set + random.randint(0, 2, 200)) % 3
+# 只有两个特征值时，两种划分是同一个划分，基尼指数相同，选择较小的特征值
+eigens["c"] = random.randint(0, 2, 200)
+# 每个特征值的类别分布相同，所有划分的基尼指数相同
+eigens["d"] = np.tile([0, 1, 2, 3], 50)
+tie_data_set = np.tile([0, 0, 0, 0, 1, 1, 1, 1], 25)
+
+for eigen, eigen_values in eigens.items():
+    labels = tie_data_set if eigen == "d" else data_set
+    categories, class_codes = dtu.factorize(labels)
+    distinct_value, value_codes = dtu.factorize(eigen_values)
+    table = dtu.contingency_table(class_codes, len(categories), value_codes, len(distinct_value))
+    brute_values, brute_gini = brute_force_cond_gini(labels, eigen_values)
+    # 用列联表一次算出的条件基尼指数和逐个划分算出的相同，最优划分是基尼指数最小的第一个特征值
+    name, best_value, min_cond_gini = cctu.best_split_of_eigen(labels, eigens, eigen)
+    print(eigen, np.allclose(cctu.cond_gini_of_table(table), brute_gini),
+          best_value == brute_values[np.argmin(brute_gini)], np.isclose(min_cond_gini, brute_gini.min()))
+
+
+def old_cond_gini(splits):
+    # 修正前的cond_gini除以最后一个划分的大小，而不是数据总数
+    cond_gini_index = 0
+    total = 0
+    for s in splits:
+        cond_gini_index += len(s) * cctu.gini(s)
+        total = len(s)
+    return cond_gini_index / float(total)
+
+
+# 修正前选择特征值1，修正后选择条件基尼指数真正最小的特征值0
+data_set = np.array([0, 1, 1, 0, 1, 1, 1, 1, 1, 1])
+eigens = {"x": np.array([1, 2, 0, 2, 0, 0, 0, 2, 1, 2])}
+distinct_value, brute_gini = brute_force_cond_gini(data_set, eigens["x"])
+old_gini = [old_cond_gini((data_set[eigens["x"] == value], data_set[eigens["x"] != value])) for value in distinct_value]
+print(distinct_value[np.argmin(old_gini)], cctu.best_split_of_eigen(data_set, eigens, "x")[1], np.round(brute_gini, 3))
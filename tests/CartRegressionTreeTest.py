@@ -12,4 +12,71 @@ cdt.CartRegressionTree.deviation_sum_threshold = 0.1
 tree = cdt.CartRegressionTree(root=True)
 tree.build(data_set, eigens)
 
-tree.draw()
\ No newline at end of file
+tree.draw()
+
+# 所有结点共用一个下标数组，原地划分下标，得到的树和复制数据构造的树相同
+in_place_tree = cdt.CartRegressionTree(root=True)
+in_place_tree.build(data_set, eigens, in_place=True)
+print(in_place_tree.traverse() == tree.traverse())
+
+# 每个特征被量化为最多4个分位数区间，用直方图选择分片特征值
+cdt.CartRegressionTree.max_bins = 4
+binned_tree = cdt.CartRegressionTree(root=True)
+binned_tree.build(data_set, eigens)
+print(binned_tree.traverse())
+cdt.CartRegressionTree.max_bins = None
+
+# 每个特征只在根结点排序一次，得到的树和不排序时相同
+cdt.CartRegressionTree.presort = True
+presorted_tree = cdt.CartRegressionTree(root=True)
+presorted_tree.build(data_set, eigens)
+print(presorted_tree.traverse() == tree.traverse())
+cdt.CartRegressionTree.presort = False
+
+# 多个特征的差方和相同时，预排序和不排序都选择第一个特征
+same = 0
+for seed in range(30):
+    random = np.random.RandomState(seed)
+    seed_eigens = dict(("e" + str(k), random.randint(0, 12, 40)) for k in range(3))
+    seed_data_set = random.uniform(0, 0.1, 40)
+    default_tree = cdt.CartRegressionTree(root=True, data_set_size_threshold=3, deviation_sum_threshold=0.)
+    default_tree.build(seed_data_set, seed_eigens)
+    seed_presorted_tree = cdt.CartRegressionTree(root=True, data_set_size_threshold=3, deviation_sum_threshold=0.,
+                                                 presort=True)
+    seed_presorted_tree.build(seed_data_set, seed_eigens)
+    same += seed_presorted_tree.traverse() == default_tree.traverse()
+print("presorted trees equal to default trees:", same, "of 30")
+
+# 按最优优先的顺序构造，最多3个叶结点
+best_first_tree = cdt.CartRegressionTree(root=True)
+print(best_first_tree.build_best_first(data_set, eigens, max_leaves=3))
+print(best_first_tree.traverse())
+
+# 单个样本预测和批量预测
+print(tree.decide({"x": 6}))
+print(tree.decide_all({"x": np.array([1, 6, 9.5, 11])}))
+
+# 编译结果保存在根结点上，多次批量预测只编译一次；截断后重新编译
+random = np.random.RandomState(0)
+large_eigens = {"x": random.uniform(0, 1, 2000)}
+large_tree = cdt.CartRegressionTree(root=True, data_set_size_threshold=2, deviation_sum_threshold=0., presort=True)
+large_tree.build(np.sin(10 * large_eigens["x"]) + random.normal(0, 0.1, 2000), large_eigens)
+samples = {"x": random.uniform(0, 1, 10)}
+predictions = large_tree.decide_all(samples)
+flat_tree = large_tree.flat_tree
+print("cached:", flat_tree is not None, np.array_equal(large_tree.decide_all(samples), predictions),
+      large_tree.flat_tree is flat_tree, np.array_equal(large_tree.compile().decide_all(samples), predictions))
+large_tree.truncate(data_set_size_threshold=500)
+cleared = large_tree.flat_tree is None
+truncated_predictions = large_tree.decide_all(samples)
+print(cleared, large_tree.flat_tree is not flat_tree,
+      np.array_equal(truncated_predictions, large_tree.compile().decide_all(samples)),
+      np.allclose(truncated_predictions, [large_tree.decide({"x": x}) for x in samples["x"]]))
+
+if __name__ == "__main__":
+    # 用弱连接剪枝计算剪枝序列，再用交叉验证选择alpha
+    for alpha, subtree in tree.pruning_path():
+        print(alpha, subtree.split_eigen, subtree.split_value)
+    tree.post_prune(data_set, eigens, folds=3, workers=2, random_state=0)
+    print(tree.cv_alpha, tree.traverse())
+    print(np.allclose(tree.decide_all(eigens), [tree.decide({"x": x}) for x in eigens["x"]]))
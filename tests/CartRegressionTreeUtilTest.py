@@ -1,4 +1,5 @@
 import numpy as np
+import time
 import MyStatisticsLib.CartRegressionTreeUtil as cdtu
 
 data_set = np.array([4.5, 4.75, 4.91, 5.34, 5.8, 7.05, 7.9, 8.23, 8.7, 9.0])
@@ -11,4 +12,18 @@ split_eigen, split_value, min_sqr_sum = cdtu.choose_best_split(data_set, eigens)
 splits = cdtu.split_all(data_set, eigens, split_eigen, split_value)
 
 for split in splits:
-    print(split)
\ No newline at end of file
+    print(split)
+# 量化为4个分位数区间，从直方图选择分片区间
+edges, codes = cdtu.quantize(eigens["x"], 4)
+print(edges, codes)
+hist = cdtu.histogram(data_set, codes, len(edges))
+best_bin, min_dev_sum = cdtu.best_split_of_histogram(hist)
+print(edges[best_bin], min_dev_sum)
+# 按特征值排序后扫描一次，结果和best_split_of_eigen相同
+orders = np.argsort(eigens["x"], kind="stable")[np.newaxis]
+print(cdtu.best_split_of_presorted(data_set, eigens, "x", orders, {"x": 0}), cdtu.best_split_of_eigen(data_set, eigens, "x"))
+# 所有划分的偏差和都相同时选择最小的特征值，不用重新扫描数据
+tied_eigens = {"x": np.random.RandomState(0).randint(0, 5000, 20000)}
+orders = np.argsort(tied_eigens["x"], kind="stable")[np.newaxis]
+start = time.perf_counter()
+print(cdtu.best_split_of_presorted(np.ones(20000), tied_eigens, "x", orders, {"x": 0}), time.perf_counter() - start < 1)
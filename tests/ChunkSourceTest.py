@@ -0,0 +1,69 @@
+import MyStatisticsLib.ChunkSource as cs
+import MyStatisticsLib.DecisionTree as dt
+import numpy as np
+import tempfile
+import tracemalloc
+import os
+
+# category of data set, 0 = no, 1 = yes
+data_set = np.array([0,0,1,1,0,0,0,1,1,1,1,1,1,1,0])
+
+eigens = dict()
+# for age, 1 = young, 2 = middle aged, 3 = old
+eigens["age"] = np.array([1,1,1,1,1,2,2,2,2,2,3,3,3,3,3])
+# for employment, 0 = no, 1 = yes
+eigens["employment"] = np.array([0,0,1,1,0,0,0,1,0,0,0,0,1,1,0])
+# for house, 0 = no, 1 = yes
+eigens["house"] = np.array([0,0,0,1,0,0,0,1,1,1,1,1,0,0,0])
+# for loan, 1 = normal, 2 = good, 3 = very good
+eigens["loan"] = np.array([1,2,2,1,1,1,2,2,3,3,3,2,2,3,1])
+
+tree = dt.DecisionTree(root=True)
+tree.build(data_set, eigens)
+print(tree.traverse())
+
+# chunks of 4 rows read from an iterator
+def read_chunks():
+    for start in range(0, len(data_set), 4):
+        yield data_set[start:start+4], dict((name, values[start:start+4]) for name, values in eigens.items())
+chunk_tree = dt.DecisionTree(root=True)
+chunk_tree.build_from_chunks(cs.IteratorChunks(read_chunks))
+print(chunk_tree.traverse() == tree.traverse())
+
+temp_dir = tempfile.mkdtemp()
+# chunks read from a memory-mapped .npy file
+npy_path = os.path.join(temp_dir, "loan.npy")
+np.save(npy_path, np.column_stack([data_set] + list(eigens.values())))
+npy_tree = dt.DecisionTree(root=True)
+npy_tree.build_from_chunks(cs.NpyChunks(npy_path, 0, list(eigens.keys()), chunk_size=4))
+print(npy_tree.traverse() == tree.traverse())
+
+# chunks read from a CSV file, values are strings
+csv_path = os.path.join(temp_dir, "loan.csv")
+with open(csv_path, "w") as f:
+    f.write(",".join(["category"] + list(eigens.keys())) + "\n")
+    for i in range(len(data_set)):
+        f.write(",".join(str(v) for v in [data_set[i]] + [values[i] for values in eigens.values()]) + "\n")
+csv_tree = dt.DecisionTree(root=True)
+csv_tree.build_from_chunks(cs.CsvChunks(csv_path, "category", chunk_size=4))
+print(csv_tree.traverse())
+
+# chunks with an eigen of 5000 ids. Contingency tables only count (node, value, category) triples which occur, so
+# memory is bounded by the rows of a level, not by frontier nodes * 5000 values * 3 categories
+def read_id_chunks():
+    for seed in range(10):
+        random = np.random.RandomState(seed)
+        chunk_eigens = {"id": random.randint(0, 5000, 2000), "a": random.randint(0, 4, 2000),
+                        "b": random.randint(0, 6, 2000)}
+        yield (chunk_eigens["a"] + chunk_eigens["b"] + random.randint(0, 2, 2000)) % 3, chunk_eigens
+tracemalloc.start()
+id_tree = dt.DecisionTree(root=True)
+id_tree.build_from_chunks(cs.IteratorChunks(read_id_chunks))
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+frontier, widest = [id_tree], 0
+while len(frontier) > 0:
+    widest = max(widest, len(frontier))
+    frontier = [child for node in frontier for value, child in node.child_items()]
+dense = widest * 5000 * 3 * 8
+print("widest level:", widest, "peak (MB):", peak >> 20, "dense tables (MB):", dense >> 20, peak < dense / 100)
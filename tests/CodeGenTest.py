@@ -0,0 +1,49 @@
+import numpy as np
+import tempfile
+import timeit
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.DecisionTree as dt
+import MyStatisticsLib.CodeGen as cg
+
+random = np.random.RandomState(0)
+size = 4000
+eigens = {"a": random.randint(0, 6, size), "b": random.randint(0, 6, size), "c": random.choice(["x", "y", "z"], size)}
+data_set = (eigens["a"] + eigens["b"]) % 3
+data_set = np.where(random.uniform(0, 1, size) < 0.1, (data_set + 1) % 3, data_set)
+samples = [dict((name, values[i]) for name, values in eigens.items()) for i in range(size)]
+x = random.uniform(0, 1, size)
+target = np.sin(6 * x) + random.normal(0, 0.1, size)
+regression_samples = [{"x": value} for value in x]
+
+classification_tree = cct.CartClassificationTree(root=True, data_set_size_threshold=2, cond_gini_threshold=0.0)
+classification_tree.build(data_set, eigens)
+decision_tree = dt.DecisionTree(root=True, info_gain_ratio_threshold=0.0)
+decision_tree.build(data_set, eigens)
+regression_tree = crt.CartRegressionTree(root=True, data_set_size_threshold=2)
+regression_tree.build(target, {"x": x})
+
+print(cg.to_source(decision_tree)[:300])
+
+# 生成的函数和decide的结果相同。比较逐个样本预测的时间
+with tempfile.TemporaryDirectory() as cache_dir:
+    for tree, tree_samples in ((classification_tree, samples), (decision_tree, samples),
+                               (regression_tree, regression_samples)):
+        decide = cg.compile_tree(tree, cache_dir)
+        same = all(decide(sample) == tree.decide(sample) for sample in tree_samples)
+        # 取多次计时中最短的一次，减少机器负载的影响
+        tree_time = min(timeit.repeat(lambda: [tree.decide(sample) for sample in tree_samples], number=1, repeat=7))
+        generated_time = min(timeit.repeat(lambda: [decide(sample) for sample in tree_samples], number=1, repeat=7))
+        print(type(tree).__name__, len(list(tree.nodes())), same,
+              "decide %.1f us, generated %.2f us, %.1fx" % (tree_time / size * 1e6, generated_time / size * 1e6,
+                                                             tree_time / generated_time))
+
+# 各个孩子使用不同特征、叶结点深度不同的DecisionTree，结点用孩子的位置选择分支
+mixed_data_set = np.where(eigens["a"] == 5, 2, np.where(eigens["a"] < 3, eigens["b"] % 2, (eigens["c"] == "x") * 1))
+mixed_tree = dt.DecisionTree(root=True, info_gain_ratio_threshold=0.0)
+mixed_tree.build(mixed_data_set, eigens)
+source = cg.to_source(mixed_tree)
+decide = cg.load_source(source)
+# 没有孩子的特征值没有决策
+print("child = " in source, all(decide(sample) == mixed_tree.decide(sample) for sample in samples),
+      decide({"a": 9, "b": 0, "c": "x"}))
@@ -0,0 +1,23 @@
+import MyStatisticsLib.CodedDataSet as cds
+import MyStatisticsLib.DecisionTree as dt
+import numpy as np
+
+# category of data set
+data_set = np.array(["no","no","yes","yes","no","no","no","yes","yes","yes","yes","yes","yes","yes","no"])
+
+eigens = dict()
+eigens["age"] = np.array(["young"]*5 + ["middle"]*5 + ["old"]*5)
+eigens["employment"] = np.array(["no","no","yes","yes","no","no","no","yes","no","no","no","no","yes","yes","no"])
+eigens["house"] = np.array(["no","no","no","yes","no","no","no","yes","yes","yes","yes","yes","no","no","no"])
+eigens["loan"] = np.array(["normal","good","good","normal","normal","normal","good","good","very good","very good",
+                           "very good","good","good","very good","normal"])
+
+coded_data_set = cds.CodedDataSet(data_set, eigens)
+print(coded_data_set.names)
+print(coded_data_set.dictionaries)
+print(coded_data_set.codes, coded_data_set.codes.dtype)
+
+# string valued eigens are trained with their integer codes
+tree = dt.DecisionTree(root=True)
+tree.build(None, coded_data_set)
+print(tree.traverse())
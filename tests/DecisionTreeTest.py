@@ -1,5 +1,6 @@
 import MyStatisticsLib.DecisionTree as dt
 import numpy as np
+import time
 
 # category of data set, 0 = no, 1 = yes
 data_set = np.array([0,0,1,1,0,0,0,1,1,1,1,1,1,1,0])
@@ -30,4 +31,30 @@ tree.post_prune()
 decision = tree.decide(data_eigens)
 print(decision)
 
+# make decisions for all samples with the compiled tree
+decisions = tree.decide_all(eigens)
+print(decisions)
+
 tree_in_dict = tree.draw()
+
+# alpha at which each sub-tree would be pruned. Decisions of any alpha can be made without pruning the tree again
+full_tree = dt.DecisionTree(root=True)
+full_tree.build(data_set, eigens)
+for alpha, sub_tree in full_tree.pruning_path():
+    print(alpha, sub_tree.traverse())
+    print(full_tree.decide_all(eigens, alpha))
+
+# grow the tree best first with at most 2 leaves
+best_first_tree = dt.DecisionTree(root=True)
+print(best_first_tree.build_best_first(data_set, eigens, max_leaves=2))
+print(best_first_tree.traverse())
+
+# a node with 2000 children finds the child of a value by one dictionary lookup, so decide doesn't slow down with
+# the number of children
+wide_eigens = {"id": np.arange(4000) % 2000}
+wide_tree = dt.DecisionTree(root=True, info_gain_ratio_threshold=0.0)
+wide_tree.build(wide_eigens["id"] % 3, wide_eigens)
+start = time.perf_counter()
+wide_decisions = [wide_tree.decide({"id": value}) for value in range(2000)]
+print(len(wide_tree.children), wide_decisions == list(np.arange(2000) % 3),
+      "decide time (us):", (time.perf_counter() - start) / 2000 * 1e6)
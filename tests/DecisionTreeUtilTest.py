@@ -32,4 +32,23 @@ print(mode)
 
 splits = dtu.split_all(data_set, eigens, eigens["loan"])
 for split in splits:
-    print(split)
\ No newline at end of file
+    print(split)
+
+# contingency table of each eigen, row is eigen value and column is category
+for eigen, table in dtu.tables_of_eigens(data_set, eigens):
+    print(eigen, table.tolist(), dtu.info_gain_ratio_of_table(table))
+
+# sparse tables of 2 frontier nodes only count (node, value, category) triples which occur.
+# Info gain ratios of all nodes are the same as those of contingency tables of each node
+nodes = (eigens["age"] == 1).astype(int)
+categories, class_codes = dtu.factorize(data_set)
+distinct_values, value_codes = dtu.factorize(eigens["loan"])
+tables = dtu.frontier_tables(nodes, 2, class_codes, len(categories), value_codes, len(distinct_values))
+print(tables[0].tolist(), tables[1].tolist())
+entropy = dtu.entropy_of_counts(np.array([np.bincount(class_codes[nodes == k], minlength=2) for k in range(2)]))
+node_tables = [dtu.tables_of_eigens(data_set[nodes == k], {"loan": eigens["loan"][nodes == k]})[0][1] for k in range(2)]
+print(dtu.frontier_info_gain_ratios(tables, 2, len(distinct_values), len(categories), entropy),
+      [dtu.info_gain_ratio_of_table(table) for table in node_tables])
+
+# counts beyond the cache are calculated directly, the cache doesn't grow
+print(dtu.n_log2_n(np.array([3, 1 << 20])), len(dtu.n_log2_n_cache))
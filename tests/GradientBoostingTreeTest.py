@@ -0,0 +1,28 @@
+import numpy as np
+import MyStatisticsLib.GradientBoostingTree as gbt
+
+random = np.random.RandomState(0)
+x = random.uniform(0, 10, 1000)
+y = random.uniform(0, 10, 1000)
+data_set = np.sin(x) + 0.1 * y + random.normal(0, 0.1, 1000)
+eigens = {"x": x[:800], "y": y[:800]}
+valid_eigens = {"x": x[800:], "y": y[800:]}
+
+gbt.GradientBoostingTree.max_rounds = 200
+gbt.GradientBoostingTree.subsample = 0.8
+boosting = gbt.GradientBoostingTree(random_state=0)
+boosting.build(data_set[:800], eigens, data_set[800:], valid_eigens)
+print(len(boosting.trees), boosting.train_errors[-1], min(boosting.valid_errors))
+
+# 融合后的批量预测和逐个样本预测相同
+predictions = boosting.decide_all(valid_eigens)
+print(np.allclose(predictions[:5], [boosting.decide({"x": x[i], "y": y[i]}) for i in range(800, 805)]))
+print(predictions[:5])
+
+# 残差每一轮都在变小，每棵树的停止条件相对于初始差方和，所以后面的树仍然分片，训练误差每一轮都下降
+small_data_set = 0.01 * data_set
+small_boosting = gbt.GradientBoostingTree(random_state=0, max_rounds=100, subsample=1.0)
+small_boosting.build(small_data_set, {"x": x, "y": y})
+leaves = [sum(1 for node in tree.nodes() if node.left is None) for tree in small_boosting.trees]
+print(np.all(np.diff(small_boosting.train_errors) < 0), small_boosting.train_errors[0], small_boosting.train_errors[-1],
+      min(leaves))
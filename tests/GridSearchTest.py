@@ -0,0 +1,22 @@
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.GridSearch as gs
+import numpy as np
+
+if __name__ == "__main__":
+    random = np.random.RandomState(0)
+    eigens = dict(("f%d" % i, random.randint(0, 4, 600)) for i in range(4))
+    data_set = (eigens["f0"] + eigens["f2"] * (eigens["f3"] > 1) + (random.rand(600) < 0.2)) % 3
+    train_eigens = dict((eigen, values[:400]) for eigen, values in eigens.items())
+    test_eigens = dict((eigen, values[400:]) for eigen, values in eigens.items())
+
+    # the most permissive tree is built once, every other combination is a truncation of it
+    grid = {"data_set_size_threshold": [1, 5, 20], "cond_gini_threshold": [0, 0.1, 0.3]}
+    search = gs.GridSearch(cct.CartClassificationTree, grid, workers=2)
+    print(search.search(data_set[:400], train_eigens, data_set[400:], test_eigens))
+    for settings, loss, leaf_num in search.results:
+        print(settings, loss, leaf_num)
+
+    # the truncated tree is the same as the tree built with the best settings
+    tree = cct.CartClassificationTree(root=True, **search.best_settings)
+    tree.build(data_set[:400], train_eigens)
+    print(search.best_tree().traverse() == tree.traverse())
@@ -0,0 +1,90 @@
+import numpy as np
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.DecisionTree as dt
+import MyStatisticsLib.KDTree as kdt
+import MyStatisticsLib.MemoryUtil as mu
+
+random = np.random.RandomState(0)
+size = 20000
+eigens = {"a": random.randint(0, 8, size), "b": random.randint(0, 8, size), "c": random.randint(0, 8, size)}
+data_set = (eigens["a"] + eigens["b"] * (eigens["c"] > 3)) % 3
+
+
+class DictNode:
+    """
+    node in the layout used before nodes had __slots__: attributes in an instance dictionary, children in a list
+    (CART trees) or a dictionary (DecisionTree and KDTree), and a parent of KDTree nodes
+    """
+    def nodes(self):
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values() if isinstance(node.children, dict) else node.children)
+
+
+# attributes which replaced the containers of children
+links = ("left", "right", "first_child", "next_sibling", "value", "child_of_value", "instance_settings")
+
+
+def dict_tree(tree):
+    """
+    copy a tree into DictNode, to measure the same tree in the layout before __slots__
+    """
+    # instance dictionaries share their keys within a class, so every kind of tree gets its own class
+    node_class = type("Dict" + type(tree).__name__, (DictNode,), dict())
+    copy = node_class()
+    stack = [(tree, copy, None)]
+    while len(stack) > 0:
+        node, node_copy, parent = stack.pop()
+        # like __init__ of the old nodes, every node sets all attributes in the same order
+        for name in type(node).__slots__:
+            if name not in links:
+                setattr(node_copy, name, getattr(node, name, None))
+        if isinstance(node, dt.DecisionTree):
+            children = list(node.child_items())
+            node_copy.children = dict()
+        elif isinstance(node, kdt.KDTree):
+            children = [(side, child) for side, child in (("left", node.left), ("right", node.right))
+                        if child is not None]
+            node_copy.children, node_copy.parent = dict(), parent
+        else:
+            children = list(enumerate(node.children))
+            node_copy.children = list()
+        for key, child in children:
+            child_copy = node_class()
+            if isinstance(node_copy.children, dict):
+                node_copy.children[key] = child_copy
+            else:
+                node_copy.children.append(child_copy)
+            stack.append((child, child_copy, node_copy))
+    return copy
+
+
+def compare(name, tree):
+    # bytes per node of the structure of the tree, and of the same tree in the layout before __slots__
+    after, before = mu.footprint(tree), mu.footprint(dict_tree(tree))
+    print(name, after, "before:", round(before["bytes_per_node"], 1),
+          "ratio:", round(after["bytes"] / before["bytes"], 2), after["nodes"] == before["nodes"])
+
+
+classification_tree = cct.CartClassificationTree(root=True, data_set_size_threshold=2, cond_gini_threshold=0.0)
+classification_tree.build(data_set, eigens, in_place=True)
+compare("CartClassificationTree", classification_tree)
+
+regression_tree = crt.CartRegressionTree(root=True, data_set_size_threshold=2)
+regression_tree.build(random.uniform(0, 1, 5000), {"x": random.uniform(0, 1, 5000)}, in_place=True)
+compare("CartRegressionTree", regression_tree)
+
+decision_tree = dt.DecisionTree(root=True, info_gain_ratio_threshold=0.0)
+decision_tree.build(data_set, eigens)
+compare("DecisionTree", decision_tree)
+
+kd_tree = kdt.KDTree()
+kd_tree.build(random.uniform(0, 1, (size, 3)))
+compare("KDTree", kd_tree)
+
+# nodes have no instance dictionary
+print(not hasattr(classification_tree, "__dict__"), not hasattr(decision_tree, "__dict__"),
+      not hasattr(kd_tree, "__dict__"))
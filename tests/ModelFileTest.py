@@ -0,0 +1,58 @@
+import numpy as np
+import os
+import tempfile
+import time
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.CartRegressionTree as crt
+import MyStatisticsLib.DecisionTree as dt
+import MyStatisticsLib.KDTree as kdt
+import MyStatisticsLib.ModelFile as mf
+
+random = np.random.RandomState(0)
+size = 2000
+eigens = {"a": random.randint(0, 5, size), "b": random.uniform(0, 10, size)}
+data_set = (eigens["a"] > 2).astype(int) ^ (eigens["b"] > 5)
+target = np.sin(eigens["b"]) + eigens["a"] + random.normal(0, 0.1, size)
+with tempfile.TemporaryDirectory() as directory:
+
+    # 保存后用内存映射加载，预测结果和原来的树相同
+    classification_tree = cct.CartClassificationTree(root=True, data_set_size_threshold=5)
+    classification_tree.build(data_set, {"a": eigens["a"]})
+    path = os.path.join(directory, "classification.msl")
+    mf.save(classification_tree, path)
+    loaded = mf.load(path)
+    print(np.array_equal(loaded.decide_all({"a": eigens["a"]}), classification_tree.decide_all({"a": eigens["a"]})))
+
+    decision_tree = dt.DecisionTree(root=True)
+    decision_tree.build(data_set, {"a": eigens["a"]})
+    path = os.path.join(directory, "decision.msl")
+    mf.save(decision_tree, path)
+    print(np.array_equal(mf.load(path).decide_all({"a": eigens["a"]}), decision_tree.decide_all({"a": eigens["a"]})))
+
+    # float32的分片值向上取整，训练数据的预测结果不变
+    regression_tree = crt.CartRegressionTree(root=True, data_set_size_threshold=5)
+    regression_tree.build(target, eigens)
+    for float32 in (False, True):
+        path = os.path.join(directory, "regression.msl")
+        mf.save(regression_tree, path, float32=float32)
+        loaded = mf.load(path)
+        print(os.path.getsize(path), loaded.threshold.dtype,
+              np.array_equal(loaded.decide_all(eigens), regression_tree.decide_all(eigens)))
+
+    points = random.randint(0, 20, (300, 3)).astype(float)
+    kd_tree = kdt.KDTree()
+    kd_tree.build(points)
+    path = os.path.join(directory, "kd.msl")
+    mf.save(kd_tree, path)
+    loaded = mf.load(path)
+    point = np.array([3., 1., 4.])
+    print(kd_tree.searchNearest(point)[0] == loaded.searchNearest(point)[0],
+          list(kd_tree.search(point, k=5).keys()) == list(loaded.search(point, k=5).keys()))
+
+    # 加载时只读取文件头，数组在第一次访问时才读入内存
+    start = time.perf_counter()
+    for k in range(100):
+        mf.load(path)
+    print("load time (ms):", (time.perf_counter() - start) * 10)
+    # 删除临时目录之前释放内存映射的文件
+    del loaded
@@ -0,0 +1,47 @@
+import MyStatisticsLib.ParallelUtil as plu
+import MyStatisticsLib.CartRegressionTreeUtil as crtu
+import MyStatisticsLib.CartRegressionTree as crt
+import numpy as np
+
+if __name__ == "__main__":
+    rand = np.random.RandomState(0)
+    eigens = dict()
+    for i in range(8):
+        eigens["x" + str(i)] = rand.randint(0, 50, 2000)
+    data_set = eigens["x0"] * 0.5 + np.sin(eigens["x3"]) + rand.rand(2000)
+
+    serial = crtu.choose_best_split(data_set, eigens)
+    # score eigens in a thread pool, and in a process pool over shared memory
+    for processes in (False, True):
+        with plu.SplitExecutor(processes=processes, workers=4, size_threshold=100) as executor:
+            print(crtu.choose_best_split(data_set, eigens, executor) == serial)
+
+    # trees built with executor are the same as trees built without it
+    crt.CartRegressionTree.data_set_size_threshold = 50
+    tree = crt.CartRegressionTree(root=True)
+    tree.build(data_set, eigens)
+    with plu.SplitExecutor(processes=True, size_threshold=500) as executor:
+        crt.CartRegressionTree.split_executor = executor
+        parallel_tree = crt.CartRegressionTree(root=True)
+        parallel_tree.build(data_set, eigens, in_place=True)
+        crt.CartRegressionTree.split_executor = None
+        print(parallel_tree.traverse() == tree.traverse())
+        # eigen columns are copied into shared memory once for the whole tree, each node only shares its rows
+        shared_columns, shared = executor.columns
+        name = shared.shm.name
+        print(sorted(shared_columns) == sorted(eigens), shared.shm.size >= sum(v.nbytes for v in eigens.values()))
+        # another tree on the same columns reuses the block, a tree on other columns shares its own columns
+        crt.CartRegressionTree(root=True, split_executor=executor).build(data_set, eigens, in_place=True)
+        print(executor.columns[1].shm.name == name)
+        other_eigens = dict((eigen, values[::-1].copy()) for eigen, values in eigens.items())
+        other_tree = crt.CartRegressionTree(root=True, split_executor=executor)
+        other_tree.build(data_set[::-1].copy(), other_eigens, in_place=True)
+        serial_other_tree = crt.CartRegressionTree(root=True)
+        serial_other_tree.build(data_set[::-1].copy(), other_eigens, in_place=True)
+        print(executor.columns[1].shm.name != name, other_tree.traverse() == serial_other_tree.traverse())
+    print(executor.columns is None)
+
+    # child subtrees not bigger than size_threshold are built by worker processes and grafted into the tree
+    subtree_tree = crt.CartRegressionTree(root=True)
+    subtree_tree.build_parallel(data_set, eigens, workers=4, size_threshold=300)
+    print(subtree_tree.to_compact() == tree.to_compact())
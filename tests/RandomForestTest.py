@@ -0,0 +1,21 @@
+import MyStatisticsLib.CartClassificationTree as cct
+import MyStatisticsLib.RandomForest as rf
+import numpy as np
+
+if __name__ == "__main__":
+    random = np.random.RandomState(0)
+    eigens = dict(("f%d" % i, random.randint(0, 4, 600)) for i in range(6))
+    data_set = (eigens["f0"] + eigens["f2"] * (eigens["f3"] > 1)) % 3
+    train_eigens = dict((eigen, values[:500]) for eigen, values in eigens.items())
+    test_eigens = dict((eigen, values[500:]) for eigen, values in eigens.items())
+
+    cct.CartClassificationTree.data_set_size_threshold = 2
+    cct.CartClassificationTree.cond_gini_threshold = 0.001
+    rf.RandomForest.tree_num = 20
+    # 所有的树在两个工作进程中并行构造，每个结点随机抽取2个特征
+    forest = rf.RandomForest(random_state=0)
+    forest.build(data_set[:500], train_eigens, workers=2)
+    print(forest.oob_error)
+    predictions = forest.decide_all(test_eigens)
+    print(np.mean(predictions != data_set[500:]))
+    print(forest.decide(dict((eigen, values[0]) for eigen, values in test_eigens.items())) == predictions[0])
@@ -0,0 +1,31 @@
+import MyStatisticsLib.WeightUtil as wu
+import MyStatisticsLib.DecisionTree as dt
+import MyStatisticsLib.CartClassificationTree as cct
+import numpy as np
+
+# category of data set, every data appears twice
+data_set = np.array(["no","no","yes","yes","no","no","no","yes","yes","yes","yes","yes","yes","yes","no"] * 2)
+
+eigens = dict()
+eigens["age"] = np.array((["young"]*5 + ["middle"]*5 + ["old"]*5) * 2)
+eigens["employment"] = np.array(["no","no","yes","yes","no","no","no","yes","no","no","no","no","yes","yes","no"] * 2)
+eigens["house"] = np.array(["no","no","no","yes","no","no","no","yes","yes","yes","yes","yes","no","no","no"] * 2)
+eigens["loan"] = np.array(["normal","good","good","normal","normal","normal","good","good","very good","very good",
+                           "very good","good","good","very good","normal"] * 2)
+
+compressed_data_set, compressed_eigens, weights = wu.compress_duplicates(data_set, eigens)
+print(compressed_data_set)
+print(weights)
+
+# trees built with compressed data and weights are the same as trees built with duplicates
+tree = dt.DecisionTree(root=True)
+tree.build(data_set, eigens)
+compressed_tree = dt.DecisionTree(root=True)
+compressed_tree.build(compressed_data_set, compressed_eigens, weights=weights)
+print(tree.traverse())
+print(compressed_tree.traverse())
+
+cart_tree = cct.CartClassificationTree(root=True)
+cart_tree.build(data_set, eigens, compress=True)
+print(cart_tree.traverse())
+print(cart_tree.data_set_size)